@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Throughput of streaming state rows through an AttributionIndex.
+"""
+import argparse
+import datetime
+import random
+import string
+import time
+import tracemalloc
+
+from ovrlib.attribution import AttributionIndex, AttributionSession, StateRow
+
+NAMES = ["SMITH", "JOHNSON", "WILLIAMS", "BROWN", "JONES", "GARCIA", "MILLER"]
+FIRST = ["JAMES", "MARY", "ROBERT", "PATRICIA", "JOHN", "JENNIFER", "MICHAEL"]
+
+
+def random_name(rng: random.Random, common: list) -> str:
+    # mostly unique names, with a realistic share of very common ones
+    if rng.random() < 0.2:
+        return rng.choice(common)
+    return "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(4, 9)))
+
+
+def make_sessions(count: int, rng: random.Random):
+    for i in range(count):
+        yield AttributionSession(
+            session_id=f"s{i}",
+            campaign_id=f"c{i}",
+            first_name=random_name(rng, FIRST),
+            last_name=random_name(rng, NAMES),
+            date_of_birth=datetime.date(1940 + i % 60, 1 + i % 12, 1 + i % 28),
+            zipcode=f"{80000 + rng.randrange(1000):05d}",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=200000)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--with-campaign", type=float, default=0.7)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    tracemalloc.start()
+    index = AttributionIndex()
+    start = time.perf_counter()
+    sessions = list(make_sessions(args.sessions, rng))
+    index.add_all(sessions)
+    print(f"index build: {time.perf_counter() - start:.2f}s")
+    print(f"index memory: {tracemalloc.get_traced_memory()[0] / 2**20:.1f} MiB")
+    tracemalloc.stop()
+
+    def rows():
+        for _ in range(args.rows):
+            s = sessions[rng.randrange(len(sessions))]
+            yield StateRow(
+                state="CO",
+                campaign_id=(
+                    s.campaign_id if rng.random() < args.with_campaign else None
+                ),
+                first_name=s.first_name,
+                last_name=s.last_name,
+                date_of_birth=str(s.date_of_birth.year) if s.date_of_birth else None,
+                zipcode=s.zipcode,
+            )
+
+    start = time.perf_counter()
+    matched = sum(1 for _ in index.attribute(rows()))
+    elapsed = time.perf_counter() - start
+    print(f"attributed {matched}/{args.rows} rows: {args.rows / elapsed:,.0f} rows/s")
+    print(index.stats)
+
+
+if __name__ == "__main__":
+    main()
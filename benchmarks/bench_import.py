@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Cold-start import time of ovrlib and its submodules, each in a fresh
+interpreter (what a serverless function pays on every cold start).
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+TARGETS = [
+    "import ovrlib",
+    "import ovrlib.ga",
+    "import ovrlib.wi",
+    "from ovrlib import PAOVRSession",
+]
+
+
+def time_import(code: str, repeat: int) -> float:
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, env=env)
+        samples.append(time.perf_counter() - start)
+    return min(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    baseline = time_import("pass", args.repeat)
+    print(f"interpreter startup: {baseline * 1000:.1f} ms")
+    for code in TARGETS:
+        elapsed = time_import(code, args.repeat) - baseline
+        print(f"{code}: {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+CPU cost of building PA registration request bodies for a bulk import: one
+PAOVRRequest per row vs. a columnar PAOVRRequestBatch.
+"""
+import argparse
+import datetime
+import time
+from typing import Any, Dict, List
+
+from ovrlib.pa import PAOVRRequest
+from ovrlib.pa_batch import PAOVRRequestBatch
+
+PARTIES = ["Democrat", "Republican", "Green", "Libertarian", "None"]
+COUNTIES = ["Allegheny", "Clarion", "Erie", "Philadelphia", "York"]
+
+
+def make_columns(count: int) -> Dict[str, List[Any]]:
+    return {
+        "first_name": [f"First{i}" for i in range(count)],
+        "last_name": [f"Last{i % 5000}" for i in range(count)],
+        "date_of_birth": [
+            datetime.date(1940, 1, 1) + datetime.timedelta(days=i % 25000)
+            for i in range(count)
+        ],
+        "address1": [
+            f"{i} Main St" + (f" Apt {i % 40}" if i % 3 == 0 else "")
+            for i in range(count)
+        ],
+        "city": ["Clarion"] * count,
+        "county": [COUNTIES[i % len(COUNTIES)] for i in range(count)],
+        "zipcode": [f"{15000 + i % 4000}" for i in range(count)],
+        "party": [PARTIES[i % len(PARTIES)] for i in range(count)],
+        "gender": [["F", "male", None][i % 3] for i in range(count)],
+        "email": [f"voter{i}@example.com" for i in range(count)],
+        "dl_number": [f"{10000000 + i}" for i in range(count)],
+        "united_states_citizen": [True] * count,
+        "eighteen_on_election_day": [True] * count,
+        "declaration": [True] * count,
+        "is_new": [True] * count,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=200000)
+    args = parser.parse_args()
+
+    columns = make_columns(args.count)
+    names = list(columns)
+
+    start = time.perf_counter()
+    for row in zip(*columns.values()):
+        PAOVRRequest(**dict(zip(names, row))).to_request_body()
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in PAOVRRequestBatch.from_columns(columns).iter_bodies():
+        pass
+    batch = time.perf_counter() - start
+
+    print(
+        f"{args.count} rows: scalar {args.count / scalar:.0f} rows/s, "
+        f"batch {args.count / batch:.0f} rows/s ({scalar / batch:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
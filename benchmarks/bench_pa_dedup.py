@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Throughput of DuplicateFinder over a batch of PA requests with a share of
+near-duplicates.
+"""
+import argparse
+import dataclasses
+import datetime
+import random
+import string
+import time
+from typing import List
+
+from ovrlib.pa import PAOVRRequest
+from ovrlib.pa_dedup import DuplicateFinder
+
+NAMES = ["SMITH", "JOHNSON", "WILLIAMS", "BROWN", "JONES", "GARCIA", "MILLER"]
+FIRST = ["JAMES", "MARY", "ROBERT", "PATRICIA", "JOHN", "JENNIFER", "MICHAEL"]
+
+
+def random_name(rng: random.Random, common: list) -> str:
+    if rng.random() < 0.2:
+        return rng.choice(common)
+    return "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(4, 9)))
+
+
+def typo(rng: random.Random, s: str) -> str:
+    i = rng.randrange(len(s))
+    return s[:i] + rng.choice(string.ascii_uppercase) + s[i + 1 :]
+
+
+def make_requests(count: int, duplicates: float, rng: random.Random):
+    made: List[PAOVRRequest] = []
+    for i in range(count):
+        if made and rng.random() < duplicates:
+            r = rng.choice(made)
+            yield dataclasses.replace(r, address1=typo(rng, r.address1))
+            continue
+        r = PAOVRRequest(
+            first_name=random_name(rng, FIRST),
+            last_name=random_name(rng, NAMES),
+            date_of_birth=datetime.date(1940 + i % 60, 1 + i % 12, 1 + i % 28),
+            address1=f"{rng.randrange(1, 9999)} {random_name(rng, NAMES)} ST",
+            city="PHILADELPHIA",
+            zipcode=f"{19000 + rng.randrange(200):05d}",
+            county="PHILADELPHIA",
+            party="Democratic",
+            united_states_citizen=True,
+            eighteen_on_election_day=True,
+            declaration=True,
+        )
+        if len(made) < 10000:
+            made.append(r)
+        yield r
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--duplicates", type=float, default=0.05)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    requests = list(make_requests(args.requests, args.duplicates, rng))
+    finder = DuplicateFinder()
+    start = time.perf_counter()
+    dups = finder.find(requests)
+    elapsed = time.perf_counter() - start
+    print(
+        f"checked {len(requests)} requests: {len(requests) / elapsed:,.0f}/s, "
+        f"{len(dups)} duplicates"
+    )
+    print(finder.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Throughput of building signature-heavy PA request bodies in-process vs. with
+PAOVRBodyPool at increasing process counts.
+"""
+import argparse
+import datetime
+import os
+import time
+from typing import List
+
+from ovrlib.pa import PAOVRRequest
+from ovrlib.pa_parallel import PAOVRBodyPool
+
+
+def make_requests(count: int, signature_size: int) -> List[PAOVRRequest]:
+    signature = os.urandom(signature_size)
+    return [
+        PAOVRRequest(
+            first_name=f"First{i}",
+            last_name="Penndot",
+            date_of_birth=datetime.date(1944, 5, 2),
+            address1="123 A St",
+            city="Clarion",
+            county="Clarion",
+            zipcode="16214",
+            party="Democrat",
+            united_states_citizen=True,
+            eighteen_on_election_day=True,
+            declaration=True,
+            signature=signature,
+            signature_type="png",
+        )
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--signature-size", type=int, default=200000)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    args = parser.parse_args()
+
+    requests = make_requests(args.count, args.signature_size)
+
+    start = time.perf_counter()
+    for r in requests:
+        r.to_request_body()
+    base = time.perf_counter() - start
+    print(f"in-process: {args.count / base:.0f} bodies/s")
+
+    for processes in args.processes:
+        with PAOVRBodyPool(processes=processes) as pool:
+            # let the workers start before timing
+            list(pool.map(requests[: processes * 2]))
+            start = time.perf_counter()
+            for _ in pool.map(requests):
+                pass
+            elapsed = time.perf_counter() - start
+        print(
+            f"{processes} processes: {args.count / elapsed:.0f} bodies/s "
+            f"({base / elapsed:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
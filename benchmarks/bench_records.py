@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Memory footprint of holding many records at once: ovrlib's slotted
+dataclasses vs. the same fields as plain (__dict__-based) dataclasses.
+"""
+import argparse
+import dataclasses
+import datetime
+import gc
+import tracemalloc
+from typing import Any, Callable, List
+
+from ovrlib.pa import PAOVRRequest
+from ovrlib.wi import WIElection
+
+
+def unslotted(cls: type) -> type:
+    return dataclasses.make_dataclass(
+        f"Plain{cls.__name__}",
+        [(f.name, f.type, f) for f in dataclasses.fields(cls)],
+    )
+
+
+def make_request(cls: Any, i: int) -> Any:
+    return cls(
+        first_name=f"First{i}",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        county="Clarion",
+        zipcode="16214",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+    )
+
+
+def make_election(cls: Any, i: int) -> Any:
+    now = datetime.datetime(2020, 11, 3, 7)
+    return cls(
+        election_id="1",
+        start=now,
+        end=now,
+        description="General",
+        polling_place_ward="Ward 1",
+        polling_place_id=str(i),
+        polling_place_description="Library",
+        polling_place_address="1 Library Mall",
+        polling_place_city="Madison",
+        polling_place_state="WI",
+        polling_place_zipcode="53706",
+        polling_place_lat=43.07,
+        polling_place_lng=-89.4,
+    )
+
+
+def measure(factory: Callable[[Any, int], Any], cls: Any, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    records: List[Any] = [factory(cls, i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return size / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=1000000)
+    args = parser.parse_args()
+
+    for cls, factory in [(PAOVRRequest, make_request), (WIElection, make_election)]:
+        plain = measure(factory, unslotted(cls), args.count)
+        slotted = measure(factory, cls, args.count)
+        print(
+            f"{cls.__name__} x {args.count}: plain {plain:.0f} MiB, "
+            f"slotted {slotted:.0f} MiB ({100 * (1 - slotted / plain):.0f}% saved)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Query latency of the local WI polling place index.
+"""
+import argparse
+import random
+import timeit
+
+from ovrlib.wi_places import WIPollingPlace, WIPollingPlaceIndex
+
+
+def build_index(count: int, seed: int = 0) -> WIPollingPlaceIndex:
+    rng = random.Random(seed)
+    index = WIPollingPlaceIndex()
+    for i in range(count):
+        index.add(
+            WIPollingPlace(
+                polling_place_id=str(i),
+                description=f"Polling place {i}",
+                address=f"{i} Main St",
+                city="Madison",
+                state="WI",
+                zipcode="53703",
+                lat=rng.uniform(42.5, 47.0),
+                lng=rng.uniform(-92.8, -86.8),
+            )
+        )
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--places", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=10000)
+    args = parser.parse_args()
+
+    index = build_index(args.places)
+    rng = random.Random(1)
+    points = [
+        (rng.uniform(42.5, 47.0), rng.uniform(-92.8, -86.8))
+        for _ in range(args.queries)
+    ]
+
+    def nearest():
+        for lat, lng in points:
+            index.nearest(lat, lng, n=5)
+
+    def within():
+        for lat, lng in points:
+            index.within(lat - 0.1, lng - 0.1, lat + 0.1, lng + 0.1)
+
+    for name, fn in [("nearest(n=5)", nearest), ("within(0.2deg box)", within)]:
+        elapsed = min(timeit.repeat(fn, number=1, repeat=3))
+        print(f"{name}: {elapsed / args.queries * 1e6:.1f} us/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,65 @@
 # flake8: noqa
+"""
+Submodules (and the PA classes re-exported here) are imported on first use,
+so that e.g. `import ovrlib.wi` doesn't pay for lxml and the PA tables.
+"""
 
-from .pa import PAOVRElectionInfo, PAOVRRequest, PAOVRResponse, PAOVRSession
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .pa import PAOVRElectionInfo, PAOVRRequest, PAOVRResponse, PAOVRSession
+
+_SUBMODULES = {
+    "attribution",
+    "cassette",
+    "cache",
+    "cli",
+    "co",
+    "exceptions",
+    "ga",
+    "hedge",
+    "idempotency",
+    "limiter",
+    "matching",
+    "memprofile",
+    "mi",
+    "pa",
+    "pa_batch",
+    "pa_dedup",
+    "pa_parallel",
+    "pa_places",
+    "pa_pool",
+    "pa_queue",
+    "pa_scheduler",
+    "ratelimit",
+    "singleflight",
+    "va",
+    "wi",
+    "wi_places",
+}
+
+# name -> submodule it lives in
+_EXPORTS = {
+    "PAOVRElectionInfo": "pa",
+    "PAOVRRequest": "pa",
+    "PAOVRResponse": "pa",
+    "PAOVRSession": "pa",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name in _EXPORTS:
+        module = importlib.import_module(f".{_EXPORTS[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | _SUBMODULES | set(_EXPORTS))
@@ -0,0 +1,34 @@
+import dataclasses
+from typing import TypeVar
+
+T = TypeVar("T", bound=type)
+
+
+def slotted(cls: T) -> T:
+    """
+    Rebuild a dataclass with __slots__, so instances carry no per-instance
+    __dict__.  This is what @dataclass(slots=True) does on Python 3.10+; we
+    still support 3.8.  Stack it on top of @dataclass:
+
+        @slotted
+        @dataclass
+        class Foo:
+            ...
+
+    Constructors, defaults, equality, repr, pickling and dataclasses.replace()
+    behave the same; setting attributes that aren't fields is an error.
+    """
+    if "__slots__" in cls.__dict__:
+        return cls
+    names = tuple(f.name for f in dataclasses.fields(cls))
+    cls_dict = dict(cls.__dict__)
+    cls_dict["__slots__"] = names
+    # field defaults live on the class and would clash with the slot
+    # descriptors; __init__ already has them
+    for name in names:
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    new_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    new_cls.__qualname__ = cls.__qualname__
+    return new_cls
@@ -0,0 +1,237 @@
+"""
+Attribute rows from state tracking feeds (CO VRD reports, VA tracking CSVs)
+back to our own sessions.
+
+Rows that carry the campaign ID we put in the tracking link are joined
+through a hash index.  Rows without one fall back to fuzzy matching on name,
+date (or year) of birth and ZIP, comparing only against sessions that share a
+blocking key.  State rows are streamed, so only our sessions are held in
+memory:
+
+    index = AttributionIndex()
+    index.add_all(sessions)
+    for attribution in index.attribute(
+        StateRow.from_va_record(c.record) for c in differ.diff(path)
+    ):
+        ...
+"""
+
+import datetime
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from ._slots import slotted
+from .matching import (
+    dob_similarity,
+    jaro_winkler,
+    normalize_dob,
+    normalize_name,
+    normalize_zip,
+    soundex,
+)
+
+DEFAULT_MIN_SCORE = 0.88
+# a best fuzzy candidate must beat the runner-up by this much
+DEFAULT_MIN_MARGIN = 0.005
+# blocks bigger than this (very common names in a big ZIP) are skipped
+DEFAULT_MAX_BLOCK = 500
+
+WEIGHTS = {"last_name": 0.4, "first_name": 0.3, "zipcode": 0.15, "dob": 0.15}
+
+
+@slotted
+@dataclass
+class AttributionSession:
+    session_id: str
+    campaign_id: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    date_of_birth: Optional[datetime.date] = None
+    zipcode: Optional[str] = None
+
+
+@slotted
+@dataclass
+class StateRow:
+    state: str
+    campaign_id: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    date_of_birth: Optional[str] = None  # full date or just a year
+    zipcode: Optional[str] = None
+    source: Any = None  # the original record
+
+    @classmethod
+    def from_va_record(cls, record) -> "StateRow":
+        """
+        From an ovrlib.va.VATrackingRecord.  VA doesn't send a birth date.
+        """
+        return cls(
+            state="VA",
+            campaign_id=record.campaign or None,
+            first_name=record.first_name,
+            last_name=record.last_name,
+            zipcode=record.zipcode,
+            source=record,
+        )
+
+    @classmethod
+    def from_mapping(
+        cls, state: str, row: Mapping[str, str], field_map: Mapping[str, str]
+    ) -> "StateRow":
+        """
+        From a dict-like row (e.g. ovrlib.co.ColumnarStore.iter_rows()), with
+        field_map mapping StateRow attributes to the feed's column names:
+
+            StateRow.from_mapping("CO", row, {"campaign_id": "CAMPAIGN", ...})
+        """
+        return cls(
+            state=state,
+            source=row,
+            **{attr: (row.get(column) or None) for attr, column in field_map.items()},
+        )
+
+
+@dataclass
+class Attribution:
+    session_id: str
+    method: str  # "campaign" or "fuzzy"
+    score: float
+    row: StateRow
+
+
+# (first, last, dob, zip), all normalized
+_Key = Tuple[str, str, str, str]
+
+
+class AttributionIndex:
+    def __init__(
+        self,
+        min_score: float = DEFAULT_MIN_SCORE,
+        min_margin: float = DEFAULT_MIN_MARGIN,
+        max_block: int = DEFAULT_MAX_BLOCK,
+    ):
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.max_block = max_block
+        # sessions are stored once, as tuples, and referred to by position
+        self._session_ids: List[str] = []
+        self._keys: List[_Key] = []
+        self._by_campaign: Dict[str, int] = {}
+        self._blocks: Dict[Tuple[str, ...], List[int]] = {}
+        self.stats = {"campaign": 0, "fuzzy": 0, "ambiguous": 0, "unmatched": 0}
+
+    def __len__(self) -> int:
+        return len(self._session_ids)
+
+    @staticmethod
+    def _blocking_keys(key: _Key) -> List[Tuple[str, ...]]:
+        first, last, dob, zipcode = key
+        sx = soundex(last)
+        r: List[Tuple[str, ...]] = []
+        if zipcode and sx:
+            r.append(("zl", zipcode, sx))
+        if dob and sx:
+            # year only, so that a full date and a bare year share a block
+            r.append(("dl", dob[:4], sx))
+        if zipcode and dob:
+            r.append(("zd", zipcode, dob[:4]))
+        return r
+
+    def add(self, session: AttributionSession) -> None:
+        i = len(self._session_ids)
+        self._session_ids.append(session.session_id)
+        key = (
+            normalize_name(session.first_name),
+            normalize_name(session.last_name),
+            normalize_dob(session.date_of_birth),
+            normalize_zip(session.zipcode),
+        )
+        self._keys.append(key)
+        if session.campaign_id:
+            self._by_campaign[session.campaign_id.strip()] = i
+        for b in self._blocking_keys(key):
+            self._blocks.setdefault(b, []).append(i)
+
+    def add_all(self, sessions: Iterable[AttributionSession]) -> None:
+        for session in sessions:
+            self.add(session)
+
+    def score(self, a: _Key, b: _Key, floor: float = 0.0) -> float:
+        """
+        Weighted similarity of two normalized keys.  Returns 0.0 early (skipping
+        the name comparisons) if the result can't reach `floor`.
+        """
+        total = 0.0
+        weight = 0.0
+        if a[3] and b[3]:
+            total += WEIGHTS["zipcode"] * (1.0 if a[3] == b[3] else 0.0)
+            weight += WEIGHTS["zipcode"]
+        d = dob_similarity(a[2], b[2])
+        if d is not None:
+            total += WEIGHTS["dob"] * d
+            weight += WEIGHTS["dob"]
+        if not (a[0] and b[0] and a[1] and b[1]) or not weight:
+            # need both names plus one of ZIP/DOB to say anything
+            return 0.0
+        weight += WEIGHTS["first_name"] + WEIGHTS["last_name"]
+        if (total + WEIGHTS["first_name"] + WEIGHTS["last_name"]) / weight < floor:
+            return 0.0
+
+        total += WEIGHTS["last_name"] * jaro_winkler(a[1], b[1])
+        if (total + WEIGHTS["first_name"]) / weight < floor:
+            return 0.0
+        if len(a[0]) == 1 or len(b[0]) == 1:
+            # an initial
+            total += WEIGHTS["first_name"] * (0.9 if a[0][0] == b[0][0] else 0.0)
+        else:
+            total += WEIGHTS["first_name"] * jaro_winkler(a[0], b[0])
+        return total / weight
+
+    def match(self, row: StateRow) -> Optional[Attribution]:
+        if row.campaign_id:
+            i = self._by_campaign.get(row.campaign_id.strip())
+            if i is not None:
+                self.stats["campaign"] += 1
+                return Attribution(self._session_ids[i], "campaign", 1.0, row)
+
+        key = (
+            normalize_name(row.first_name),
+            normalize_name(row.last_name),
+            normalize_dob(row.date_of_birth),
+            normalize_zip(row.zipcode),
+        )
+        candidates = set()
+        for b in self._blocking_keys(key):
+            block = self._blocks.get(b)
+            if block and len(block) <= self.max_block:
+                candidates.update(block)
+
+        best = -1
+        best_score = 0.0
+        runner_up = 0.0
+        for i in candidates:
+            s = self.score(key, self._keys[i], floor=self.min_score - self.min_margin)
+            if s > best_score:
+                best, best_score, runner_up = i, s, best_score
+            elif s > runner_up:
+                runner_up = s
+
+        if best < 0 or best_score < self.min_score:
+            self.stats["unmatched"] += 1
+            return None
+        if best_score - runner_up < self.min_margin:
+            self.stats["ambiguous"] += 1
+            return None
+        self.stats["fuzzy"] += 1
+        return Attribution(self._session_ids[best], "fuzzy", best_score, row)
+
+    def attribute(self, rows: Iterable[StateRow]) -> Iterator[Attribution]:
+        """
+        Stream state rows through the index, yielding an Attribution for each
+        row that matched one of our sessions.
+        """
+        for row in rows:
+            a = self.match(row)
+            if a is not None:
+                yield a
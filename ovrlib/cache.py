@@ -0,0 +1,237 @@
+"""
+Optional result cache for the GA and WI voter lookups.
+
+Lookups are keyed on a normalized (state, name, date of birth, county) tuple.
+Found voters, not-found results and polling places each get their own TTL, and
+the backend bounds memory with LRU eviction.  Two backends are provided:
+
+- MemoryCacheBackend: per-process, an OrderedDict
+- FileCacheBackend: a sqlite file that can be shared by several processes
+
+    cache = LookupCache(FileCacheBackend("/var/tmp/ovrlib-lookups.db"))
+    ovrlib.ga.lookup_voter("Sally", "Peach", dob, "Fulton", cache=cache)
+"""
+
+import datetime
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+DEFAULT_HIT_TTL = 60 * 60
+DEFAULT_MISS_TTL = 5 * 60
+DEFAULT_POLLING_PLACE_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def normalize_key_part(value: Any) -> str:
+    """
+    Normalize one component of a lookup key: dates become ISO strings, text
+    is upper-cased with whitespace collapsed.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return " ".join(str(value).split()).upper()
+
+
+class CacheBackend:
+    """
+    Storage for cached lookup results.  get() returns a (found, value) tuple so
+    that a cached None (a negative result) can be told apart from a miss.
+    """
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires <= self.clock():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCacheBackend(CacheBackend):
+    """
+    A sqlite-backed cache that several processes on one host can share.
+    Values are pickled, so only point this at a file you trust.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+        timeout: float = 5.0,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS lookup_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " expires REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS lookup_cache_accessed"
+                " ON lookup_cache (accessed)"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM lookup_cache").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        now = self.clock()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT value, expires FROM lookup_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False, None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM lookup_cache WHERE key = ?", (key,))
+                return False, None
+            self._db.execute(
+                "UPDATE lookup_cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return True, pickle.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        now = self.clock()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO lookup_cache (key, value, expires, accessed)"
+                " VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value), now + ttl, now),
+            )
+            self._db.execute("DELETE FROM lookup_cache WHERE expires <= ?", (now,))
+            self._db.execute(
+                "DELETE FROM lookup_cache WHERE key IN ("
+                " SELECT key FROM lookup_cache ORDER BY accessed DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM lookup_cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM lookup_cache")
+
+
+class LookupCache:
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        hit_ttl: float = DEFAULT_HIT_TTL,
+        miss_ttl: float = DEFAULT_MISS_TTL,
+        polling_place_ttl: float = DEFAULT_POLLING_PLACE_TTL,
+    ):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.polling_place_ttl = polling_place_ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        # hash the key so that names and birth dates aren't stored in the clear
+        raw = "|".join(normalize_key_part(p) for p in parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def voter_key(
+        self,
+        state: str,
+        first_name: str,
+        last_name: str,
+        date_of_birth: datetime.date,
+        county: Optional[str] = None,
+    ) -> str:
+        return self.make_key(
+            state, "voter", first_name, last_name, date_of_birth, county
+        )
+
+    def polling_place_key(self, state: str, district_combo_id: str) -> str:
+        return self.make_key(state, "polling_place", district_combo_id)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        found, value = self.backend.get(key)
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found, value
+
+    def set_voter(self, key: str, value: Any) -> None:
+        """
+        Cache a voter lookup result; empty results use the (shorter) miss TTL.
+        """
+        self.backend.set(key, value, self.hit_ttl if value else self.miss_ttl)
+
+    def set_polling_place(self, key: str, value: Any) -> None:
+        self.backend.set(key, value, self.polling_place_ttl if value else self.miss_ttl)
+
+    def invalidate(self, key: str) -> None:
+        self.backend.delete(key)
@@ -0,0 +1,431 @@
+"""
+Record real HTTP exchanges once, then replay them offline.
+
+Every client in ovrlib takes an http_session (a requests.Session); mount a
+recording or replaying adapter on one to capture or serve back its traffic:
+
+    with recording("pa-flow.cassette") as http:
+        session = PAOVRSession(api_key, staging=True, http_session=http)
+        session.register(request)
+        ga.lookup_voter(..., http_session=http)
+
+    http = replaying("pa-flow.cassette", latency="recorded")
+    session = PAOVRSession("replay", staging=True, http_session=http)
+    session.register(request)  # no network; same payloads and timings
+
+A cassette is gzipped JSON lines, one exchange per line: method, URL, a
+hash of the request body, and the response's status, headers, body and how
+long it took.  Request bodies aren't stored at all.  Query parameters in
+redact_params (by default the PA API key) are replaced in stored URLs, and
+redact_response rewrites each response body before it is saved.  The
+default, redact_pii, blanks the fields the state APIs return about a voter
+(names, dates of birth, addresses, contact details, registration numbers)
+in JSON, XML and GA's HTML; lookups replayed from such a cassette find no
+one.  Pass your own, or None to record bodies as they came (only do that
+with test data).
+
+On replay, a request is answered with the next unused recorded exchange with
+the same method, redacted URL and (if match_body) request body hash.  A
+request with no recording raises CassetteMissError.
+"""
+
+import base64
+import collections
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import logging
+import re
+import threading
+import time
+import urllib.parse
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import requests
+import urllib3
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .exceptions import CassetteMissError
+
+logger = logging.getLogger("ovrlib.cassette")
+
+DEFAULT_REDACT_PARAMS = {"sysparm_AuthKey"}
+REDACTED = "REDACTED"
+# describe the body as it was on the wire, not as we store it
+DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+# JSON keys (lowercased) whose values identify a voter: WI's and MI's APIs
+PII_JSON_KEYS = {
+    "address",
+    "address1",
+    "address2",
+    "addressline1",
+    "addressline2",
+    "city",
+    "dateofbirth",
+    "birthday",
+    "birthmonth",
+    "birthyear",
+    "email",
+    "emailaddress",
+    "firstname",
+    "lastname",
+    "middlename",
+    "fullname",
+    "votername",
+    "phone",
+    "phonenumber",
+    "postalcode",
+    "zipcode",
+    "ssnfour",
+    "driverslicensenumber",
+    "voterid",
+    "voterregnumber",
+}
+# elements (lowercased) in PA's XML that carry a voter's details
+PII_XML_TAGS = {
+    "firstname",
+    "middlename",
+    "lastname",
+    "titlesuffix",
+    "dateofbirth",
+    "phone",
+    "email",
+    "secondemail",
+    "streetaddress",
+    "streetaddress2",
+    "unitnumber",
+    "city",
+    "zipcode",
+    "mailingaddress",
+    "mailingcity",
+    "mailingzipcode",
+    "drivers-license",
+    "ssn4",
+    "signatureimage",
+    "voterregnumber",
+    "previousreglastname",
+    "previousregfirstname",
+    "previousregmiddlename",
+    "previousregaddress",
+    "previousregcity",
+    "previousregzip",
+    "mailinballotaddr",
+    "mailincity",
+    "mailinzipcode",
+    "assistedpersonname",
+    "assistedpersonaddress",
+    "assistedpersonphone",
+}
+# GA's voter page: <span id="..."> values, and the hidden voter id
+PII_HTML_SPANS = {
+    "fullNameSpan",
+    "resAddress1",
+    "resAddress2",
+    "resAddress3",
+    "resAddress5",
+}
+_XML_ELEMENT = re.compile(r"<([\w.-]+)((?:\s[^>]*)?)>([^<]*)</\1>")
+_HTML_SPAN = re.compile(
+    r"(<span id=['\"](%s)['\"]>)[^<]*(</span>)" % "|".join(sorted(PII_HTML_SPANS))
+)
+_HTML_VOTER_ID = re.compile(r'(name="idVoter" id="idVoter" value=")\d+(")')
+
+
+def redact_url(url: str, params: Iterable[str]) -> str:
+    """
+    url with the values of the given query parameters replaced
+    """
+    params = set(params)
+    parts = urllib.parse.urlsplit(url)
+    if not params or not parts.query:
+        return url
+    query = []
+    # edit in place rather than re-encoding, so the rest of the URL is as sent
+    for item in parts.query.split("&"):
+        name, eq, _ = item.partition("=")
+        if eq and urllib.parse.unquote_plus(name) in params:
+            item = f"{name}={REDACTED}"
+        query.append(item)
+    return urllib.parse.urlunsplit(parts._replace(query="&".join(query)))
+
+
+def body_hash(body: Union[None, str, bytes]) -> Optional[str]:
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+def _redact_json(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: (_redact_value(v) if k.lower() in PII_JSON_KEYS else _redact_json(v))
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [_redact_json(v) for v in value]
+    if isinstance(value, str):
+        # PA wraps its XML in a JSON string
+        return _redact_markup(value)
+    return value
+
+
+def _redact_value(value: Any) -> Any:
+    if value is None or value == "":
+        return value
+    if isinstance(value, (dict, list)):
+        return _redact_json(value)
+    # keep the type, so the body still parses
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return 0
+    return REDACTED
+
+
+def _redact_markup(text: str) -> str:
+    def element(m: "re.Match") -> str:
+        if m[1].lower() in PII_XML_TAGS and m[3]:
+            return f"<{m[1]}{m[2]}>{REDACTED}</{m[1]}>"
+        return m[0]
+
+    text = _XML_ELEMENT.sub(element, text)
+    text = _HTML_SPAN.sub(rf"\1{REDACTED}\3", text)
+    return _HTML_VOTER_ID.sub(r"\g<1>0\2", text)
+
+
+def redact_pii(content: bytes) -> bytes:
+    """
+    content with the voter details the state APIs return replaced (see
+    PII_JSON_KEYS, PII_XML_TAGS, PII_HTML_SPANS)
+    """
+    try:
+        text = content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return _redact_markup(text).encode("utf-8")
+    redacted = _redact_json(data)
+    if redacted == data:
+        return content
+    return json.dumps(redacted).encode("utf-8")
+
+
+class Cassette:
+    def __init__(self, exchanges: Optional[List[Dict[str, Any]]] = None):
+        self.exchanges: List[Dict[str, Any]] = exchanges or []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.exchanges)
+
+    def append(self, exchange: Dict[str, Any]) -> None:
+        with self._lock:
+            self.exchanges.append(exchange)
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                for exchange in self.exchanges:
+                    f.write(json.dumps(exchange, separators=(",", ":")))
+                    f.write("\n")
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Sends requests for real (through `adapter`) and adds each exchange to
+    the cassette
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        adapter: Optional[BaseAdapter] = None,
+        redact_params: Iterable[str] = DEFAULT_REDACT_PARAMS,
+        redact_response: Optional[Callable[[bytes], bytes]] = redact_pii,
+    ):
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter or HTTPAdapter()
+        self.redact_params = set(redact_params)
+        self.redact_response = redact_response
+
+    def send(self, request, **kwargs):  # type: ignore
+        start = time.monotonic()
+        response = self.adapter.send(request, **kwargs)
+        content = response.content  # read it all, as the caller would
+        elapsed = time.monotonic() - start
+        if self.redact_response is not None:
+            content = self.redact_response(content)
+        self.cassette.append(
+            {
+                "method": request.method,
+                "url": redact_url(request.url, self.redact_params),
+                "body": body_hash(request.body),
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": {
+                    k: v
+                    for k, v in response.headers.items()
+                    if k.lower() not in DROP_HEADERS
+                },
+                "content": base64.b64encode(content).decode("ascii"),
+                "elapsed": elapsed,
+            }
+        )
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests from a cassette without touching the network.
+    latency: "none", "recorded", or a multiple of the recorded latency.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        latency: Union[str, float] = "none",
+        match_body: bool = True,
+        redact_params: Iterable[str] = DEFAULT_REDACT_PARAMS,
+    ):
+        super().__init__()
+        if latency == "none":
+            self.latency_scale = 0.0
+        elif latency == "recorded":
+            self.latency_scale = 1.0
+        elif isinstance(latency, (int, float)):
+            self.latency_scale = float(latency)
+        else:
+            raise ValueError(f"unrecognized latency {latency!r}")
+        self.match_body = match_body
+        self.redact_params = set(redact_params)
+        self._lock = threading.Lock()
+        self._queues: Dict[Tuple, Deque[Dict[str, Any]]] = collections.defaultdict(
+            collections.deque
+        )
+        for exchange in cassette.exchanges:
+            self._queues[self._key(exchange)].append(exchange)
+
+    def _key(self, exchange: Dict[str, Any]) -> Tuple:
+        return (
+            exchange["method"],
+            exchange["url"],
+            exchange["body"] if self.match_body else None,
+        )
+
+    def remaining(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in self._queues.values())
+
+    def send(self, request, **kwargs):  # type: ignore
+        key = self._key(
+            {
+                "method": request.method,
+                "url": redact_url(request.url, self.redact_params),
+                "body": body_hash(request.body),
+            }
+        )
+        with self._lock:
+            queue = self._queues.get(key)
+            exchange = queue.popleft() if queue else None
+        if exchange is None:
+            raise CassetteMissError(f"no recording for {key[0]} {key[1]}")
+        if self.latency_scale:
+            time.sleep(exchange["elapsed"] * self.latency_scale)
+
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.reason = exchange.get("reason")
+        response.headers = CaseInsensitiveDict(exchange["headers"])
+        # a raw body to read, so streamed reads (iter_content) work too
+        response.raw = urllib3.HTTPResponse(
+            body=io.BytesIO(base64.b64decode(exchange["content"])),
+            headers=exchange["headers"],
+            status=exchange["status"],
+            reason=exchange.get("reason"),
+            preload_content=False,
+            decode_content=False,
+        )
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self  # type: ignore
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def _mount(http: requests.Session, adapter: BaseAdapter) -> requests.Session:
+    http.mount("https://", adapter)
+    http.mount("http://", adapter)
+    return http
+
+
+@contextlib.contextmanager
+def recording(
+    path: str,
+    http: Optional[requests.Session] = None,
+    redact_params: Iterable[str] = DEFAULT_REDACT_PARAMS,
+    redact_response: Optional[Callable[[bytes], bytes]] = redact_pii,
+) -> Iterator[requests.Session]:
+    """
+    A requests.Session that records to path; the cassette is written when
+    the block exits (even if it raised)
+    """
+    cassette = Cassette()
+    adapter = RecordingAdapter(
+        cassette, redact_params=redact_params, redact_response=redact_response
+    )
+    http = _mount(http or requests.Session(), adapter)
+    try:
+        yield http
+    finally:
+        cassette.save(path)
+        logger.info(f"recorded {len(cassette)} exchanges to {path}")
+
+
+def replaying(
+    path: str,
+    latency: Union[str, float] = "none",
+    match_body: bool = True,
+    redact_params: Iterable[str] = DEFAULT_REDACT_PARAMS,
+) -> requests.Session:
+    """
+    A requests.Session that serves requests from the cassette at path
+    """
+    adapter = ReplayAdapter(
+        Cassette.load(path),
+        latency=latency,
+        match_body=match_body,
+        redact_params=redact_params,
+    )
+    return _mount(requests.Session(), adapter)
@@ -0,0 +1,403 @@
+"""
+The `ovrlib` command, for bulk jobs and performance checks:
+
+    ovrlib pa refresh-reference --hud-crosswalk ZIP_COUNTY.csv -o pa-places.json.gz
+    ovrlib pa submit registrations.jsonl --places pa-places.json.gz > results.jsonl
+    ovrlib ga lookup voters.csv > found.jsonl
+    ovrlib wi lookup voters.csv --cache lookups.db > found.jsonl
+    ovrlib bench pa_batch --count 10000
+    ovrlib profile --cprofile submit.prof --tracemalloc -- pa submit ...
+
+The PA API key comes from --api-key or $OVRLIB_PA_API_KEY.
+
+`pa submit` reads one PAOVRRequest.to_dict() per line and queues them in a
+sqlite SubmissionQueue (registrations.jsonl.queue.db by default) before
+submitting.  Run it again with the same input and queue to resume: lines
+already queued are skipped, and only jobs still pending are submitted.  Jobs
+left running by a run that was killed may or may not have reached the state;
+--recover sends them again.
+Jobs that failed after the state may have received them are reported
+"in_doubt" and not sent again until SubmissionQueue.resolve().
+"""
+
+import argparse
+import cProfile
+import csv
+import dataclasses
+import datetime
+import itertools
+import json
+import logging
+import os
+import pstats
+import runpy
+import sys
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
+
+logger = logging.getLogger("ovrlib.cli")
+
+API_KEY_ENV = "OVRLIB_PA_API_KEY"
+ENQUEUE_CHUNK = 1000
+LOOKUP_CHUNK = 64
+BENCHMARKS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"
+)
+
+
+def _open_input(path: str) -> ContextManager[TextIO]:
+    return nullcontext(sys.stdin) if path == "-" else open(path, newline="")
+
+
+def _open_output(path: Optional[str]) -> ContextManager[TextIO]:
+    if path is None or path == "-":
+        return nullcontext(sys.stdout)
+    return open(path, "w")
+
+
+def _to_json(value: Any) -> Any:
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {k: _to_json(v) for k, v in dataclasses.asdict(value).items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _api_key(args: argparse.Namespace) -> str:
+    api_key = args.api_key or os.environ.get(API_KEY_ENV)
+    if not api_key:
+        raise SystemExit(
+            f"ovrlib: a PA API key is required (--api-key or ${API_KEY_ENV})"
+        )
+    return api_key
+
+
+def _read_requests(
+    f: TextIO, skip: int, places: Any = None
+) -> Iterator[Tuple[int, Any]]:
+    """
+    (line number, PAOVRRequest) for each non-blank line after the first skip,
+    with county and municipality filled in from places (a PAPlaceIndex) if
+    they're blank
+    """
+    from .pa import PAOVRRequest
+
+    for n, line in enumerate(f, 1):
+        if n <= skip or not line.strip():
+            continue
+        try:
+            request = PAOVRRequest.from_dict(json.loads(line))
+        except (ValueError, TypeError) as e:
+            raise SystemExit(f"ovrlib: line {n}: {e}")
+        if places is not None:
+            places.fill(request)
+        yield n, request
+
+
+def pa_submit(args: argparse.Namespace) -> int:
+    from .pa import PAOVRSession
+    from .pa_queue import DONE, SubmissionQueue, SubmissionWorker
+
+    if args.queue is None and args.input == "-":
+        raise SystemExit("ovrlib: --queue is required when reading stdin")
+    queue_path = args.queue or args.input + ".queue.db"
+    places = None
+    if args.places is not None:
+        from .pa_places import PAPlaceIndex
+
+        places = PAPlaceIndex.load(args.places)
+    profiler = None
+    if args.memory_profile is not None:
+        from .memprofile import MemoryProfiler
+
+        profiler = MemoryProfiler(interval=args.memory_profile)
+    session = PAOVRSession(
+        _api_key(args), staging=not args.production, profiler=profiler
+    )
+    with SubmissionQueue(queue_path) as queue:
+        # lines are queued in order, so anything already queued is a prefix
+        skip = queue.last_line()
+        if skip is None:
+            # nothing queued, or a queue from before jobs recorded their line
+            skip = sum(queue.counts().values())
+        if skip:
+            logger.info(f"{queue_path}: resuming after line {skip}")
+        with _open_input(args.input) as f:
+            requests = _read_requests(f, skip, places)
+            while True:
+                chunk = list(itertools.islice(requests, ENQUEUE_CHUNK))
+                if not chunk:
+                    break
+                queue.enqueue_many([r for _, r in chunk], lines=[n for n, _ in chunk])
+        if args.recover:
+            logger.info(f"recovered {queue.recover()} interrupted jobs")
+
+        worker = SubmissionWorker(
+            queue,
+            session,
+            concurrency=args.concurrency,
+            max_attempts=args.max_attempts,
+        )
+        if profiler is not None:
+            with profiler:
+                worker.run(until_empty=True)
+            print(profiler.report(), file=sys.stderr)
+        else:
+            worker.run(until_empty=True)
+
+        queued = failed = 0
+        with _open_output(args.output) as out:
+            for job in queue.jobs():
+                queued += 1
+                r: Dict[str, Any] = {"line": job.line, "state": job.state}
+                if job.response is not None:
+                    r["response"] = _to_json(job.response)
+                if job.error_type is not None:
+                    r["error"] = f"{job.error_type}: {job.error_message}"
+                if job.state != DONE:
+                    failed += 1
+                out.write(json.dumps(r) + "\n")
+        print(
+            f"{queued - failed} submitted, {failed} failed or not yet submitted",
+            file=sys.stderr,
+        )
+    return 1 if failed else 0
+
+
+def pa_refresh_reference(args: argparse.Namespace) -> int:
+    from .pa import PAOVRSession
+    from .pa_places import PAPlaceIndex
+
+    session = PAOVRSession(_api_key(args), staging=not args.production)
+    index = PAPlaceIndex()
+    index.add_counties(session.fetch_counties_and_municipalities())
+    if args.hud_crosswalk:
+        index.add_hud_crosswalk(args.hud_crosswalk)
+    index.save(args.output)
+    print(f"{args.output}: {len(index)} municipalities", file=sys.stderr)
+    return 0
+
+
+def _lookup(
+    args: argparse.Namespace, lookup: Callable[..., Any], columns: List[str]
+) -> int:
+    import requests
+
+    from .cache import FileCacheBackend, LookupCache
+
+    cache = LookupCache(FileCacheBackend(args.cache)) if args.cache else None
+    http = requests.Session()
+
+    def one(row: Dict[str, str]) -> Dict[str, Any]:
+        try:
+            values = {c: row[c].strip() for c in columns}
+            dob = datetime.date.fromisoformat(values.pop("date_of_birth"))
+            found = lookup(date_of_birth=dob, cache=cache, http_session=http, **values)
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        return {"found": bool(found), "result": _to_json(found)}
+
+    errors = 0
+    with _open_input(args.input) as f, _open_output(args.output) as out:
+        reader = csv.DictReader(f)
+        missing = set(columns) - set(reader.fieldnames or ())
+        if missing:
+            raise SystemExit(f"ovrlib: {args.input}: missing columns {sorted(missing)}")
+        rows = iter(reader)
+        n = 0
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            # a chunk at a time, so a large file isn't all in flight at once
+            while True:
+                chunk = list(itertools.islice(rows, args.concurrency * LOOKUP_CHUNK))
+                if not chunk:
+                    break
+                for r in pool.map(one, chunk):
+                    n += 1
+                    errors += "error" in r
+                    out.write(json.dumps({"row": n, **r}) + "\n")
+    return 1 if errors else 0
+
+
+def ga_lookup(args: argparse.Namespace) -> int:
+    from . import ga
+
+    return _lookup(
+        args, ga.lookup_voter, ["first_name", "last_name", "date_of_birth", "county"]
+    )
+
+
+def wi_lookup(args: argparse.Namespace) -> int:
+    from . import wi
+
+    return _lookup(args, wi.lookup_voter, ["first_name", "last_name", "date_of_birth"])
+
+
+def bench(args: argparse.Namespace) -> int:
+    if not os.path.isdir(args.dir):
+        # benchmarks/ is in a source checkout, not in an installed package
+        raise SystemExit(
+            f"ovrlib: no benchmarks directory at {args.dir}; "
+            f"pass --dir (e.g. benchmarks/ in a source checkout)"
+        )
+    names = sorted(
+        f[len("bench_") : -len(".py")]
+        for f in os.listdir(args.dir)
+        if f.startswith("bench_") and f.endswith(".py")
+    )
+    if args.name is None:
+        print("\n".join(names))
+        return 0
+    if args.name not in names:
+        raise SystemExit(f"ovrlib: no benchmark {args.name!r} in {args.dir}")
+    path = os.path.join(args.dir, f"bench_{args.name}.py")
+    argv = sys.argv
+    sys.argv = [path] + args.args
+    try:
+        runpy.run_path(path, run_name="__main__")
+    finally:
+        sys.argv = argv
+    return 0
+
+
+def profile(args: argparse.Namespace) -> int:
+    command = args.command
+    if command[:1] == ["--"]:
+        command = command[1:]
+    if not command or command[0] == "profile":
+        raise SystemExit("ovrlib: profile needs a command to run")
+
+    profiler = cProfile.Profile() if args.cprofile or not args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.start(args.frames)
+    try:
+        if profiler is not None:
+            rval = profiler.runcall(main, command)
+        else:
+            rval = main(command)
+    finally:
+        if profiler is not None:
+            if args.cprofile:
+                profiler.dump_stats(args.cprofile)
+            stats = pstats.Stats(profiler, stream=sys.stderr)
+            stats.sort_stats(args.sort).print_stats(args.top)
+        if args.tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"traced memory: {current / 2**20:.1f} MiB now, "
+                f"{peak / 2**20:.1f} MiB peak",
+                file=sys.stderr,
+            )
+            for stat in snapshot.statistics("traceback")[: args.top]:
+                print(stat, file=sys.stderr)
+                for line in stat.traceback.format():
+                    print(line, file=sys.stderr)
+    return rval
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="ovrlib", description="Bulk jobs and performance checks with ovrlib"
+    )
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    commands = parser.add_subparsers(dest="group", metavar="COMMAND")
+    commands.required = True
+
+    pa = commands.add_parser("pa", help="Pennsylvania OVR API").add_subparsers(
+        metavar="COMMAND"
+    )
+    pa.required = True
+
+    def pa_command(name: str, help: str) -> argparse.ArgumentParser:
+        p = pa.add_parser(name, help=help)
+        p.add_argument("--api-key", help=f"(default: ${API_KEY_ENV})")
+        p.add_argument(
+            "--production", action="store_true", help="use production, not staging"
+        )
+        return p
+
+    p = pa_command("submit", "submit registrations from a JSONL file")
+    p.add_argument("input", help="one PAOVRRequest.to_dict() per line, or -")
+    p.add_argument("--queue", help="queue database (default: INPUT.queue.db)")
+    p.add_argument("-o", "--output", help="results JSONL (default: stdout)")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--max-attempts", type=int, default=3)
+    p.add_argument(
+        "--places",
+        metavar="PATH",
+        help="fill in blank counties and municipalities from this saved"
+        " PAPlaceIndex (see refresh-reference)",
+    )
+    p.add_argument(
+        "--recover", action="store_true", help="resend jobs a killed run left running"
+    )
+    p.add_argument(
+        "--memory-profile",
+        type=float,
+        metavar="SECONDS",
+        help="report memory by phase, with a snapshot every SECONDS",
+    )
+    p.set_defaults(func=pa_submit)
+
+    p = pa_command("refresh-reference", "save counties and municipalities")
+    p.add_argument("-o", "--output", default="pa-places.json.gz")
+    p.add_argument("--hud-crosswalk", help="HUD USPS ZIP-county crosswalk CSV")
+    p.set_defaults(func=pa_refresh_reference)
+
+    for state, func, columns in (
+        ("ga", ga_lookup, "first_name,last_name,date_of_birth,county"),
+        ("wi", wi_lookup, "first_name,last_name,date_of_birth"),
+    ):
+        sub = commands.add_parser(state, help=f"{state.upper()} voter lookups")
+        state_commands = sub.add_subparsers(metavar="COMMAND")
+        state_commands.required = True
+        p = state_commands.add_parser("lookup", help="look up voters from a CSV file")
+        p.add_argument("input", help=f"CSV with columns {columns}, or -")
+        p.add_argument("-o", "--output", help="results JSONL (default: stdout)")
+        p.add_argument("--concurrency", type=int, default=4)
+        p.add_argument("--cache", help="sqlite lookup cache file")
+        p.set_defaults(func=func)
+
+    p = commands.add_parser("bench", help="run a benchmark (list them with no name)")
+    p.add_argument("name", nargs="?")
+    p.add_argument("args", nargs=argparse.REMAINDER)
+    p.add_argument("--dir", default=BENCHMARKS_DIR, help="benchmarks directory")
+    p.set_defaults(func=bench)
+
+    p = commands.add_parser("profile", help="run another command under a profiler")
+    p.add_argument("--cprofile", metavar="PATH", help="save cProfile stats")
+    p.add_argument("--sort", default="cumulative")
+    p.add_argument("--top", type=int, default=25)
+    p.add_argument("--tracemalloc", action="store_true", help="trace allocations")
+    p.add_argument("--frames", type=int, default=1, help="traceback depth to trace")
+    p.add_argument("command", nargs=argparse.REMAINDER)
+    p.set_defaults(func=profile)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = make_parser().parse_args(argv)
+    if args.verbose and not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.DEBUG if args.verbose > 1 else logging.INFO)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
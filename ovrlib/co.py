@@ -0,0 +1,309 @@
+"""
+Colorado Voter Registration Drive (VRD) report ingest.
+
+Colorado publishes a daily VRD_REPORT.zip on its FTP server for each OLVRD ID
+(see CO/README.md).  It contains a single tab-separated VRD_REPORT.txt with
+every registration made through our link so far this season, so each day's
+file is mostly rows we have already loaded.
+
+VRDIngester streams the report in fixed-size chunks, keeps a persistent index
+of row hashes, and only writes rows it hasn't seen before to a local columnar
+store:
+
+    ingester = VRDIngester("/data/co-vrd")
+    result = ingester.ingest(FTPSource("ftp.sos.state.co.us", user, password))
+    for row in ingester.store.iter_rows():
+        ...
+"""
+
+import contextlib
+import csv
+import ftplib
+import glob
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from array import array
+from dataclasses import dataclass
+from typing import IO, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger("ovrlib.co")
+
+REPORT_ZIP = "VRD_REPORT.zip"
+REPORT_TXT = "VRD_REPORT.txt"
+
+DEFAULT_CHUNK_SIZE = 10000
+
+SEGMENT_PATTERN = "seg-*.json.gz"
+
+
+class DirectorySource:
+    """
+    A report already on local disk, either the ZIP or the extracted .txt
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def fetch(self, dest_dir: str) -> str:
+        for name in (REPORT_ZIP, REPORT_TXT):
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f"no {REPORT_ZIP} or {REPORT_TXT} in {self.directory}")
+
+
+class FTPSource:
+    """
+    Download VRD_REPORT.zip from the state FTP server
+    """
+
+    def __init__(
+        self,
+        host: str,
+        user: str,
+        password: str,
+        remote_path: str = REPORT_ZIP,
+        port: int = 21,
+        tls: bool = True,
+        ftp_factory: Optional[Callable[[], ftplib.FTP]] = None,
+    ):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.remote_path = remote_path
+        self.port = port
+        self.tls = tls
+        self.ftp_factory = ftp_factory
+
+    def _connect(self) -> ftplib.FTP:
+        if self.ftp_factory:
+            return self.ftp_factory()
+        ftp = ftplib.FTP_TLS() if self.tls else ftplib.FTP()
+        ftp.connect(self.host, self.port)
+        return ftp
+
+    def fetch(self, dest_dir: str) -> str:
+        ftp = self._connect()
+        try:
+            ftp.login(self.user, self.password)
+            if isinstance(ftp, ftplib.FTP_TLS):
+                ftp.prot_p()
+            path = os.path.join(dest_dir, os.path.basename(self.remote_path))
+            with open(path, "wb") as f:
+                ftp.retrbinary(f"RETR {self.remote_path}", f.write)
+        finally:
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+        return path
+
+
+def iter_report_chunks(
+    path: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Tuple[List[str], List[List[str]]]]:
+    """
+    Stream a VRD report (ZIP or .txt) as (header, rows) chunks of at most
+    chunk_size rows, without reading the whole file into memory.
+    """
+    with _open_report(path) as f:
+        reader = csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+        header = next(reader, None)
+        if header is None:
+            return
+        chunk: List[List[str]] = []
+        for row in reader:
+            if not any(row):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield header, chunk
+                chunk = []
+        if chunk:
+            yield header, chunk
+
+
+@contextlib.contextmanager
+def _open_report(path: str) -> Iterator[IO[str]]:
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = [n for n in archive.namelist() if not n.endswith("/")]
+            name = REPORT_TXT if REPORT_TXT in names else names[0]
+            with archive.open(name) as raw:
+                yield io.TextIOWrapper(
+                    raw, encoding="utf-8-sig", errors="replace", newline=""
+                )
+    else:
+        with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+            yield f
+
+
+def row_hash(row: List[str]) -> int:
+    digest = hashlib.blake2b("\t".join(row).encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "little")
+
+
+class ColumnarStore:
+    """
+    An append-only directory of gzipped, column-oriented JSON segments.  Each
+    segment has a companion .hashes file holding the row hashes it contains,
+    which is what the ingester uses as its "seen" index.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)))
+
+    def _hashes_path(self, segment: str) -> str:
+        return segment[: -len(".json.gz")] + ".hashes"
+
+    def load_hashes(self) -> Set[int]:
+        seen: Set[int] = set()
+        for segment in self.segments():
+            hashes = array("Q")
+            with open(self._hashes_path(segment), "rb") as f:
+                hashes.frombytes(f.read())
+            seen.update(hashes)
+        return seen
+
+    def append(
+        self, header: List[str], rows: List[List[str]], hashes: List[int]
+    ) -> str:
+        """
+        Write a new segment.  The hashes file goes in first and the segment is
+        renamed into place last, so a crash never leaves a segment whose rows
+        look unseen.
+        """
+        existing = self.segments()
+        seq = int(os.path.basename(existing[-1])[4:10]) + 1 if existing else 1
+        segment = os.path.join(self.directory, f"seg-{seq:06d}.json.gz")
+
+        with open(self._hashes_path(segment), "wb") as f:
+            array("Q", hashes).tofile(f)
+
+        width = len(header)
+        data: Dict[str, List[str]] = {
+            col: [row[i] if i < len(row) else "" for row in rows]
+            for i, col in enumerate(header)
+        }
+        extra = [row[width:] for row in rows]
+        tmp = f"{segment}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "columns": header,
+                    "rows": len(rows),
+                    "data": data,
+                    "extra": extra if any(extra) else None,
+                },
+                f,
+                separators=(",", ":"),
+            )
+        os.replace(tmp, segment)
+        return segment
+
+    def _read_segment(self, segment: str) -> dict:
+        with gzip.open(segment, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def __len__(self) -> int:
+        return sum(os.path.getsize(self._hashes_path(s)) // 8 for s in self.segments())
+
+    def read_column(self, name: str) -> Iterator[str]:
+        for segment in self.segments():
+            seg = self._read_segment(segment)
+            yield from seg["data"].get(name, [""] * seg["rows"])
+
+    def iter_rows(self) -> Iterator[Dict[str, str]]:
+        for segment in self.segments():
+            seg = self._read_segment(segment)
+            columns = seg["columns"]
+            data = [seg["data"][c] for c in columns]
+            for i in range(seg["rows"]):
+                yield {c: d[i] for c, d in zip(columns, data)}
+
+
+@dataclass
+class IngestResult:
+    rows_read: int
+    rows_new: int
+    segments_written: List[str]
+
+
+class VRDIngester:
+    def __init__(self, store_dir: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.store = ColumnarStore(store_dir)
+        self.chunk_size = chunk_size
+        self._seen: Optional[Set[int]] = None
+
+    @property
+    def seen(self) -> Set[int]:
+        if self._seen is None:
+            self._seen = self.store.load_hashes()
+        return self._seen
+
+    def ingest_file(self, path: str) -> IngestResult:
+        result = IngestResult(rows_read=0, rows_new=0, segments_written=[])
+        seen = self.seen
+        pending_header: Optional[List[str]] = None
+        pending: List[List[str]] = []
+        pending_hashes: List[int] = []
+
+        def flush():
+            if pending:
+                assert pending_header is not None
+                segment = self.store.append(pending_header, pending, pending_hashes)
+                result.segments_written.append(segment)
+                pending.clear()
+                pending_hashes.clear()
+
+        try:
+            for header, rows in iter_report_chunks(path, self.chunk_size):
+                if pending_header is not None and header != pending_header:
+                    flush()
+                pending_header = header
+                for row in rows:
+                    result.rows_read += 1
+                    h = row_hash(row)
+                    if h in seen:
+                        continue
+                    # also catches rows repeated within this file
+                    seen.add(h)
+                    pending.append(row)
+                    pending_hashes.append(h)
+                    result.rows_new += 1
+                if len(pending) >= self.chunk_size:
+                    flush()
+            flush()
+        except Exception:
+            # unflushed rows were added to the in-memory index; reload it
+            # from what actually made it to disk
+            self._seen = None
+            raise
+
+        logger.info(
+            f"{path}: read {result.rows_read} rows, {result.rows_new} new, "
+            f"{len(result.segments_written)} segments written"
+        )
+        return result
+
+    def ingest(self, source) -> IngestResult:
+        """
+        Fetch today's report from a DirectorySource or FTPSource and load any
+        new rows.
+        """
+        tmpdir = tempfile.mkdtemp(prefix="ovrlib-co-")
+        try:
+            return self.ingest_file(source.fetch(tmpdir))
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
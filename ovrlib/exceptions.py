@@ -20,3 +20,32 @@ class InvalidDLError(OVRLibException):
 
 class InvalidSignatureError(OVRLibException):
     pass
+
+
+# HTTP 5xx from the state's server
+class ServerError(InvalidRegistrationError):
+    pass
+
+
+# a 200 response with neither an application ID nor an error
+class EmptyResponseError(InvalidRegistrationError):
+    pass
+
+
+class RateLimitTimeout(OVRLibException):
+    pass
+
+
+# a submission may or may not have reached the state; see ovrlib.idempotency
+class SubmissionInDoubtError(OVRLibException):
+    pass
+
+
+# a replayed request that wasn't recorded; see ovrlib.cassette
+class CassetteMissError(OVRLibException):
+    pass
+
+
+# the MI API rejected a voter record; see ovrlib.mi
+class MIValidationError(InvalidRegistrationError):
+    pass
@@ -1,9 +1,13 @@
 import datetime
 import re
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-import requests
+from ._slots import slotted
+from .cache import LookupCache
+
+if TYPE_CHECKING:
+    import requests
 
 QUERY_ENDPOINT = "https://www.mvp.sos.ga.gov/MVP/voterDetails.do"
 
@@ -174,6 +178,7 @@ class GAInvalidCounty(Exception):
     pass
 
 
+@slotted
 @dataclass
 class GAVoterRegistration:
     full_name: str
@@ -233,12 +238,25 @@ class GAVoterRegistration:
 
 
 def lookup_voter(
-    first_name: str, last_name: str, date_of_birth: datetime.date, county: str, **kwargs
+    first_name: str,
+    last_name: str,
+    date_of_birth: datetime.date,
+    county: str,
+    cache: Optional[LookupCache] = None,
+    http_session: Optional["requests.Session"] = None,
+    **kwargs,
 ) -> Optional[GAVoterRegistration]:
     county_id = COUNTIES.get(county.upper())
     if not county_id:
         raise GAInvalidCounty(f"{county} is not a recognized county")
-    response = requests.post(
+    if cache is not None:
+        cache_key = cache.voter_key("GA", first_name, last_name, date_of_birth, county)
+        found, cached = cache.get(cache_key)
+        if found:
+            return cached
+    import requests  # imported here to keep `import ovrlib.ga` cheap
+
+    response = (http_session or requests).post(
         QUERY_ENDPOINT,
         headers={
             "content-type": "application/x-www-form-urlencoded",
@@ -254,6 +272,9 @@ def lookup_voter(
     if response.status_code != 200:
         return None
 
-    return GAVoterRegistration.from_page_source(
+    r = GAVoterRegistration.from_page_source(
         response.content.decode("utf-8"), date_of_birth
     )
+    if cache is not None:
+        cache.set_voter(cache_key, r)
+    return r
@@ -0,0 +1,182 @@
+"""
+Hedged requests: if an idempotent request hasn't returned after a recent
+latency percentile, send a second copy and take whichever answers first.
+
+    policy = HedgePolicy(percentile=95, max_hedge_rate=0.05)
+    session = PAOVRSession(api_key, staging=False, hedge=policy)
+
+Until an action has min_samples latencies recorded it isn't hedged.  Each
+request earns max_hedge_rate of a hedge token and each hedge spends one, so
+over time at most that fraction of requests are sent twice, even if the
+server slows down across the board.
+
+A copy only wins by succeeding: one that raises, or whose result `accept`
+rejects (PAOVRSession rejects a 5xx), waits for the other.  The losing copy
+can't be interrupted once it is on the wire (requests is blocking); its
+result is passed to `discard` (PAOVRSession closes the response) when it
+finishes.
+"""
+
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional, TypeVar
+
+logger = logging.getLogger("ovrlib.hedge")
+
+T = TypeVar("T")
+
+DEFAULT_PERCENTILE = 95.0
+DEFAULT_MAX_HEDGE_RATE = 0.05
+DEFAULT_WINDOW = 200
+DEFAULT_MIN_SAMPLES = 20
+
+
+class HedgePolicy:
+    def __init__(
+        self,
+        percentile: float = DEFAULT_PERCENTILE,
+        max_hedge_rate: float = DEFAULT_MAX_HEDGE_RATE,
+        window: int = DEFAULT_WINDOW,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+        min_delay: float = 0.0,
+        max_workers: int = 16,
+    ):
+        """
+        percentile: of the last `window` latencies for the same action, after
+        which a hedge is sent (but no sooner than min_delay seconds).
+        """
+        if not 0 < percentile <= 100:
+            raise ValueError("percentile must be in (0, 100]")
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._tokens = 0.0
+        self._max_tokens = max(1.0, max_hedge_rate * window)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ovrlib-hedge"
+        )
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = collections.deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def delay(self, key: str) -> Optional[float]:
+        """
+        How long to wait before hedging a request for key; None if there
+        isn't enough history yet
+        """
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        i = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[i])
+
+    def _timed(self, key: str, fn: Callable[[], T]) -> Callable[[], T]:
+        def call() -> T:
+            start = time.monotonic()
+            try:
+                return fn()
+            finally:
+                self.record(key, time.monotonic() - start)
+
+        return call
+
+    def _take_token(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            self.hedged += 1
+            return True
+
+    def _won(
+        self, future: concurrent.futures.Future, accept: Optional[Callable[[T], bool]]
+    ) -> bool:
+        if future.exception() is not None:
+            return False
+        return accept is None or accept(future.result())
+
+    def _discard(
+        self, future: concurrent.futures.Future, discard: Optional[Callable[[T], None]]
+    ) -> None:
+        if discard is None:
+            return
+
+        def done(f: concurrent.futures.Future) -> None:
+            if f.cancelled() or f.exception() is not None:
+                return
+            try:
+                discard(f.result())
+            except Exception as e:
+                logger.debug(f"discarding a hedge loser: {e}")
+
+        # called right away if it has already finished
+        future.add_done_callback(done)
+
+    def run(
+        self,
+        key: str,
+        fn: Callable[[], T],
+        accept: Optional[Callable[[T], bool]] = None,
+        discard: Optional[Callable[[T], None]] = None,
+    ) -> T:
+        """
+        Call fn(), hedging with a second call if the first is slow.  fn must
+        be safe to run twice concurrently.  accept: whether a result may win
+        the race; discard: called with the loser's result.
+        """
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self._max_tokens, self._tokens + self.max_hedge_rate)
+        delay = self.delay(key)
+        timed = self._timed(key, fn)
+        if delay is None:
+            return timed()
+
+        primary = self._executor.submit(timed)
+        try:
+            return primary.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+        if not self._take_token():
+            return primary.result()
+
+        logger.debug(f"{key}: no response after {delay:.3f}s; hedging")
+        hedge = self._executor.submit(timed)
+        futures: List[concurrent.futures.Future] = [primary, hedge]
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for f in futures:
+                if f in done and self._won(f, accept):
+                    if f is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    for other in futures:
+                        if other is not f:
+                            other.cancel()
+                            self._discard(other, discard)
+                    return f.result()
+        # neither succeeded: the primary's outcome stands
+        self._discard(hedge, discard)
+        return primary.result()
@@ -0,0 +1,321 @@
+"""
+Make PA submissions safe to retry.
+
+If SETAPPLICATION times out after the state received it, we can't tell
+whether the registration was accepted.  With an IdempotencyStore, register()
+records each submission, keyed on a hash of its request body, in a local
+sqlite database before sending it:
+
+    store = IdempotencyStore("/var/lib/ovr/pa-submissions.db")
+    session = PAOVRSession(api_key, staging=False, idempotency=store)
+    session.register(request)  # again and again: the state sees it once
+
+- a body that was already accepted returns the stored PAOVRResponse without
+  calling the API
+- a body whose earlier submission failed in a way that proves the state
+  didn't take it (a 4xx or an ERROR in its response, or no connection) can
+  be sent again
+- a body whose earlier submission failed in any other way (a timeout, a
+  dropped connection, a 5xx, a 200 whose body couldn't be parsed) is "in
+  doubt", as is one whose submitter died part way, and raises
+  SubmissionInDoubtError until someone reconciles it with resolve() (e.g.
+  after checking the state's records)
+
+Use one store per API environment (staging vs. production).
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from ._slots import slotted
+from .exceptions import (
+    EmptyResponseError,
+    InvalidAccessKeyError,
+    InvalidDLError,
+    InvalidRegistrationError,
+    InvalidSignatureError,
+    RateLimitTimeout,
+    ReadOnlyAccessKeyError,
+    ServerError,
+    SubmissionInDoubtError,
+)
+from .pa import PAOVRRequest, PAOVRResponse
+
+logger = logging.getLogger("ovrlib.idempotency")
+
+IN_FLIGHT = "in_flight"
+COMPLETED = "completed"
+IN_DOUBT = "in_doubt"
+
+
+def body_key(body: str) -> str:
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def was_not_sent(e: BaseException) -> bool:
+    """
+    Whether a failed request never reached the state: the connection was
+    refused, timed out or its host didn't resolve, or the rate limiter gave
+    up before sending it
+    """
+    import requests  # deferred; as in PAOVRSession._send
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(e, (requests.exceptions.ConnectTimeout, RateLimitTimeout)):
+        return True
+    if not isinstance(e, requests.exceptions.ConnectionError):
+        return False
+    # requests wraps urllib3's MaxRetryError, whose reason is what went wrong
+    seen = set()
+    pending: List[Optional[BaseException]] = [e]
+    while pending:
+        cause = pending.pop()
+        if cause is None or id(cause) in seen:
+            continue
+        seen.add(id(cause))
+        # NewConnectionError covers DNS failures too (NameResolutionError)
+        if isinstance(cause, (NewConnectionError, ConnectionRefusedError)):
+            return True
+        pending.extend(a for a in cause.args if isinstance(a, BaseException))
+        pending.extend(
+            [getattr(cause, "reason", None), cause.__cause__, cause.__context__]
+        )
+    return False
+
+
+def was_rejected(e: BaseException) -> bool:
+    """
+    Whether the state turned a submission down: a 4xx, or an ERROR in its
+    response (or the request was invalid before it was sent)
+    """
+    if isinstance(e, (ServerError, EmptyResponseError)):
+        return False
+    return isinstance(
+        e,
+        (
+            InvalidRegistrationError,
+            InvalidAccessKeyError,
+            ReadOnlyAccessKeyError,
+            InvalidDLError,
+            InvalidSignatureError,
+        ),
+    )
+
+
+def is_settled(e: BaseException) -> bool:
+    """
+    Whether a failed submission can safely be sent again: it never reached
+    the state, or the state turned it down
+    """
+    return was_not_sent(e) or was_rejected(e)
+
+
+def is_in_doubt(e: BaseException) -> bool:
+    """
+    Whether a failed submission may still have reached the state: a 5xx,
+    or a timeout or connection error other than failing to connect at all
+    """
+    if was_not_sent(e):
+        return False
+    return isinstance(e, (ServerError, OSError))
+
+
+@slotted
+@dataclass
+class Submission:
+    key: str
+    state: str
+    request: PAOVRRequest
+    started: float
+    finished: Optional[float] = None
+    response: Optional[PAOVRResponse] = None
+    error: Optional[str] = None
+
+
+class IdempotencyStore:
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            " key TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " request TEXT NOT NULL,"
+            " started REAL NOT NULL,"
+            " finished REAL,"
+            " application_id TEXT,"
+            " application_date TEXT,"
+            " signature_source TEXT,"
+            " error TEXT)"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _row_to_submission(self, row: tuple) -> Submission:
+        key, state, request, started, finished, app_id, app_date, sig, error = row
+        response = None
+        if state == COMPLETED:
+            response = PAOVRResponse(
+                application_id=app_id,
+                application_date=(
+                    datetime.datetime.fromisoformat(app_date) if app_date else None
+                ),
+                signature_source=sig,
+            )
+        return Submission(
+            key=key,
+            state=state,
+            request=PAOVRRequest.from_dict(json.loads(request)),
+            started=started,
+            finished=finished,
+            response=response,
+            error=error,
+        )
+
+    _COLUMNS = (
+        "key, state, request, started, finished, application_id,"
+        " application_date, signature_source, error"
+    )
+
+    def get(self, key: str) -> Optional[Submission]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM submissions WHERE key = ?", (key,)
+            ).fetchone()
+        return self._row_to_submission(row) if row else None
+
+    def begin(self, key: str, request: PAOVRRequest) -> Optional[PAOVRResponse]:
+        """
+        Claim key for a submission.  Returns the stored response if it was
+        already accepted (don't send it), None if the caller should send it;
+        raises SubmissionInDoubtError if an earlier attempt may have reached
+        the state or is still going.
+        """
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    f"SELECT {self._COLUMNS} FROM submissions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    db.execute(
+                        "INSERT INTO submissions (key, state, request, started)"
+                        " VALUES (?, ?, ?, ?)",
+                        (key, IN_FLIGHT, json.dumps(request.to_dict()), time.time()),
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        submission = self._row_to_submission(row)
+        if submission.response is not None:
+            return submission.response
+        raise SubmissionInDoubtError(
+            f"submission {key} is {submission.state}"
+            + (f" ({submission.error})" if submission.error else "")
+        )
+
+    def complete(self, key: str, response: PAOVRResponse) -> None:
+        date = response.application_date
+        with self._lock:
+            self._db.execute(
+                "UPDATE submissions SET state = ?, finished = ?, application_id = ?,"
+                " application_date = ?, signature_source = ?, error = NULL"
+                " WHERE key = ?",
+                (
+                    COMPLETED,
+                    time.time(),
+                    response.application_id,
+                    date.isoformat() if date else None,
+                    response.signature_source,
+                    key,
+                ),
+            )
+
+    def mark_in_doubt(self, key: str, error: BaseException) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE submissions SET state = ?, finished = ?, error = ?"
+                " WHERE key = ?",
+                (IN_DOUBT, time.time(), f"{type(error).__name__}: {error}", key),
+            )
+
+    def forget(self, key: str) -> None:
+        """
+        Drop the record for key, so it can be submitted again
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM submissions WHERE key = ?", (key,))
+
+    def run(
+        self,
+        key: str,
+        request: PAOVRRequest,
+        fn: Callable[[], PAOVRResponse],
+        settled: Callable[[BaseException], bool] = is_settled,
+    ) -> PAOVRResponse:
+        """
+        Call fn() to submit request unless key was already submitted, and
+        record the outcome.  The key is dropped, so the body can be sent
+        again, only if settled(error) says the state can't have taken it;
+        any other error leaves it in doubt.
+        """
+        stored = self.begin(key, request)
+        if stored is not None:
+            logger.info(f"submission {key} already accepted; not resending")
+            return stored
+        try:
+            response = fn()
+        except BaseException as e:
+            if isinstance(e, Exception) and settled(e):
+                self.forget(key)
+            else:
+                # e.g. a 200 we couldn't parse, or KeyboardInterrupt part way
+                logger.warning(f"submission {key} is in doubt: {e!r}")
+                self.mark_in_doubt(key, e)
+            raise
+        self.complete(key, response)
+        return response
+
+    def in_doubt(
+        self, include_in_flight_before: Optional[float] = None
+    ) -> List[Submission]:
+        """
+        Submissions that need reconciling.  include_in_flight_before: also
+        list ones still marked in flight that started before this time (their
+        submitter probably died).
+        """
+        sql = f"SELECT {self._COLUMNS} FROM submissions WHERE state = ?"
+        args: tuple = (IN_DOUBT,)
+        if include_in_flight_before is not None:
+            sql += " OR (state = ? AND started < ?)"
+            args += (IN_FLIGHT, include_in_flight_before)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY started", args).fetchall()
+        return [self._row_to_submission(row) for row in rows]
+
+    def resolve(self, key: str, response: Optional[PAOVRResponse] = None) -> None:
+        """
+        Settle an in-doubt submission: with the response if the state has
+        it, or without, to allow sending it again
+        """
+        if response is not None:
+            self.complete(key, response)
+        else:
+            self.forget(key)
@@ -0,0 +1,140 @@
+"""
+Adaptive concurrency limit (AIMD) for calls to a server whose capacity
+varies.
+
+    limiter = AIMDLimiter(initial=4, max_limit=64)
+    session = PAOVRSession(api_key, staging=False, limiter=limiter)
+    # any number of threads calling session.register(); at most
+    # limiter.limit of them are submitting at once
+
+Each call that completes normally, and faster than latency_threshold (if
+set), raises the limit by `increase / limit`, i.e. by about `increase` per
+limit's worth of calls.  A call that fails with an overload error (a 5xx,
+a timeout or other connection error) or is too slow multiplies the limit by
+`backoff`.  Only calls started after the last decrease can trigger another,
+so a burst of failures from one overloaded period backs off once.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+from .exceptions import ServerError
+
+logger = logging.getLogger("ovrlib.limiter")
+
+
+def is_overload(e: BaseException) -> bool:
+    """
+    Errors that mean "slow down": ServerError (HTTP 5xx), and timeouts and
+    connection errors (requests' exceptions are OSErrors)
+    """
+    return isinstance(e, (ServerError, OSError))
+
+
+class AIMDLimiter:
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        backoff: float = 0.5,
+        latency_threshold: Optional[float] = None,
+        is_drop: Callable[[BaseException], bool] = is_overload,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not min_limit <= initial <= max_limit:
+            raise ValueError("need min_limit <= initial <= max_limit")
+        if not 0 < backoff < 1:
+            raise ValueError("backoff must be between 0 and 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.latency_threshold = latency_threshold
+        self.is_drop = is_drop
+        self.clock = clock
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._last_decrease = clock()
+        self._cond = threading.Condition()
+        self.successes = 0
+        self.drops = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "successes": self.successes,
+                "drops": self.drops,
+            }
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[float]:
+        """
+        Wait for a free slot.  Returns the slot's start time (pass it to
+        release()), or None if timeout ran out first.
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._in_flight < self.limit, timeout=timeout
+            ):
+                return None
+            self._in_flight += 1
+            return self.clock()
+
+    def release(self, started: float, dropped: bool = False) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            now = self.clock()
+            if (
+                not dropped
+                and self.latency_threshold is not None
+                and now - started > self.latency_threshold
+            ):
+                dropped = True
+            old = self.limit
+            if dropped:
+                self.drops += 1
+                if started >= self._last_decrease:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                    self._last_decrease = now
+            else:
+                self.successes += 1
+                # don't grow a limit we aren't using
+                if 2 * (self._in_flight + 1) >= self._limit:
+                    self._limit = min(
+                        float(self.max_limit),
+                        self._limit + self.increase / self._limit,
+                    )
+            if self.limit != old:
+                logger.debug(f"concurrency limit {old} -> {self.limit}")
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Hold a slot for the duration of the block; an exception that
+        is_drop() recognizes counts as a drop
+        """
+        started = self.acquire()
+        assert started is not None
+        dropped = False
+        try:
+            yield
+        except BaseException as e:
+            dropped = self.is_drop(e)
+            raise
+        finally:
+            self.release(started, dropped)
@@ -0,0 +1,152 @@
+"""
+Normalization and fuzzy comparison helpers for matching people across
+datasets (our records vs. what a state sends back).
+"""
+
+import datetime
+import functools
+import re
+import unicodedata
+from typing import Optional, Union
+
+RE_NOT_NAME = re.compile(r"[^A-Z ]+")
+RE_NOT_DIGIT = re.compile(r"[^0-9]+")
+
+NAME_SUFFIXES = {"JR", "SR", "II", "III", "IV", "V"}
+
+SOUNDEX_CODES = {
+    **{c: "1" for c in "BFPV"},
+    **{c: "2" for c in "CGJKQSXZ"},
+    **{c: "3" for c in "DT"},
+    "L": "4",
+    **{c: "5" for c in "MN"},
+    "R": "6",
+}
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_name(name: Optional[str]) -> str:
+    """
+    Upper-case, strip accents and punctuation, drop generational suffixes and
+    collapse whitespace: " O'Brien-Smith  Jr." -> "OBRIENSMITH"
+    """
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c)).upper()
+    name = name.replace("-", " ").replace("'", "")
+    parts = [p for p in RE_NOT_NAME.sub("", name).split() if p not in NAME_SUFFIXES]
+    return "".join(parts)
+
+
+def normalize_zip(zipcode: Optional[str]) -> str:
+    """
+    The 5-digit ZIP, or "" if there isn't one
+    """
+    if not zipcode:
+        return ""
+    digits = RE_NOT_DIGIT.sub("", zipcode)
+    return digits[:5] if len(digits) >= 5 else ""
+
+
+def normalize_dob(dob: Union[None, str, datetime.date]) -> str:
+    """
+    ISO date (YYYY-MM-DD) or year (YYYY) string; "" if unknown.
+    """
+    if not dob:
+        return ""
+    if isinstance(dob, datetime.date):
+        return dob.isoformat()
+    dob = dob.strip()
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%Y%m%d"):
+        try:
+            return datetime.datetime.strptime(dob[:10], fmt).date().isoformat()
+        except ValueError:
+            pass
+    if len(dob) == 4 and dob.isdigit():
+        return dob
+    return ""
+
+
+@functools.lru_cache(maxsize=65536)
+def soundex(name: str) -> str:
+    """
+    American Soundex code of an already-normalized name
+    """
+    if not name:
+        return ""
+    first = name[0]
+    out = [first]
+    last = SOUNDEX_CODES.get(first, "")
+    for c in name[1:]:
+        code = SOUNDEX_CODES.get(c, "")
+        if code and code != last:
+            out.append(code)
+            if len(out) == 4:
+                break
+        if c not in "HW":
+            last = code
+    return "".join(out).ljust(4, "0")
+
+
+def jaro_winkler(a: str, b: str, prefix_scale: float = 0.1) -> float:
+    """
+    Jaro-Winkler similarity, 0.0 (nothing alike) .. 1.0 (identical)
+    """
+    if a == b:
+        return 1.0 if a else 0.0
+    la, lb = len(a), len(b)
+    if not la or not lb:
+        return 0.0
+    window = max(la, lb) // 2 - 1
+    a_matched = [False] * la
+    b_matched = [False] * lb
+    matches = 0
+    for i, c in enumerate(a):
+        lo = max(0, i - window)
+        hi = min(lb, i + window + 1)
+        for j in range(lo, hi):
+            if not b_matched[j] and b[j] == c:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    transpositions = 0
+    j = 0
+    for i in range(la):
+        if a_matched[i]:
+            while not b_matched[j]:
+                j += 1
+            if a[i] != b[j]:
+                transpositions += 1
+            j += 1
+    m = float(matches)
+    jaro = (m / la + m / lb + (m - transpositions / 2) / m) / 3
+    prefix = 0
+    for ca, cb in zip(a[:4], b[:4]):
+        if ca != cb:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+def dob_similarity(a: str, b: str) -> Optional[float]:
+    """
+    Compare two normalize_dob() values; None if either is unknown.  A bare
+    year matches the year of a full date.
+    """
+    if not a or not b:
+        return None
+    if a == b:
+        return 1.0
+    if len(a) == 4 or len(b) == 4:
+        return 0.9 if a[:4] == b[:4] else 0.0
+    # one transposed or mistyped component (e.g. day and month swapped)
+    ya, ma, da = a.split("-")
+    yb, mb, db = b.split("-")
+    if (ya, ma, da) == (yb, db, mb):
+        return 0.8
+    if sum(x == y for x, y in ((ya, yb), (ma, mb), (da, db))) == 2:
+        return 0.6
+    return 0.0
@@ -0,0 +1,307 @@
+"""
+Find out where a long bulk run's memory goes, by ovrlib phase:
+
+    profiler = MemoryProfiler(interval=60, sample_rate=0.05)
+    session = PAOVRSession(api_key, staging=False, profiler=profiler)
+    with profiler:
+        SubmissionWorker(queue, session).run()
+    print(profiler.report())
+
+While active, the profiler traces allocations with tracemalloc and, at most
+every `interval` seconds (checked whenever the session finishes a
+registration), takes a snapshot of what is still allocated.  Each allocation
+is put in the phase of the innermost ovrlib function in its traceback:
+
+- build: rendering request bodies (PAOVRRequest.to_request_body, batches)
+- send: the HTTP request and reading the response
+- parse: decoding and parsing the response
+- result: PAOVRResponse and recording it (queue, idempotency store)
+
+and anything else in "other".  A phase whose memory never shrank over the
+last `leak_snapshots` snapshots and grew by leak_min_growth bytes in all is
+flagged as a possible leak (and logged).
+
+tracemalloc slows allocation-heavy code down noticeably, so the profiler
+turns itself on for only `sample_rate` of the runs it's started for; the
+snapshots cost time proportional to the number of distinct allocation
+sites, not to the number of allocations.  Memory that lxml allocates for
+its own trees is not traced; peak_rss (where the resource module exists)
+shows it.
+"""
+
+import importlib
+import inspect
+import logging
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ._slots import slotted
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+logger = logging.getLogger("ovrlib.memprofile")
+
+BUILD = "build"
+SEND = "send"
+PARSE = "parse"
+RESULT = "result"
+OTHER = "other"
+
+# phase -> "module:qualname" of the functions whose allocations belong to it
+DEFAULT_PHASES = {
+    BUILD: [
+        "ovrlib.pa:PAOVRRequest.to_request_body",
+        "ovrlib.pa:PAOVRRequest.from_dict",
+        "ovrlib.pa:render_request_body",
+        "ovrlib.pa_batch:PAOVRRequestBatch.iter_bodies",
+        "ovrlib.pa_parallel:PAOVRBodyPool.map",
+        "ovrlib.mi:MIOVRRequest.to_dict",
+    ],
+    SEND: [
+        "ovrlib.pa:PAOVRSession._send",
+        "ovrlib.pa:PAOVRSession._do_request_unparsed",
+        "ovrlib.mi:MIOVRSession._send",
+    ],
+    PARSE: [
+        "ovrlib.pa:PAOVRSession._do_request",
+        "ovrlib.pa:PAOVRSession.iter_records",
+        "ovrlib.mi:MIOVRSession._request",
+    ],
+    RESULT: [
+        "ovrlib.pa:PAOVRResponse.from_response_body",
+        "ovrlib.pa_queue:SubmissionQueue.complete",
+        "ovrlib.pa_queue:SubmissionQueue.fail",
+        "ovrlib.idempotency:IdempotencyStore.complete",
+        "ovrlib.mi:MIOVRResponse.from_json",
+        "ovrlib.mi:MIOVRBatchResponse.from_json",
+    ],
+}
+
+DEFAULT_INTERVAL = 60.0
+DEFAULT_FRAMES = 32
+DEFAULT_LEAK_SNAPSHOTS = 5
+DEFAULT_LEAK_MIN_GROWTH = 1 << 20
+
+
+@slotted
+@dataclass
+class MemorySnapshot:
+    taken: float
+    # bytes allocated through tracemalloc and still live
+    traced: int
+    # phase -> live bytes
+    phases: Dict[str, int]
+    # phase -> [("file:line", live bytes)], largest first
+    top: Dict[str, List[Tuple[str, int]]] = field(default_factory=dict)
+    peak_rss: Optional[int] = None
+
+
+def _resolve(name: str) -> Optional[Tuple[str, int, int]]:
+    """
+    "module:qualname" -> (file, first line, last line) of its source
+    """
+    module_name, _, qualname = name.partition(":")
+    try:
+        obj: Any = importlib.import_module(module_name)
+        for attr in qualname.split("."):
+            obj = getattr(obj, attr)
+        obj = inspect.unwrap(getattr(obj, "__func__", obj))
+        lines, first = inspect.getsourcelines(obj)
+        filename = inspect.getsourcefile(obj)
+    except (ImportError, AttributeError, OSError, TypeError) as e:
+        logger.warning(f"can't profile {name}: {e}")
+        return None
+    if filename is None:
+        return None
+    return filename, first, first + len(lines) - 1
+
+
+def _peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class MemoryProfiler:
+    def __init__(
+        self,
+        interval: float = DEFAULT_INTERVAL,
+        sample_rate: float = 1.0,
+        frames: int = DEFAULT_FRAMES,
+        top: int = 5,
+        leak_snapshots: int = DEFAULT_LEAK_SNAPSHOTS,
+        leak_min_growth: int = DEFAULT_LEAK_MIN_GROWTH,
+        phases: Optional[Dict[str, List[str]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        frames: traceback depth to record; it has to reach from where memory
+        is allocated (e.g. inside requests) back to the ovrlib function.
+        phases: like DEFAULT_PHASES, to attribute other functions too.
+        """
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.frames = frames
+        self.top = top
+        self.leak_snapshots = leak_snapshots
+        self.leak_min_growth = leak_min_growth
+        self.phases = DEFAULT_PHASES if phases is None else phases
+        self.clock = clock
+        self.active = False
+        self.snapshots: List[MemorySnapshot] = []
+        self._lock = threading.Lock()
+        self._started_tracing = False
+        self._last = 0.0
+        # file -> [(first line, last line, phase)]
+        self._ranges: Dict[str, List[Tuple[int, int, str]]] = {}
+
+    def __enter__(self) -> "MemoryProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> bool:
+        """
+        Start tracing if this run is in the sample; returns whether it is
+        """
+        if self.active:
+            return True
+        if random.random() >= self.sample_rate:
+            return False
+        self._ranges = {}
+        for phase, names in self.phases.items():
+            for name in names:
+                found = _resolve(name)
+                if found is not None:
+                    filename, first, last = found
+                    self._ranges.setdefault(filename, []).append((first, last, phase))
+        if tracemalloc.is_tracing():
+            if tracemalloc.get_traceback_limit() < self.frames:
+                logger.warning(
+                    f"tracemalloc is already tracing "
+                    f"{tracemalloc.get_traceback_limit()} frames; phases may "
+                    f"be missed"
+                )
+        else:
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self.active = True
+        self._last = self.clock()
+        return True
+
+    def stop(self) -> None:
+        """
+        Take a last snapshot and stop tracing (if we started it)
+        """
+        if not self.active:
+            return
+        self.snapshot()
+        self.active = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def checkpoint(self) -> Optional[MemorySnapshot]:
+        """
+        Take a snapshot if one is due; cheap otherwise
+        """
+        if not self.active or self.clock() - self._last < self.interval:
+            return None
+        return self.snapshot()
+
+    def _phase(self, traceback: tracemalloc.Traceback) -> str:
+        # innermost frame first
+        for frame in reversed(traceback):
+            for first, last, phase in self._ranges.get(frame.filename, ()):
+                if first <= frame.lineno <= last:
+                    return phase
+        return OTHER
+
+    def snapshot(self) -> MemorySnapshot:
+        with self._lock:
+            self._last = self.clock()
+            raw = tracemalloc.take_snapshot().filter_traces(
+                [
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__),
+                ]
+            )
+            phases = {phase: 0 for phase in self.phases}
+            phases[OTHER] = 0
+            sites: Dict[str, Dict[str, int]] = {}
+            traced = 0
+            # one entry per distinct traceback, not per allocation
+            for stat in raw.statistics("traceback"):
+                phase = self._phase(stat.traceback)
+                phases[phase] += stat.size
+                traced += stat.size
+                frame = stat.traceback[-1]
+                site = f"{frame.filename}:{frame.lineno}"
+                by_site = sites.setdefault(phase, {})
+                by_site[site] = by_site.get(site, 0) + stat.size
+            snapshot = MemorySnapshot(
+                taken=time.time(),
+                traced=traced,
+                phases=phases,
+                top={
+                    phase: sorted(by_site.items(), key=lambda s: -s[1])[: self.top]
+                    for phase, by_site in sites.items()
+                },
+                peak_rss=_peak_rss(),
+            )
+            self.snapshots.append(snapshot)
+        leaks = self.leaks()
+        if leaks:
+            logger.warning(f"memory growing steadily in phases: {', '.join(leaks)}")
+        return snapshot
+
+    def leaks(self) -> List[str]:
+        """
+        Phases whose memory has only grown over the last leak_snapshots
+        snapshots
+        """
+        recent = self.snapshots[-self.leak_snapshots :]
+        if len(recent) < max(2, self.leak_snapshots):
+            return []
+        r = []
+        for phase in recent[-1].phases:
+            sizes = [s.phases.get(phase, 0) for s in recent]
+            if (
+                all(a <= b for a, b in zip(sizes, sizes[1:]))
+                and sizes[-1] - sizes[0] >= self.leak_min_growth
+            ):
+                r.append(phase)
+        return r
+
+    def report(self) -> str:
+        if not self.snapshots:
+            return "no memory snapshots"
+        first, last = self.snapshots[0], self.snapshots[-1]
+        lines = [
+            f"{len(self.snapshots)} snapshots over {last.taken - first.taken:.0f}s; "
+            f"traced {last.traced / 2**20:.1f} MiB"
+            + (f", peak RSS {last.peak_rss / 2**20:.1f} MiB" if last.peak_rss else "")
+        ]
+        for phase, size in sorted(last.phases.items(), key=lambda p: -p[1]):
+            growth = size - first.phases.get(phase, 0)
+            lines.append(
+                f"  {phase}: {size / 2**20:.1f} MiB ({growth / 2**20:+.1f} MiB)"
+            )
+            for site, site_size in last.top.get(phase, []):
+                lines.append(f"    {site}: {site_size / 2**10:.0f} KiB")
+        leaks = self.leaks()
+        if leaks:
+            lines.append(f"possible leaks: {', '.join(leaks)}")
+        return "\n".join(lines)
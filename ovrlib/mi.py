@@ -0,0 +1,470 @@
+"""
+Michigan's online voter registration API (see MI/README.md).
+
+    session = MIOVRSession(base_url, sender_name="Example Org")
+    response = session.register(
+        MIOVRRequest(
+            sender_record_id="1",
+            full_name="Sally Wolverine",
+            date_of_birth=datetime.date(1944, 5, 2),
+            dl_number="S123456789012",
+            ssn4="1234",
+            address1="123 A St",
+            city="Lansing",
+            zipcode="48933",
+            is_citizen=True,
+            is_eighteen=True,
+            is_thirty_day_resident=True,
+        )
+    )
+
+For volume, register_many() sends batches (PostOnlineVoterBatch) from a few
+threads at once and yields each MIOVRBatchResponse, whose errors are keyed
+by sender_record_id; batch_status() reports on each record later.
+
+The state issues the base URL (and any client certificate or headers) once
+an organization passes its security review; configure credentials on the
+http_session passed in.  Without one, the session makes its own
+requests.Session with a connection pool of pool_maxsize connections.  The
+API's documentation doesn't say how the yes/no fields (sent as strings) are
+spelled; we send "Y" and "N" (YES and NO).
+"""
+
+import collections
+import concurrent.futures
+import datetime
+import itertools
+import logging
+import re
+from dataclasses import dataclass, field, fields
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+from ._slots import slotted
+from .exceptions import InvalidRegistrationError, MIValidationError, ServerError
+from .limiter import AIMDLimiter
+
+if TYPE_CHECKING:
+    import requests
+
+    from .memprofile import MemoryProfiler
+    from .ratelimit import SharedRateLimiter
+
+logger = logging.getLogger("ovrlib.mi")
+
+REGISTER_PATH = "api/OnlineVoter/PostOnlineVoter"
+BATCH_PATH = "api/OnlineVoter/PostOnlineVoterBatch"
+BATCH_STATUS_PATH = "api/OnlineVoter/GetOnlineVoterBatchStatus"
+STREET_MATCH_PATH = "api/OnlineVoter/GetOnlineVoterStreetMatch"
+HEALTH_CHECK_PATH = "api/OnlineVoter/HealthCheck"
+
+YES = "Y"
+NO = "N"
+
+# what the API accepts in SenderName (at most 100 characters) and the
+# street match's address fields
+RE_SENDER_TEXT = re.compile(r"^[a-zA-Z0-9 _#/',.-]*$")
+MAX_SENDER_NAME = 100
+
+DEFAULT_POOL_MAXSIZE = 16
+# seconds to wait to connect or for the next bytes of a response, as for
+# PAOVRSession
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_BATCH_CONCURRENCY = 4
+
+# MIOVRRequest attribute -> OnlineVoter field
+FIELDS = {
+    "sender_record_id": "SenderRecordId",
+    "full_name": "FullName",
+    "dl_number": "DLN",
+    "ssn4": "SSNFour",
+    "address1": "AddressLine1",
+    "address2": "AddressLine2",
+    "city": "City",
+    "zipcode": "Zip",
+    "is_citizen": "IsCitizen",
+    "is_eighteen": "IsEighteen",
+    "is_thirty_day_resident": "IsThirtyDayResident",
+    "registration_cancellation_authorized": "RegistrationCancellationAuthorized",
+    "digital_signature_authorized": "DigitalSignatureAuthorized",
+    "dl_address_update": "DLNAddressUpdate",
+    "dl_duplicate": "DLNDuplicate",
+    "eye_color": "EyeColor",
+    "phone": "PhoneNumber",
+    "email": "EmailAddress",
+    "mailing_address_international": "MailingAddressIsInternational",
+    "mailing_address1": "MailingAddressLineOne",
+    "mailing_address2": "MailingAddressLineTwo",
+    "mailing_address3": "MailingAddressLineThree",
+    "mailing_address4": "MailingAddressLineFour",
+    "mailing_address5": "MailingAddressLineFive",
+    "status_id": "StatusId",
+}
+
+
+@slotted
+@dataclass
+class MIOVRRequest:
+    sender_record_id: str
+    full_name: str
+    date_of_birth: datetime.date
+    dl_number: str
+    ssn4: str
+    address1: str
+    city: str
+    zipcode: str
+    is_citizen: bool
+    is_eighteen: bool
+    is_thirty_day_resident: bool
+
+    address2: Optional[str] = None
+    registration_cancellation_authorized: Optional[bool] = None
+    digital_signature_authorized: Optional[bool] = None
+    dl_address_update: Optional[bool] = None
+    dl_duplicate: Optional[bool] = None
+    eye_color: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+
+    mailing_address_international: Optional[bool] = None
+    mailing_address1: Optional[str] = None
+    mailing_address2: Optional[str] = None
+    mailing_address3: Optional[str] = None
+    mailing_address4: Optional[str] = None
+    mailing_address5: Optional[str] = None
+
+    status_id: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        The OnlineVoter JSON object (fields that are None are left out)
+        """
+        if not (self.is_citizen and self.is_eighteen):
+            raise InvalidRegistrationError(
+                "voter must be a citizen and 18 by election day"
+            )
+        r: Dict[str, Any] = {}
+        for f in fields(self):
+            v = getattr(self, f.name)
+            if v is None or f.name == "date_of_birth":
+                continue
+            if isinstance(v, bool):
+                v = YES if v else NO
+            r[FIELDS[f.name]] = v
+        r["BirthMonth"] = self.date_of_birth.month
+        r["BirthDay"] = self.date_of_birth.day
+        r["BirthYear"] = self.date_of_birth.year
+        return r
+
+
+@slotted
+@dataclass
+class MIOVRResponse:
+    is_valid: bool
+    voter_status_id: Optional[int]
+    voter_status_description: Optional[str]
+    validation_messages: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "MIOVRResponse":
+        errors = data.get("VoterErrors") or {}
+        return cls(
+            is_valid=bool(data.get("IsValid")),
+            voter_status_id=_int(data.get("VoterStatusId")),
+            voter_status_description=data.get("VoterStatusDescription"),
+            validation_messages=list(errors.get("ValidationMessage") or []),
+        )
+
+
+@slotted
+@dataclass
+class MIOVRBatchResponse:
+    batch_id: Optional[int]
+    batch_status_id: Optional[int]
+    is_valid: bool
+    # sender_record_id -> validation messages, for records that had any
+    errors: Dict[str, List[str]] = field(default_factory=dict)
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "MIOVRBatchResponse":
+        errors: Dict[str, List[str]] = {}
+        for e in data.get("VoterErrors") or []:
+            messages = list(e.get("ValidationMessage") or [])
+            if messages or not e.get("IsValid", True):
+                errors.setdefault(e.get("SenderRecordId") or "", []).extend(messages)
+        return cls(
+            batch_id=_int(data.get("BatchId")),
+            batch_status_id=_int(data.get("BatchStatusId")),
+            is_valid=bool(data.get("IsValid")),
+            errors=errors,
+        )
+
+
+@slotted
+@dataclass
+class MIRecordStatus:
+    sender_record_id: str
+    status_id: Optional[int]
+    description: Optional[str]
+
+
+@slotted
+@dataclass
+class MIBatchStatus:
+    batch_id: Optional[int]
+    batch_status_id: Optional[int]
+    description: Optional[str]
+    records: List[MIRecordStatus]
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "MIBatchStatus":
+        return cls(
+            batch_id=_int(data.get("BatchId")),
+            batch_status_id=_int(data.get("BatchStatusId")),
+            description=data.get("StatusDescription"),
+            records=[
+                MIRecordStatus(
+                    sender_record_id=r.get("SenderRecordId"),
+                    status_id=_int(r.get("RecordStatusId")),
+                    description=r.get("RecordStatusDescription"),
+                )
+                for r in data.get("BatchVoters") or []
+            ],
+        )
+
+
+@slotted
+@dataclass
+class MIStreetRange:
+    house_number_low: Optional[int]
+    house_number_high: Optional[int]
+    # the whole OnlineVoterStreetRange, as returned
+    raw: Dict[str, Any]
+
+
+def _int(value: Any) -> Optional[int]:
+    # the API's "decimal number"s come back as e.g. 3.0
+    return None if value is None else int(value)
+
+
+def _check_sender_text(name: str, value: str, max_length: int) -> None:
+    if len(value) > max_length or not RE_SENDER_TEXT.match(value):
+        raise InvalidRegistrationError(
+            f"{name} must be at most {max_length} letters, digits and _#/',.-"
+        )
+
+
+class MIOVRSession:
+    def __init__(
+        self,
+        base_url: str,
+        sender_name: str,
+        http_session: Optional["requests.Session"] = None,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+        limiter: Optional[AIMDLimiter] = None,
+        rate_limiter: Optional["SharedRateLimiter"] = None,
+        profiler: Optional["MemoryProfiler"] = None,
+    ):
+        """
+        base_url: the API root the state gave you (ending before "api/").
+        http_session: a requests.Session carrying your credentials (or
+        ovrlib.cassette adapters); otherwise one is made, keeping up to
+        pool_maxsize connections open.  timeout, limiter, rate_limiter and
+        profiler work as they do for PAOVRSession.
+        """
+        import requests  # deferred; building bodies doesn't need it
+        from requests.adapters import HTTPAdapter
+
+        _check_sender_text("sender_name", sender_name, MAX_SENDER_NAME)
+        self.base_url = base_url.rstrip("/") + "/"
+        self.sender_name = sender_name
+        if http_session is None:
+            http_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+            http_session.mount("https://", adapter)
+            http_session.mount("http://", adapter)
+            self._owns_http_session = True
+        else:
+            self._owns_http_session = False
+        self.http_session = http_session
+        self.timeout = timeout
+        self.limiter = limiter
+        self.rate_limiter = rate_limiter
+        self.profiler = profiler
+
+    def close(self) -> None:
+        if self._owns_http_session:
+            self.http_session.close()
+
+    def __enter__(self) -> "MIOVRSession":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _send(
+        self, action: str, method: str, body: Optional[Dict[str, Any]]
+    ) -> "requests.Response":
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire(action)
+            if waited:
+                logger.debug(f"{action} rate limited for {waited:.3f}s")
+        return self.http_session.request(
+            method,
+            self.base_url + action,
+            json=body,
+            headers={"Accept": "application/json"},
+            timeout=self.timeout,
+        )
+
+    def _request(
+        self, action: str, method: str, body: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        response = self._send(action, method, body)
+        logger.debug(f"{action} Status: {response.status_code}")
+        if response.status_code >= 500:
+            raise ServerError(f"HTTP status code {response.status_code}")
+        if response.status_code != 200:
+            raise InvalidRegistrationError(f"HTTP status code {response.status_code}")
+        data = response.json() if response.content else None
+        if isinstance(data, dict) and data.get("HasError"):
+            raise InvalidRegistrationError(
+                f"{action}: {data.get('ErrorMessage') or 'error'}"
+            )
+        return data
+
+    def _submit(self, action: str, body: Dict[str, Any]) -> Any:
+        try:
+            if self.limiter is not None:
+                with self.limiter.slot():
+                    return self._request(action, "POST", body)
+            return self._request(action, "POST", body)
+        finally:
+            if self.profiler is not None:
+                self.profiler.checkpoint()
+
+    def health_check(self) -> bool:
+        try:
+            self._request(HEALTH_CHECK_PATH, "GET")
+        except InvalidRegistrationError:
+            return False
+        return True
+
+    def register(self, registration: MIOVRRequest) -> MIOVRResponse:
+        """
+        Submit one voter registration; raises MIValidationError if the state
+        rejects it
+        """
+        body = {"SenderName": self.sender_name, "Voter": registration.to_dict()}
+        response = MIOVRResponse.from_json(self._submit(REGISTER_PATH, body))
+        if not response.is_valid:
+            raise MIValidationError(
+                "; ".join(response.validation_messages) or "invalid registration"
+            )
+        return response
+
+    def register_batch(
+        self, registrations: Iterable[MIOVRRequest]
+    ) -> MIOVRBatchResponse:
+        """
+        Submit registrations as one batch.  Records the state rejects are
+        in the response's errors rather than raised; each needs its own
+        sender_record_id to tell them apart.
+        """
+        voters = []
+        seen = set()
+        for r in registrations:
+            if not r.sender_record_id or r.sender_record_id in seen:
+                raise InvalidRegistrationError(
+                    f"batch needs a unique sender_record_id, not {r.sender_record_id!r}"
+                )
+            seen.add(r.sender_record_id)
+            voters.append(r.to_dict())
+        body = {"SenderName": self.sender_name, "BatchVoters": voters}
+        return MIOVRBatchResponse.from_json(self._submit(BATCH_PATH, body))
+
+    def register_many(
+        self,
+        registrations: Iterable[MIOVRRequest],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    ) -> Iterator[MIOVRBatchResponse]:
+        """
+        Submit registrations in batches of batch_size, with up to
+        `concurrency` batches in flight, yielding their responses in order.
+        Only the batches in flight are held in memory.
+
+        If a batch fails, no more are sent; the responses of the others
+        already in flight are still yielded (they may have been accepted),
+        and then the first error is raised.
+        """
+        registrations = iter(registrations)
+        with concurrent.futures.ThreadPoolExecutor(
+            concurrency, thread_name_prefix="ovrlib-mi"
+        ) as pool:
+            pending: Deque[concurrent.futures.Future] = collections.deque()
+            error: Optional[BaseException] = None
+            while True:
+                while error is None and len(pending) < concurrency:
+                    batch = list(itertools.islice(registrations, batch_size))
+                    if not batch:
+                        break
+                    pending.append(pool.submit(self.register_batch, batch))
+                if not pending:
+                    break
+                future = pending.popleft()
+                e = future.exception()
+                if e is None:
+                    yield future.result()
+                elif error is None:
+                    error = e
+                else:
+                    logger.warning(f"another batch failed too: {e!r}")
+            if error is not None:
+                raise error
+
+    def batch_status(self, batch_id: int) -> MIBatchStatus:
+        body = {"SenderName": self.sender_name, "BatchId": batch_id}
+        return MIBatchStatus.from_json(self._request(BATCH_STATUS_PATH, "GET", body))
+
+    def street_match(
+        self, address1: str, city: str, zipcode: str
+    ) -> List[MIStreetRange]:
+        """
+        Street index ranges in the state's voter file that may match the
+        address; [] if none do
+        """
+        _check_sender_text("address1", address1, 50)
+        _check_sender_text("city", city, 100)
+        if not re.match(r"^[0-9]{5}$", zipcode):
+            raise InvalidRegistrationError("zipcode must be 5 digits")
+        data = self._request(
+            STREET_MATCH_PATH,
+            "GET",
+            {
+                "SenderName": self.sender_name,
+                "AddressLine1": address1,
+                "City": city,
+                "ZipCode": zipcode,
+            },
+        )
+        if not data.get("IsValid", True):
+            raise MIValidationError("; ".join(data.get("ValidationMessage") or []))
+        return [
+            MIStreetRange(
+                house_number_low=_int(s.get("HouseNumberLow")),
+                house_number_high=_int(s.get("HouseNumberHigh")),
+                raw=s,
+            )
+            for s in data.get("MatchingStreets") or []
+        ]
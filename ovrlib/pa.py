@@ -1,29 +1,71 @@
 import base64
+import codecs
 import datetime
 import json
 import logging
 import re
-from dataclasses import dataclass
-from typing import Dict, Optional, List
+from dataclasses import dataclass, fields
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    Optional,
+    List,
+    Tuple,
+    TypeVar,
+)
 import urllib.parse
 
-import requests
 from lxml import etree  # type: ignore
 
+if TYPE_CHECKING:
+    import requests
+
+    from .idempotency import IdempotencyStore
+    from .memprofile import MemoryProfiler
+    from .ratelimit import SharedRateLimiter
+
+from ._slots import slotted
+from .hedge import HedgePolicy
+from .limiter import AIMDLimiter
+from .singleflight import SingleFlight
 from .exceptions import (
+    EmptyResponseError,
     InvalidAccessKeyError,
     InvalidDLError,
     InvalidRegistrationError,
     InvalidSignatureError,
     ReadOnlyAccessKeyError,
+    ServerError,
 )
 
 STAGING_URL = "https://paovrwebapi.beta.votespa.com/SureOVRWebAPI/api/ovr"
 PROD_URL = "https://paovrwebapi.votespa.com/SureOVRWebAPI/api/ovr"
+# seconds to wait to connect or for the next bytes of a response; without
+# one a hung request would hold its limiter slot forever
+DEFAULT_TIMEOUT = 60.0
 
 
 logger = logging.getLogger("ovrlib.pa")
 
+T = TypeVar("T")
+
+# Requests that don't change anything on the state's side.  Concurrent
+# identical ones (same URL: key, action, params, language) share a single
+# HTTP request and parsed result; see PAOVRSession(coalesce=...).
+READ_ONLY_ACTIONS = {
+    "GETAPPLICATIONSETUP",
+    "GETERRORVALUES",
+    "GETMUNICIPALITIES",
+    "GETXMLTEMPLATE",
+}
+
+# shared by all sessions, so that e.g. one session per web request still
+# coalesces
+_read_only_flights = SingleFlight()
+
 
 """
 
@@ -39,7 +81,7 @@ These parts of the API are optional and not current supported:
 
 """
 
-# A few regexes for normalize_address_unit()
+# A few regexes for split_address_unit()
 RE_BARE_NUMBER = re.compile(r"^#?(\d+)$")
 RE_BARE_UNIT_NUMBER = re.compile(r"^(\w+)\.? (\d+)$")
 RE_TRAILING_NUMBER = re.compile(r"^(.*) #(\d+)$")
@@ -168,6 +210,233 @@ XML_TEMPLATE = "<APIOnlineApplicationData xmlns='OVRexternaldata'>  <record>
 
 ## end constants
 
+SIG_TYPES = ["tiff", "png", "jpg", "bmp", "jpeg"]
+
+REQUIRED_FIELDS = {
+    "first_name": "FirstName",
+    "last_name": "LastName",
+    "date_of_birth": None,
+    "address1": "streetaddress",
+    "city": "city",
+    "county": "county",
+    "zipcode": "zipcode",
+    "party": None,  # multiple
+    "united_states_citizen": "united-states-citizen",
+    "eighteen_on_election_day": "eighteen-on-election-day",
+    "declaration": "declaration1",
+}
+
+OPTIONAL_FIELDS = {
+    "is_new": None,
+    "federal_voter": "isfederalvoter",
+    "middle_name": "MiddleName",
+    "suffix": "TitleSuffix",  # The API enumerates valid suffixes, but seems to accept any value here.
+    "address2": "streetaddress2",
+    "municipality": "municipality",  # a MunicipalityIDname in the county
+    "email": "email",
+    "phone": "phone",
+    "gender": None,
+    # "race": None,
+    "unit_type": "unittype",
+    "unit_number": "unitnumber",
+    "dl_number": "drivers-license",
+    "ssn4": "ssn4",
+    # if change of name, address
+    "previous_first_name": "previousregfirstname",
+    "previous_middle_name": "previousregmiddlename",
+    "previous_last_name": "previousreglastname",
+    "previous_address": "previousregaddress",
+    "previous_city": "previousregcity",
+    "previous_state": "previousregstate",
+    "previous_zipcode": "previousregzip",
+    "previous_county": "previousregcounty",
+    "previous_year": "previousregyear",
+    # mailing address
+    "mailing_address": "Mailingaddress",
+    "mailing_city": "mailingcity",
+    "mailing_state": "mailingstate",
+    "mailing_zipcode": "mailingzipcode",
+    # VBM
+    "mailin_ballot_request": "ismailin",
+    "mailin_ballot_to_registration_address": None,
+    "mailin_ballot_to_mailing_address": None,
+    "mailin_ballot_address": "mailinballotaddr",
+    "mailin_ballot_city": "mailincity",
+    "mailin_ballot_state": "mailincity",
+    "mailin_ballot_zipcode": "mailinzipcode",
+}
+
+
+def split_address_unit(
+    address1: str, address2: Optional[str]
+) -> Optional[Tuple[str, Optional[str], str, str]]:
+    """
+    Look for a recognized unit in address2, then at the end of address1.
+    Returns (address1, address2, unit_type, unit_number) with the unit moved
+    out of the address line, or None if there isn't one.
+    """
+    # first try address2 field
+    if address2 is not None:
+        m = RE_BARE_NUMBER.match(address2.strip())
+        if m:
+            return address1, None, "UNIT", m[1]
+
+        m = RE_BARE_UNIT_NUMBER.match(address2.strip())
+        if m:
+            if m[1].lower() in UNIT_TYPE:
+                return address1, None, UNIT_TYPE[m[1].lower()], m[2]
+            if m[1].upper() in UNIT_TYPE.values():
+                return address1, None, m[1].upper(), m[2]
+
+    if not address1:
+        return None
+
+    # then look for suffix on address1
+    # try trailing portion of address1
+    m = RE_TRAILING_NUMBER.match(address1.strip())
+    if m:
+        return m[1].strip(), address2, "UNIT", m[2]
+
+    m = RE_TRAILING_UNIT_NUMBER.match(address1.strip())
+    if m:
+        if m[2].lower() in UNIT_TYPE:
+            return m[1], address2, UNIT_TYPE[m[2].lower()], m[3]
+        if m[2].upper() in UNIT_TYPE.values():
+            return m[1], address2, m[2].upper(), m[3]
+    return None
+
+
+def map_party(party: str) -> Dict[str, str]:
+    """
+    Request values for a party name ("Democrat", "Green", "Pirate", ...)
+    """
+    party = party.lower()
+    if party in ["democrat"]:
+        party = "democratic"
+    elif not party or party.startswith("none"):
+        party = "none (no affiliation)"
+    if party in PARTY:
+        return {"politicalparty": PARTY[party]}
+    return {"politicalparty": PARTY["other"], "otherpoliticalparty": party}
+
+
+def map_gender(gender: str) -> str:
+    if gender.lower() in GENDER:
+        return GENDER[gender.lower()].lower()
+    elif gender.upper() in GENDER.values():
+        return gender.upper()
+    raise InvalidRegistrationError(
+        f"gender '{gender}' not recognized; must be one of {GENDER}"
+    )
+
+
+def encode_signature(signature: bytes, signature_type: Optional[str]) -> str:
+    if signature_type not in SIG_TYPES:
+        raise InvalidRegistrationError(f"signature_type must be one of {SIG_TYPES}")
+    if signature_type == "jpeg":
+        signature_type = "jpg"
+    return f"data:image/{signature_type};base64,{base64.b64encode(signature).decode('utf-8')}"
+
+
+def render_request_body(vals: Dict[str, str]) -> str:
+    """
+    Fill XML_TEMPLATE with vals (keyed by XML tag) and wrap it for the API
+    """
+    root = etree.fromstring(XML_TEMPLATE)
+    for record in root:
+        for i in record:
+            k = i.tag.split("}")[1]  # strip of "{xmlns}" prefix
+            if k in vals:
+                i.text = str(vals[k])
+    xml = etree.tostring(root).decode("utf-8")
+    return json.dumps({"ApplicationData": xml})
+
+
+def _complete_escapes(text: str) -> int:
+    """
+    Length of the prefix of (the inside of) a JSON string that can be
+    decoded on its own: everything but a trailing escape sequence that may
+    be cut short, including a \\u high surrogate waiting for its pair
+    """
+    n = len(text)
+    # an escape that might be incomplete starts in the last 12 characters;
+    # begin before that at the start of a run of backslashes, which is
+    # always the start of an escape
+    i = max(0, n - 18)
+    while i > 0 and text[i - 1] == "\\":
+        i -= 1
+    while i < n:
+        if text[i] != "\\":
+            i += 1
+        elif i + 1 >= n:
+            return i
+        elif text[i + 1] != "u":
+            i += 2
+        elif i + 6 > n:
+            return i
+        elif 0xD800 <= int(text[i + 2 : i + 6], 16) < 0xDC00 and i + 12 > n:
+            return i
+        else:
+            i += 6
+    return n
+
+
+class JSONStringDecoder:
+    """
+    Incrementally decode a JSON document that is a single string (which is
+    how the PA API wraps its XML), without holding all of it:
+
+        decoder = JSONStringDecoder()
+        for chunk in chunks:
+            parser.feed(decoder.feed(chunk))
+        decoder.close()
+    """
+
+    def __init__(self) -> None:
+        self._pending = ""
+        self._started = False
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            if chunk.strip():
+                raise ValueError("extra data after JSON string")
+            return ""
+        text = self._pending + chunk
+        self._pending = ""
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            if text[0] != '"':
+                raise ValueError("expected a JSON string")
+            text = text[1:]
+            self._started = True
+
+        # the closing quote is the first one not escaped by an odd number of
+        # backslashes
+        end = text.find('"')
+        while end >= 0:
+            backslashes = 0
+            while end - backslashes > 0 and text[end - backslashes - 1] == "\\":
+                backslashes += 1
+            if backslashes % 2 == 0:
+                break
+            end = text.find('"', end + 1)
+        if end >= 0:
+            self.done = True
+            if text[end + 1 :].strip():
+                raise ValueError("extra data after JSON string")
+            text = text[:end]
+        else:
+            cut = _complete_escapes(text)
+            text, self._pending = text[:cut], text[cut:]
+        return json.loads(f'"{text}"') if text else ""
+
+    def close(self) -> None:
+        if not self.done:
+            raise ValueError("unterminated JSON string")
+
 
 @dataclass
 class PAOVRElectionInfo:
@@ -180,6 +449,7 @@ class PAOVRElectionInfo:
     vbm_receipt_deadline: datetime.datetime
 
 
+@slotted
 @dataclass
 class PAMunicipality:
     municipality_id: str
@@ -193,6 +463,7 @@ class PACounty:
     municipalities: List[PAMunicipality]
 
 
+@slotted
 @dataclass
 class PAOVRRequest:
     first_name: str
@@ -246,6 +517,37 @@ class PAOVRRequest:
     mailin_ballot_state: Optional[str] = None
     mailin_ballot_zipcode: Optional[str] = None
 
+    # last, so adding it didn't shift the fields above for positional callers
+    municipality: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        JSON-friendly dict of the fields that are set (date as YYYY-MM-DD,
+        signature base64-encoded)
+        """
+        r: Dict[str, Any] = {}
+        for f in fields(self):
+            v = getattr(self, f.name)
+            if v is None:
+                continue
+            if f.name == "date_of_birth":
+                v = v.isoformat()
+            elif f.name == "signature":
+                v = base64.b64encode(v).decode("ascii")
+            r[f.name] = v
+        return r
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PAOVRRequest":
+        values = dict(data)
+        if isinstance(values.get("date_of_birth"), str):
+            values["date_of_birth"] = datetime.date.fromisoformat(
+                values["date_of_birth"]
+            )
+        if isinstance(values.get("signature"), str):
+            values["signature"] = base64.b64decode(values["signature"])
+        return cls(**values)
+
     def normalize_address_unit(self) -> None:
         """
         This takes a dict with one or more of [address1, address2,
@@ -255,120 +557,24 @@ class PAOVRRequest:
         """
         if self.unit_type or self.unit_number:
             return
-
-        # first try address2 field
-        if self.address2 is not None:
-            m = RE_BARE_NUMBER.match(self.address2.strip())
-            if m:
-                self.unit_type = "UNIT"
-                self.unit_number = m[1]
-                self.address2 = None
-                return
-
-            m = RE_BARE_UNIT_NUMBER.match(self.address2.strip())
-            if m:
-                if m[1].lower() in UNIT_TYPE:
-                    self.address2 = None
-                    self.unit_type = UNIT_TYPE[m[1].lower()]
-                    self.unit_number = m[2]
-                    return
-                if m[1].upper() in UNIT_TYPE.values():
-                    self.address2 = None
-                    self.unit_type = m[1].upper()
-                    self.unit_number = m[2]
-                    return
-
-        # then look for suffix on address1
-        # try trailing portion of address1
-        m = RE_TRAILING_NUMBER.match(self.address1.strip())
-        if m:
-            self.address1 = m[1].strip()
-            self.unit_type = "UNIT"
-            self.unit_number = m[2]
-            return
-
-        m = RE_TRAILING_UNIT_NUMBER.match(self.address1.strip())
-        if m:
-            if m[2].lower() in UNIT_TYPE:
-                self.address1 = m[1]
-                self.unit_type = UNIT_TYPE[m[2].lower()]
-                self.unit_number = m[3]
-                return
-            if m[2].upper() in UNIT_TYPE.values():
-                self.address1 = m[1]
-                self.unit_type = m[2].upper()
-                self.unit_number = m[3]
-                return
+        r = split_address_unit(self.address1, self.address2)
+        if r is not None:
+            self.address1, self.address2, self.unit_type, self.unit_number = r
 
     def to_request_body(self) -> str:
         """
         Generate a valid registration request body
         """
-        SIG_TYPES = ["tiff", "png", "jpg", "bmp", "jpeg"]
-
-        REQUIRED = {
-            "first_name": "FirstName",
-            "last_name": "LastName",
-            "date_of_birth": None,
-            "address1": "streetaddress",
-            "city": "city",
-            "county": "county",
-            "zipcode": "zipcode",
-            "party": None,  # multiple
-            "united_states_citizen": "united-states-citizen",
-            "eighteen_on_election_day": "eighteen-on-election-day",
-            "declaration": "declaration1",
-        }
-
-        OPTIONAL = {
-            "is_new": None,
-            "federal_voter": "isfederalvoter",
-            "middle_name": "MiddleName",
-            "suffix": "TitleSuffix",  # The API enumerates valid suffixes, but seems to accept any value here.
-            "address2": "streetaddress2",
-            "email": "email",
-            "phone": "phone",
-            "gender": None,
-            # "race": None,
-            "unit_type": None,
-            "unit_number": None,
-            "dl_number": "drivers-license",
-            "ssn4": "ssn4",
-            # if change of name, address
-            "previous_first_name": "previousregfirstname",
-            "previous_middle_name": "previousregmiddlename",
-            "previous_last_name": "previousreglastname",
-            "previous_address": "previousregaddress",
-            "previous_city": "previousregcity",
-            "previous_state": "previousregstate",
-            "previous_zipcode": "previousregzip",
-            "previous_county": "previousregcounty",
-            "previous_year": "previousregyear",
-            # mailing address
-            "mailing_address": "Mailingaddress",
-            "mailing_city": "mailingcity",
-            "mailing_state": "mailingstate",
-            "mailing_zipcode": "mailingzipcode",
-            # VBM
-            "mailin_ballot_request": "ismailin",
-            "mailin_ballot_to_registration_address": None,
-            "mailin_ballot_to_mailing_address": None,
-            "mailin_ballot_address": "mailinballotaddr",
-            "mailin_ballot_city": "mailincity",
-            "mailin_ballot_state": "mailincity",
-            "mailin_ballot_zipcode": "mailinzipcode",
-        }
-
         self.normalize_address_unit()
 
         vals: Dict[str, str] = {
             "batch": "0",
         }
-        for k in REQUIRED.keys():
+        for k in REQUIRED_FIELDS.keys():
             if not getattr(self, k):
                 raise InvalidRegistrationError(f"registration field '{k}' is required")
 
-        for k, f in list(REQUIRED.items()) + list(OPTIONAL.items()):
+        for k, f in list(REQUIRED_FIELDS.items()) + list(OPTIONAL_FIELDS.items()):
             v = getattr(self, k)
             if v is None:
                 continue
@@ -377,25 +583,9 @@ class PAOVRRequest:
             if k == "date_of_birth":
                 vals["DateOfBirth"] = v.strftime("%Y-%m-%d")
             elif k == "party":
-                party = v.lower()
-                if party in ["democrat"]:
-                    party = "democratic"
-                elif not party or party.startswith("none"):
-                    party = "none (no affiliation)"
-                if party in PARTY:
-                    vals["politicalparty"] = PARTY[party]
-                else:
-                    vals["politicalparty"] = PARTY["other"]
-                    vals["otherpoliticalparty"] = party
+                vals.update(map_party(v))
             elif k == "gender":
-                if v.lower() in GENDER:
-                    vals["gender"] = GENDER[v].lower()
-                elif v.upper() in GENDER.values():
-                    vals["gender"] = v.upper()
-                else:
-                    raise InvalidRegistrationError(
-                        f"gender '{v}' not recognized; must be one of {GENDER}"
-                    )
+                vals["gender"] = map_gender(v)
             elif f:
                 if v == True:
                     vals[f] = "1"
@@ -429,27 +619,14 @@ class PAOVRRequest:
                 )
 
         if self.signature:
-            if self.signature_type not in SIG_TYPES:
-                raise InvalidRegistrationError(
-                    f"signature_type must be one of {SIG_TYPES}"
-                )
-            sig_type = self.signature_type
-            if sig_type == "jpeg":
-                sig_type = "jpg"
-            vals["signatureimage"] = (
-                f"data:image/{sig_type};base64,{base64.b64encode(self.signature).decode('utf-8')}"
+            vals["signatureimage"] = encode_signature(
+                self.signature, self.signature_type
             )
 
-        root = etree.fromstring(XML_TEMPLATE)
-        for record in root:
-            for i in record:
-                k = i.tag.split("}")[1]  # strip of "{xmlns}" prefix
-                if k in vals:
-                    i.text = str(vals[k])
-        xml = etree.tostring(root).decode("utf-8")
-        return json.dumps({"ApplicationData": xml})
+        return render_request_body(vals)
 
 
+@slotted
 @dataclass
 class PAOVRResponse:
     application_id: Optional[str]
@@ -479,10 +656,58 @@ class PAOVRResponse:
 
 
 class PAOVRSession:
-    def __init__(self, api_key: str, staging: bool, language: int = 0):
+    def __init__(
+        self,
+        api_key: str,
+        staging: bool,
+        language: int = 0,
+        coalesce: bool = True,
+        hedge: Optional[HedgePolicy] = None,
+        limiter: Optional[AIMDLimiter] = None,
+        rate_limiter: Optional["SharedRateLimiter"] = None,
+        idempotency: Optional["IdempotencyStore"] = None,
+        http_session: Optional["requests.Session"] = None,
+        profiler: Optional["MemoryProfiler"] = None,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+    ):
+        """
+        coalesce: share in-flight identical read-only requests between
+        threads.  hedge: send a second copy of slow read-only requests
+        (never submissions).  limiter: adapt how many register() calls may
+        be in flight at once to the server's latency and 5xx/timeout rate.
+        rate_limiter: a host-wide request rate limit shared with other
+        processes (every HTTP request, hedges included, takes a token).
+        idempotency: record register() calls so that resubmitting the same
+        request returns the earlier response instead of sending it again.
+        http_session: a requests.Session to send requests with (e.g. with
+        ovrlib.cassette adapters mounted), instead of the requests module.
+        profiler: an ovrlib.memprofile.MemoryProfiler to give a chance to
+        take a snapshot after each register() call.  timeout: seconds to
+        wait to connect, or between bytes of the response, before giving up
+        (None waits forever).
+        """
         self.api_key = api_key
         self.staging = staging
         self.language = language
+        self.coalesce = coalesce
+        self.hedge = hedge
+        self.limiter = limiter
+        self.rate_limiter = rate_limiter
+        self.idempotency = idempotency
+        self.http_session = http_session
+        self.profiler = profiler
+        self.timeout = timeout
+        # what the key is allowed to do, once we know; see warm_up()
+        self.can_read: Optional[bool] = None
+        self.can_write: Optional[bool] = None
+        self.election_info: Optional[PAOVRElectionInfo] = None
+
+    def _coalesced(
+        self, kind: str, action: str, data, params: Dict[str, str], fn: Callable[[], T]
+    ) -> T:
+        if not self.coalesce or data or action not in READ_ONLY_ACTIONS:
+            return fn()
+        return _read_only_flights.do((kind, self.get_url(action, params)), fn)
 
     def get_url(self, action: str, params: Dict[str, str] = {}) -> str:
         url_params = {
@@ -507,22 +732,62 @@ class PAOVRSession:
     def do_request_unparsed(
         self, action: str, data=None, params: Dict[str, str] = {}
     ) -> str:
-        url = self.get_url(action, params)
+        return self._coalesced(
+            "unparsed",
+            action,
+            data,
+            params,
+            lambda: self._do_request_unparsed(action, data, params),
+        )
+
+    def _send(
+        self, action: str, url: str, data=None, stream: bool = False
+    ) -> "requests.Response":
+        import requests  # deferred; building bodies doesn't need it
+
+        http = self.http_session or requests
         if data:
-            response = requests.post(
+            self._throttle(action)
+            return http.post(
                 url,
                 headers={
                     "Content-Type": "application/json",
                     "Cache-Control": "no-cache",
                 },
                 data=data,
+                timeout=self.timeout,
             )
-        else:
-            response = requests.get(url)
+
+        def get() -> "requests.Response":
+            self._throttle(action)
+            return http.get(url, stream=stream, timeout=self.timeout)
+
+        if self.hedge is not None and action in READ_ONLY_ACTIONS:
+            return self.hedge.run(
+                action,
+                get,
+                accept=lambda r: r.status_code < 500,
+                discard=lambda r: r.close(),
+            )
+        return get()
+
+    def _throttle(self, action: str) -> None:
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire(action)
+            if waited:
+                logger.debug(f"{action} rate limited for {waited:.3f}s")
+
+    def _do_request_unparsed(
+        self, action: str, data=None, params: Dict[str, str] = {}
+    ) -> str:
+        url = self.get_url(action, params)
+        response = self._send(action, url, data)
 
         logger.debug(f"{action} Status: {response.status_code}")
         logger.debug(f"{action} Response: {response.text}")
 
+        if response.status_code >= 500:
+            raise ServerError(f"HTTP status code {response.status_code}")
         if response.status_code != 200:
             raise InvalidRegistrationError(f"HTTP status code {response.status_code}")
 
@@ -531,7 +796,22 @@ class PAOVRSession:
     def do_request(
         self, action: str, data=None, params: Dict[str, str] = {}
     ) -> etree.Element:
-        xml_str = json.loads(self.do_request_unparsed(action, data, params))
+        """
+        Make a request and parse (and check) the response.  Concurrent
+        identical read-only requests share one result; don't modify it.
+        """
+        return self._coalesced(
+            "parsed",
+            action,
+            data,
+            params,
+            lambda: self._do_request(action, data, params),
+        )
+
+    def _do_request(
+        self, action: str, data=None, params: Dict[str, str] = {}
+    ) -> etree.Element:
+        xml_str = json.loads(self._do_request_unparsed(action, data, params))
         root = etree.fromstring(xml_str)
 
         # check for errors only
@@ -562,12 +842,118 @@ class PAOVRSession:
             if not saw_application_id:
                 # This seems to happen when we submit a registration that is missing some XML fields:
                 # no error, and no valid response.
-                raise InvalidRegistrationError(
+                raise EmptyResponseError(
                     "empty response (incomplete registration request?)"
                 )
 
         return root
 
+    def iter_records(
+        self,
+        action: str,
+        params: Dict[str, str] = {},
+        chunk_size: int = 65536,
+        root_tag: Optional[str] = None,
+    ) -> Iterator[etree.Element]:
+        """
+        Stream a read-only request's response, yielding each child of the
+        root element as soon as it has been parsed.  Each one is cleared
+        once the caller moves on, so only one record is in memory at a
+        time; copy anything you need to keep.  root_tag: what the root
+        element must be, unless it's an error RESPONSE.
+
+        This isn't coalesced with other threads' identical requests (there's
+        no result to share until it's consumed); callers that may run
+        concurrently should coalesce what they build from it.
+        """
+        response = self._send(action, self.get_url(action, params), stream=True)
+        with response:
+            logger.debug(f"{action} Status: {response.status_code}")
+            if response.status_code >= 500:
+                raise ServerError(f"HTTP status code {response.status_code}")
+            if response.status_code != 200:
+                raise InvalidRegistrationError(
+                    f"HTTP status code {response.status_code}"
+                )
+
+            text = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+            decoder = JSONStringDecoder()
+            parser = etree.XMLPullParser(events=("start", "end"))
+            depth = 0
+            root: Any = None
+            for chunk in response.iter_content(chunk_size):
+                parser.feed(decoder.feed(text.decode(chunk)))
+                for event, element in parser.read_events():
+                    if event == "start":
+                        depth += 1
+                        if root is None:
+                            root = element
+                            self._check_root(action, root, root_tag, "RESPONSE")
+                        continue
+                    depth -= 1
+                    if depth != 1:
+                        continue
+                    if root.tag == "RESPONSE" and element.tag == "ERROR":
+                        # an empty ERROR isn't one, as in _do_request
+                        if element.text:
+                            self._raise_error(element.text)
+                    else:
+                        yield element
+                    element.clear()
+                    # and drop it from the root
+                    root.remove(element)
+            decoder.feed(text.decode(b"", final=True))
+            decoder.close()
+            parser.close()
+            # a RESPONSE without an error isn't what was asked for either
+            self._check_root(action, root, root_tag)
+
+    def _check_root(
+        self, action: str, root: Any, root_tag: Optional[str], *also: str
+    ) -> None:
+        if root_tag is None:
+            return
+        if root is None or root.tag not in (root_tag,) + also:
+            found = "nothing" if root is None else root.tag
+            raise InvalidRegistrationError(
+                f"{action}: expected {root_tag}, got {found}"
+            )
+
+    def _raise_error(self, code: Optional[str]) -> None:
+        if code == "VR_WAPI_InvalidAccessKey":
+            raise InvalidAccessKeyError(f"{code}: {ERROR.get(code)}")
+        raise InvalidRegistrationError(f"{code}: {ERROR.get(code or '', '')}")
+
+    def iter_municipalities(self, county: str) -> Iterator[PAMunicipality]:
+        """
+        The municipalities of a county, parsed as they arrive
+        """
+        for municipality in self.iter_records(
+            "GETMUNICIPALITIES",
+            params={"County": county.upper()},
+            root_tag="OVRLookupData",
+        ):
+            assert municipality.tag == "Municipality"
+            m_id = municipality.findtext("MunicipalityID")
+            m_name = municipality.findtext("MunicipalityIDname")
+            if m_id and m_name:
+                yield PAMunicipality(
+                    municipality_id=m_id, municipality_name=m_name.upper()
+                )
+
+    def _municipalities(self, county: str) -> List[PAMunicipality]:
+        """
+        iter_municipalities(), shared with other threads asking at the same
+        time; don't modify it
+        """
+        return self._coalesced(
+            "municipalities",
+            "GETMUNICIPALITIES",
+            None,
+            {"County": county.upper()},
+            lambda: list(self.iter_municipalities(county)),
+        )
+
     def get_election_info(self) -> PAOVRElectionInfo:
         other_map = {
             "NextElection": ("NextElection", "next_election"),
@@ -654,9 +1040,6 @@ class PAOVRSession:
             if i.tag == "MessageText":
                 map_subitem(i, "ErrorCode", "ErrorText", rval["error"])
 
-        root = self.do_request("GETAPPLICATIONSETUP")
-        assert root.tag == "NewDataSet"
-
         def map_subitem_lower(node, keytag: str, valtag: str, target: Dict[str, str]):
             k = None
             v = None
@@ -668,36 +1051,51 @@ class PAOVRSession:
             if k is not None and v is not None:
                 target[k.lower()] = v
 
-        for i in root:
-            if i.tag == "Suffix":
-                map_subitem_lower(
-                    i, "NameSuffixDescription", "NameSuffixCode", rval["race"]
-                )
-            elif i.tag == "Race":
-                map_subitem_lower(i, "RaceDescription", "RaceCode", rval["race"])
-            elif i.tag == "UnitTypes":
-                map_subitem_lower(
-                    i, "UnitTypesDescription", "UnitTypesCode", rval["unit_type"]
-                )
-            elif i.tag == "AssistanceType":
-                map_subitem(
-                    i,
-                    "AssistanceTypeDescription",
-                    "AssistanceTypeCode",
-                    rval["assistance_type"],
-                )
-            elif i.tag == "Gender":
-                map_subitem_lower(i, "GenderDescription", "GenderCode", rval["gender"])
-            elif i.tag == "PoliticalParty":
-                map_subitem_lower(
-                    i, "PoliticalPartyDescription", "PoliticalPartyCode", rval["party"]
-                )
-            elif i.tag == "County":
-                map_subitem_lower(i, "Countyname", "countyID", rval["county"])
-            elif i.tag == "States":
-                map_subitem_lower(i, "CodesDescription", "Code", rval["state"])
-            else:
-                pass
+        def read_setup() -> Dict[str, Dict[str, str]]:
+            tables: Dict[str, Dict[str, str]] = {k: {} for k in rval}
+            for i in self.iter_records("GETAPPLICATIONSETUP", root_tag="NewDataSet"):
+                if i.tag == "Suffix":
+                    map_subitem_lower(
+                        i, "NameSuffixDescription", "NameSuffixCode", tables["race"]
+                    )
+                elif i.tag == "Race":
+                    map_subitem_lower(i, "RaceDescription", "RaceCode", tables["race"])
+                elif i.tag == "UnitTypes":
+                    map_subitem_lower(
+                        i, "UnitTypesDescription", "UnitTypesCode", tables["unit_type"]
+                    )
+                elif i.tag == "AssistanceType":
+                    map_subitem(
+                        i,
+                        "AssistanceTypeDescription",
+                        "AssistanceTypeCode",
+                        tables["assistance_type"],
+                    )
+                elif i.tag == "Gender":
+                    map_subitem_lower(
+                        i, "GenderDescription", "GenderCode", tables["gender"]
+                    )
+                elif i.tag == "PoliticalParty":
+                    map_subitem_lower(
+                        i,
+                        "PoliticalPartyDescription",
+                        "PoliticalPartyCode",
+                        tables["party"],
+                    )
+                elif i.tag == "County":
+                    map_subitem_lower(i, "Countyname", "countyID", tables["county"])
+                elif i.tag == "States":
+                    map_subitem_lower(i, "CodesDescription", "Code", tables["state"])
+                else:
+                    pass
+            return tables
+
+        # threads asking at the same time share one read; each copies it
+        setup = self._coalesced(
+            "constants", "GETAPPLICATIONSETUP", None, {}, read_setup
+        )
+        for name, table in setup.items():
+            rval[name].update(table)
 
         rval["xml_template"] = json.loads(self.do_request_unparsed("GETXMLTEMPLATE"))
 
@@ -706,29 +1104,7 @@ class PAOVRSession:
     def fetch_counties_and_municipalities(self) -> List[PACounty]:
         counties = []
         for c_name, c_id in self.fetch_constants()["county"].items():
-            municipalities: List[PAMunicipality] = []
-            m_data = self.do_request(
-                "GETMUNICIPALITIES", params={"County": c_name.upper()}
-            )
-
-            assert m_data.tag == "OVRLookupData"
-            for municipality in m_data:
-                assert municipality.tag == "Municipality"
-                m_id = None
-                m_name = None
-                for m_prop in municipality:
-                    if m_prop.tag == "MunicipalityIDname":
-                        m_name = m_prop.text
-                    elif m_prop.tag == "MunicipalityID":
-                        m_id = m_prop.text
-
-                if m_id and m_name:
-                    municipalities.append(
-                        PAMunicipality(
-                            municipality_id=m_id, municipality_name=m_name.upper()
-                        )
-                    )
-
+            municipalities = list(self._municipalities(c_name))
             counties.append(PACounty(c_id, c_name.upper(), municipalities))
 
         return counties
@@ -737,16 +1113,80 @@ class PAOVRSession:
         """
         Submit a voter registration
         """
-        body = registration.to_request_body()
+        return self.register_body(registration.to_request_body(), registration)
+
+    def register_body(
+        self, body: str, registration: Optional[PAOVRRequest] = None
+    ) -> PAOVRResponse:
+        """
+        Submit a body rendered ahead of time (by to_request_body(),
+        PAOVRBodyPool or PAOVRRequestBatch.iter_bodies()).  registration is
+        the request it was rendered from, which the idempotency store keeps
+        for reconciling; it's required when the session has one.
+        """
         try:
-            root = self.do_request("SETAPPLICATION", data=body)
+            if self.idempotency is not None:
+                from .idempotency import body_key
+
+                if registration is None:
+                    raise ValueError("registration is required with idempotency")
+                return self.idempotency.run(
+                    body_key(body), registration, lambda: self._register(body)
+                )
+            return self._register(body)
+        finally:
+            if self.profiler is not None:
+                self.profiler.checkpoint()
+
+    def _register(self, body: str) -> PAOVRResponse:
+        try:
+            if self.limiter is not None:
+                with self.limiter.slot():
+                    root = self.do_request("SETAPPLICATION", data=body)
+            else:
+                root = self.do_request("SETAPPLICATION", data=body)
         except InvalidAccessKeyError:
-            # see if we can do a read-only request
-            self.do_request("GETERRORVALUES")
+            self.can_write = False
+            if self.can_read is None:
+                # see if we can do a read-only request
+                self.probe_key()
+            elif not self.can_read:
+                raise
             # we can; API key is read-only
             raise ReadOnlyAccessKeyError(
                 f"Your API key is read-only; check with your contact at the PA Secretary of State's office to make it read-write"
             )
         except Exception as e:
             raise e
+        self.can_write = True
         return PAOVRResponse.from_response_body(root)
+
+    def probe_key(self) -> None:
+        """
+        Check that the API key works for read-only requests, and remember
+        the answer; raises InvalidAccessKeyError if it doesn't
+        """
+        try:
+            self.do_request("GETERRORVALUES")
+        except InvalidAccessKeyError:
+            self.can_read = False
+            raise
+        self.can_read = True
+
+    def warm_up(self, connections: int = 10) -> PAOVRElectionInfo:
+        """
+        Pay the first-request costs up front: open a pooled connection to the
+        API (creating an http_session holding up to `connections` of them, if
+        the session doesn't have one), check the key with probe_key(), and
+        load the election info (kept as self.election_info).
+        """
+        if self.http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            http = requests.Session()
+            http.mount("https://", HTTPAdapter(pool_maxsize=connections))
+            self.http_session = http
+        self.probe_key()
+        self.election_info = self.get_election_info()
+        return self.election_info
@@ -0,0 +1,595 @@
+"""
+Column-oriented PA registration requests, for bulk imports.
+
+A PAOVRRequestBatch holds each PAOVRRequest field as a column instead of one
+object per voter.  Unit normalization, party/gender mapping, DOB formatting
+and the required-field checks run a chunk of rows at a time, with mapped
+values cached per distinct input, and request bodies are rendered lazily
+from a pre-split copy of the XML template:
+
+    batch = PAOVRRequestBatch.from_csv("registrations.csv")
+    for i, body in batch.iter_bodies(skip_invalid=True):
+        session.register_body(body, batch.row(i))
+    batch.errors  # row -> InvalidRegistrationError, for the rows skipped
+
+Each body is identical to what PAOVRRequest.to_request_body() returns for
+the same row.
+"""
+
+import base64
+import binascii
+import csv
+import dataclasses
+import datetime
+import re
+from json.encoder import encode_basestring_ascii  # type: ignore
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+from lxml import etree  # type: ignore
+
+from .exceptions import InvalidRegistrationError
+from .pa import (
+    OPTIONAL_FIELDS,
+    REQUIRED_FIELDS,
+    XML_TEMPLATE,
+    PAOVRRequest,
+    encode_signature,
+    map_gender,
+    map_party,
+    split_address_unit,
+)
+
+DEFAULT_CHUNK_SIZE = 10000
+
+FIELD_NAMES = [f.name for f in dataclasses.fields(PAOVRRequest)]
+
+# characters that make a value need more than a plain copy into the XML
+RE_SPECIAL = re.compile("[&<>\r\x00-\x08\x0b\x0c\x0e-\x1f\x80-\U0010ffff]")
+# ...and the ones lxml refuses outright; those rows go through the scalar path
+RE_NOT_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff￾￿]")
+
+TRUE_STRINGS = {"1", "true", "t", "yes", "y"}
+FALSE_STRINGS = {"0", "false", "f", "no", "n"}
+
+Column = Optional[List[Any]]  # None: every row is None
+
+
+class _NotXML(Exception):
+    pass
+
+
+def _text(value: Any) -> Optional[str]:
+    """
+    A plain field's value as to_request_body() writes it
+    """
+    if value is None or value.__class__ is str:
+        return value
+    if value == True:
+        return "1"
+    if value == False:
+        return "0"
+    return str(value)
+
+
+def _json(text: str) -> str:
+    """
+    text as it appears inside a json.dumps() string.  The escaping is per
+    character, so pieces escaped separately concatenate to the escaped whole.
+    """
+    return encode_basestring_ascii(text)[1:-1]
+
+
+def _map_distinct(f: Callable[[Any], Any], values: List[Any]) -> List[Any]:
+    """
+    [f(v) for v in values], calling f once per distinct value
+    """
+    try:
+        mapped = {v: f(v) for v in set(values)}
+    except TypeError:  # unhashable
+        return [f(v) for v in values]
+    return list(map(mapped.__getitem__, values))
+
+
+def _escape(text: str) -> str:
+    """
+    Escape text the way lxml's etree.tostring() does (ASCII output, with
+    character references for everything else)
+    """
+    if RE_SPECIAL.search(text) is None:
+        return text
+    if RE_NOT_XML.search(text) is not None:
+        raise _NotXML()
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    text = text.replace("\r", "&#13;")
+    if not text.isascii():
+        text = text.encode("ascii", "xmlcharrefreplace").decode("ascii")
+    return text
+
+
+def _split_template() -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Serialize the empty template and cut it at each field element.  Returns
+    the leading text and, for each field, (tag, text up to the next field).
+    """
+    root = etree.fromstring(XML_TEMPLATE)
+    tags = [i.tag.split("}")[1] for record in root for i in record]
+    xml = etree.tostring(root).decode("utf-8")
+    starts = []
+    pos = 0
+    for tag in tags:
+        pos = xml.index(f"<{tag}/>", pos)
+        starts.append(pos)
+    ends = starts[1:] + [len(xml)]
+    slots = [
+        (tag, xml[start + len(tag) + 3 : end])
+        for tag, start, end in zip(tags, starts, ends)
+    ]
+    return xml[: starts[0]], slots
+
+
+_template: Optional[Tuple[str, List[Tuple[str, str]]]] = None
+
+
+def _get_template() -> Tuple[str, List[Tuple[str, str]]]:
+    global _template
+    if _template is None:
+        _template = _split_template()
+    return _template
+
+
+def _parse_bool(value: str) -> Optional[bool]:
+    v = value.strip().lower()
+    if not v:
+        return None
+    if v in TRUE_STRINGS:
+        return True
+    if v in FALSE_STRINGS:
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def _csv_parsers() -> Dict[str, Callable[[str], Any]]:
+    """
+    CSV cell parser for each field, by its annotation.  Empty cells are None.
+    """
+    parsers: Dict[str, Callable[[str], Any]] = {}
+    for f in dataclasses.fields(PAOVRRequest):
+        if f.type in (datetime.date, Optional[datetime.date]):
+            parsers[f.name] = lambda v: datetime.date.fromisoformat(v.strip()[:10])
+        elif f.type in (bool, Optional[bool]):
+            parsers[f.name] = _parse_bool
+        elif f.type in (bytes, Optional[bytes]):
+            parsers[f.name] = lambda v: base64.b64decode(v, validate=True)
+        else:
+            parsers[f.name] = lambda v: v
+    return parsers
+
+
+def _to_list(values: Any) -> List[Any]:
+    """
+    A column as a list of plain Python values (NumPy arrays and Arrow arrays
+    convert their scalars on the way out)
+    """
+    if hasattr(values, "to_pylist"):
+        return values.to_pylist()
+    if hasattr(values, "tolist"):
+        return values.tolist()
+    return list(values)
+
+
+class PAOVRRequestBatch:
+    def __init__(
+        self,
+        columns: Mapping[str, Sequence[Any]],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        """
+        columns maps PAOVRRequest field names to equal-length sequences.
+        Missing fields are None for every row.
+        """
+        unknown = set(columns) - set(FIELD_NAMES)
+        if unknown:
+            raise ValueError(f"unknown PAOVRRequest fields: {sorted(unknown)}")
+        self._columns: Dict[str, Column] = {}
+        length = None
+        for name in FIELD_NAMES:
+            if name not in columns:
+                self._columns[name] = None
+                continue
+            column = _to_list(columns[name])
+            if length is None:
+                length = len(column)
+            elif len(column) != length:
+                raise ValueError(
+                    f"column '{name}' has {len(column)} rows, expected {length}"
+                )
+            self._columns[name] = column
+        self._length = length or 0
+        self.chunk_size = chunk_size
+        self.errors: Dict[int, InvalidRegistrationError] = {}
+        # mapped/escaped values, shared across chunks
+        self._party_cache: Dict[str, Dict[str, str]] = {}
+        self._gender_cache: Dict[str, Union[str, InvalidRegistrationError]] = {}
+        self._dob_cache: Dict[datetime.date, str] = {}
+
+    @classmethod
+    def from_columns(
+        cls, columns: Mapping[str, Sequence[Any]], **kwargs
+    ) -> "PAOVRRequestBatch":
+        return cls(columns, **kwargs)
+
+    @classmethod
+    def from_requests(
+        cls, requests: Iterable[PAOVRRequest], **kwargs
+    ) -> "PAOVRRequestBatch":
+        requests = list(requests)
+        return cls(
+            {
+                name: [getattr(r, name) for r in requests]
+                for name in FIELD_NAMES
+                if any(getattr(r, name) is not None for r in requests)
+            },
+            **kwargs,
+        )
+
+    @classmethod
+    def from_arrow(cls, table: Any, **kwargs) -> "PAOVRRequestBatch":
+        """
+        From a pyarrow.Table (or RecordBatch) whose column names are
+        PAOVRRequest fields
+        """
+        return cls(table.to_pydict(), **kwargs)
+
+    @classmethod
+    def from_csv(cls, f: Union[str, TextIO], **kwargs) -> "PAOVRRequestBatch":
+        """
+        From a CSV file whose header row names PAOVRRequest fields.  Dates
+        are YYYY-MM-DD, booleans 1/0/true/false/yes/no, the signature is
+        base64, and empty cells are None.
+        """
+        if isinstance(f, str):
+            with open(f, newline="") as fp:
+                return cls.from_csv(fp, **kwargs)
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return cls({}, **kwargs)
+        parsers = _csv_parsers()
+        unknown = set(header) - set(parsers)
+        if unknown:
+            raise ValueError(f"unknown PAOVRRequest fields: {sorted(unknown)}")
+        columns: List[List[Any]] = [[] for _ in header]
+        for line, row in enumerate(reader, start=2):
+            if len(row) != len(header):
+                raise ValueError(f"line {line}: expected {len(header)} fields")
+            for name, column, value in zip(header, columns, row):
+                try:
+                    column.append(parsers[name](value) if value != "" else None)
+                except (ValueError, binascii.Error) as e:
+                    raise ValueError(f"line {line}: {name}: {e}") from e
+        return cls(dict(zip(header, columns)), **kwargs)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def column(self, name: str) -> List[Any]:
+        c = self._columns[name]
+        return c if c is not None else [None] * self._length
+
+    def row(self, i: int) -> PAOVRRequest:
+        values: Dict[str, Any] = {
+            name: (c[i] if c is not None else None) for name, c in self._columns.items()
+        }
+        return PAOVRRequest(**values)
+
+    def __iter__(self) -> Iterator[PAOVRRequest]:
+        for i in range(self._length):
+            yield self.row(i)
+
+    def _materialize(self, name: str) -> List[Any]:
+        c = self._columns[name]
+        if c is None:
+            c = self._columns[name] = [None] * self._length
+        return c
+
+    def _normalize_address_units(self, start: int, stop: int) -> None:
+        """
+        PAOVRRequest.normalize_address_unit(), for a range of rows
+        """
+        address1 = self._columns["address1"]
+        address2 = self._columns["address2"]
+        unit_type = self._columns["unit_type"]
+        unit_number = self._columns["unit_number"]
+        for i in range(start, stop):
+            if (unit_type is not None and unit_type[i]) or (
+                unit_number is not None and unit_number[i]
+            ):
+                continue
+            a1 = address1[i] if address1 is not None else None
+            a2 = address2[i] if address2 is not None else None
+            if not a1:
+                # required; the row is rejected before its units matter
+                continue
+            r = split_address_unit(a1, a2)
+            if r is None:
+                continue
+            if unit_type is None or unit_number is None:
+                unit_type = self._materialize("unit_type")
+                unit_number = self._materialize("unit_number")
+            address1 = self._materialize("address1")
+            address2 = self._materialize("address2")
+            address1[i], address2[i], unit_type[i], unit_number[i] = r
+
+    def _prepare(
+        self, start: int, stop: int
+    ) -> Tuple[List[List[str]], str, Dict[int, InvalidRegistrationError], Set[int]]:
+        """
+        Map and escape a chunk of rows.  Returns the element columns and
+        suffix from _render(), then the rows (relative to start) that failed
+        validation and the ones that must go through the scalar path.
+        """
+        self._normalize_address_units(start, stop)
+        n = stop - start
+        errors: Dict[int, InvalidRegistrationError] = {}
+        fallback: Set[int] = set()
+
+        def chunk(name: str) -> Column:
+            c = self._columns[name]
+            return c[start:stop] if c is not None else None
+
+        for k in REQUIRED_FIELDS:
+            c = chunk(k)
+            if c is None:
+                missing: Iterable[int] = range(n)
+            elif all(c):
+                continue
+            else:
+                missing = [j for j, v in enumerate(c) if not v]
+            for j in missing:
+                if j not in errors:
+                    errors[j] = InvalidRegistrationError(
+                        f"registration field '{k}' is required"
+                    )
+
+        # XML tag -> column of text (None to leave the element empty)
+        vals: Dict[str, List[Optional[str]]] = {"batch": ["0"] * n}
+
+        def put(tag: str, values: List[Optional[str]]) -> None:
+            if tag in vals:
+                vals[tag] = [
+                    new if new is not None else old
+                    for old, new in zip(vals[tag], values)
+                ]
+            else:
+                vals[tag] = values
+
+        for k, f in list(REQUIRED_FIELDS.items()) + list(OPTIONAL_FIELDS.items()):
+            c = chunk(k)
+            if c is None or k == "is_new":
+                continue
+            if k == "date_of_birth":
+                put("DateOfBirth", self._map_dob(c, fallback))
+            elif k == "party":
+                political, other = self._map_party(c, fallback)
+                put("politicalparty", political)
+                put("otherpoliticalparty", other)
+            elif k == "gender":
+                put("gender", self._map_gender(c, errors))
+            elif f:
+                put(f, _map_distinct(_text, c))
+
+        self._map_flags(n, chunk, vals, errors)
+
+        columns, suffix = self._render(n, vals, fallback)
+        # the scalar path decides what happens to these
+        for j in fallback:
+            errors.pop(j, None)
+        return columns, suffix, errors, fallback
+
+    def _map_dob(self, c: List[Any], fallback: Set[int]) -> List[Optional[str]]:
+        out: List[Optional[str]] = []
+        cache = self._dob_cache
+        for j, v in enumerate(c):
+            if v is None:
+                out.append(None)
+            elif v in cache:
+                out.append(cache[v])
+            elif isinstance(v, datetime.date):
+                out.append(cache.setdefault(v, v.strftime("%Y-%m-%d")))
+            else:
+                fallback.add(j)
+                out.append(None)
+        return out
+
+    def _map_party(
+        self, c: List[Any], fallback: Set[int]
+    ) -> Tuple[List[Optional[str]], List[Optional[str]]]:
+        political: List[Optional[str]] = []
+        other: List[Optional[str]] = []
+        cache = self._party_cache
+        for j, v in enumerate(c):
+            if v.__class__ is not str:
+                if v is not None:
+                    fallback.add(j)
+                political.append(None)
+                other.append(None)
+                continue
+            m = cache.get(v)
+            if m is None:
+                m = cache[v] = map_party(v)
+            political.append(m["politicalparty"])
+            other.append(m.get("otherpoliticalparty"))
+        return political, other
+
+    def _map_gender(
+        self, c: List[Any], errors: Dict[int, InvalidRegistrationError]
+    ) -> List[Optional[str]]:
+        out: List[Optional[str]] = []
+        cache = self._gender_cache
+        for j, v in enumerate(c):
+            if v is None:
+                out.append(None)
+                continue
+            m = cache.get(v)
+            if m is None:
+                try:
+                    m = map_gender(v)
+                except InvalidRegistrationError as e:
+                    m = e
+                cache[v] = m
+            if isinstance(m, InvalidRegistrationError):
+                errors.setdefault(j, InvalidRegistrationError(*m.args))
+                out.append(None)
+            else:
+                out.append(m)
+        return out
+
+    def _map_flags(
+        self,
+        n: int,
+        chunk: Callable[[str], Column],
+        vals: Dict[str, List[Optional[str]]],
+        errors: Dict[int, InvalidRegistrationError],
+    ) -> None:
+        """
+        The values to_request_body() derives from several fields at once
+        """
+        none: List[Any] = [None] * n
+        is_new = chunk("is_new") or none
+        previous_first_name = chunk("previous_first_name") or none
+        previous_address = chunk("previous_address") or none
+        dl_number = chunk("dl_number") or none
+        ssn4 = chunk("ssn4") or none
+        signature = chunk("signature") or none
+        signature_type = chunk("signature_type") or none
+
+        kind: Dict[str, List[Optional[str]]] = {
+            tag: [None] * n
+            for tag in [
+                "isnewregistration",
+                "name-update",
+                "address-update",
+                "ispartychange",
+            ]
+        }
+        for j in range(n):
+            if is_new[j] == True:
+                tag = "isnewregistration"
+            elif previous_first_name[j]:
+                tag = "name-update"
+            elif previous_address[j]:
+                tag = "address-update"
+            elif is_new[j] == False:
+                tag = "ispartychange"
+            else:
+                tag = "isnewregistration"
+            kind[tag][j] = "1"
+        vals.update(kind)
+
+        vals["continueAppSubmit"] = [None if dl else "1" for dl in dl_number]
+        vals["donthavebothDLandSSN"] = [
+            None if dl or s else "1" for dl, s in zip(dl_number, ssn4)
+        ]
+        images: List[Optional[str]] = [None] * n
+        for j in range(n):
+            if not dl_number[j] and not ssn4[j] and not signature[j]:
+                errors.setdefault(
+                    j,
+                    InvalidRegistrationError(
+                        "signature image required if DL and SSN are both missing"
+                    ),
+                )
+            elif signature[j]:
+                try:
+                    images[j] = encode_signature(signature[j], signature_type[j])
+                except InvalidRegistrationError as e:
+                    errors.setdefault(j, e)
+        vals["signatureimage"] = images
+
+    def _render(
+        self, n: int, vals: Dict[str, List[Optional[str]]], fallback: Set[int]
+    ) -> Tuple[List[List[str]], str]:
+        """
+        Turn tag -> text columns into element columns.  Each element string
+        carries the constant template text around it and is already escaped
+        for the JSON wrapper, so that a row's body is the concatenation of
+        its elements plus the returned suffix.
+        """
+        prefix, slots = _get_template()
+        columns: List[List[str]] = []
+        lead = '{"ApplicationData": "' + _json(prefix)
+        for tag, after in slots:
+            c = vals.get(tag)
+            if c is None or c.count(None) == n:
+                lead += _json(f"<{tag}/>{after}")
+                continue
+            open_tag = f"<{tag}>"
+            close = f"</{tag}>{after}"
+            # render each distinct value once
+            elements: Dict[Optional[str], str] = {
+                None: lead + _json(f"<{tag}/>{after}")
+            }
+            bad = set()
+            for v in set(c):
+                if v is None:
+                    continue
+                try:
+                    elements[v] = lead + _json(open_tag + _escape(v) + close)
+                except _NotXML:
+                    bad.add(v)
+                    elements[v] = elements[None]
+            if bad:
+                fallback.update(j for j, v in enumerate(c) if v in bad)
+            lead = ""
+            columns.append(list(map(elements.__getitem__, c)))
+        return columns, lead + '"}'
+
+    def iter_bodies(self, skip_invalid: bool = False) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (row, request body) for each row, a chunk at a time.  An invalid
+        row raises its InvalidRegistrationError, or with skip_invalid is left
+        out and recorded in self.errors.
+        """
+        self.errors = {}
+        for start in range(0, self._length, self.chunk_size):
+            stop = min(start + self.chunk_size, self._length)
+            columns, suffix, errors, fallback = self._prepare(start, stop)
+            for j, parts in enumerate(zip(*columns)):
+                if j in errors:
+                    self.errors[start + j] = errors[j]
+                    if skip_invalid:
+                        continue
+                    raise errors[j]
+                if j in fallback:
+                    try:
+                        body = self.row(start + j).to_request_body()
+                    except InvalidRegistrationError as e:
+                        self.errors[start + j] = e
+                        if skip_invalid:
+                            continue
+                        raise
+                else:
+                    body = "".join(parts) + suffix
+                yield start + j, body
+
+    def validate(self) -> Dict[int, InvalidRegistrationError]:
+        """
+        Check every row; returns row -> InvalidRegistrationError
+        """
+        for _ in self.iter_bodies(skip_invalid=True):
+            pass
+        return dict(self.errors)
@@ -0,0 +1,333 @@
+"""
+Find likely duplicate PA registrations before they are submitted.
+
+Event batches often carry the same voter more than once (from paper and a
+tablet, or with a typo in the street name).  DuplicateFinder keeps the first
+of each and reports the rest:
+
+    store = FingerprintStore("/var/lib/ovr/pa-submitted.db")
+    finder = DuplicateFinder(store)
+    for i, request in enumerate(batch):
+        dup = finder.check(request)
+        if dup is None:
+            response = session.register(request)
+            store.add(request, response)
+
+A request is compared only against earlier kept requests that share a
+blocking key (normalized last name and date of birth; ZIP and date of
+birth; ZIP and the Soundex of both names), so a batch is checked in
+near-linear time.  Blocks that grow past max_block (very common names) are
+skipped rather than compared exhaustively.
+
+FingerprintStore remembers a fingerprint of everything submitted
+successfully, so the same registration isn't sent again in a later batch.
+The fingerprint covers what the request asks for (party, addresses,
+previous registration, mail-in ballot request) as well as who it's for, so
+a voter's later update isn't mistaken for a repeat; and entries expire after
+ttl seconds, so a voter can re-register the same details in a later cycle.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ._slots import slotted
+from .matching import (
+    dob_similarity,
+    jaro_winkler,
+    normalize_dob,
+    normalize_name,
+    normalize_zip,
+    soundex,
+)
+from .pa import PAOVRRequest, PAOVRResponse
+
+DEFAULT_MIN_SCORE = 0.92
+DEFAULT_MAX_BLOCK = 500
+DEFAULT_TTL = 30 * 24 * 60 * 60.0
+
+# what a request asks the state to record, besides who it's for: requests
+# that differ in any of these are updates, not repeats
+FINGERPRINT_FIELDS = [
+    "party",
+    "address1",
+    "address2",
+    "unit_type",
+    "unit_number",
+    "city",
+    "county",
+    "previous_first_name",
+    "previous_middle_name",
+    "previous_last_name",
+    "previous_address",
+    "previous_city",
+    "previous_state",
+    "previous_zipcode",
+    "previous_county",
+    "previous_year",
+    "mailing_address",
+    "mailing_city",
+    "mailing_state",
+    "mailing_zipcode",
+    "mailin_ballot_request",
+    "mailin_ballot_to_registration_address",
+    "mailin_ballot_to_mailing_address",
+    "mailin_ballot_address",
+    "mailin_ballot_city",
+    "mailin_ballot_state",
+    "mailin_ballot_zipcode",
+]
+
+WEIGHTS = {
+    "last_name": 0.3,
+    "first_name": 0.25,
+    "dob": 0.2,
+    "zipcode": 0.1,
+    "address": 0.15,
+}
+
+# (first, last, dob, zip, address), all normalized
+_Key = Tuple[str, str, str, str, str]
+
+
+def request_key(request: PAOVRRequest) -> _Key:
+    return (
+        normalize_name(request.first_name),
+        normalize_name(request.last_name),
+        normalize_dob(request.date_of_birth),
+        normalize_zip(request.zipcode),
+        " ".join((request.address1 or "").upper().split()),
+    )
+
+
+def _normalize_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "Y" if value else "N"
+    return " ".join(str(value).upper().split())
+
+
+def fingerprint(request: PAOVRRequest) -> bytes:
+    """
+    Stable hash of who a request registers (normalized first and last name,
+    date of birth and ZIP) and of what it asks for (FINGERPRINT_FIELDS)
+    """
+    first, last, dob, zipcode, _ = request_key(request)
+    values = [first, last, dob, zipcode] + [
+        _normalize_value(getattr(request, f)) for f in FINGERPRINT_FIELDS
+    ]
+    return hashlib.sha256("\0".join(values).encode()).digest()
+
+
+@slotted
+@dataclass
+class Duplicate:
+    index: int  # position of the duplicate in the checked sequence
+    of: Optional[int]  # position of the request it duplicates, if in this batch
+    score: float
+    application_id: Optional[str] = None  # if already submitted
+
+
+class FingerprintStore:
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = DEFAULT_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        ttl: seconds a submission is remembered for (None: forever)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS submitted ("
+            " fingerprint BLOB PRIMARY KEY,"
+            " application_id TEXT,"
+            " submitted REAL NOT NULL)"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM submitted").fetchone()[0]
+
+    def add(self, request: PAOVRRequest, response: PAOVRResponse) -> None:
+        self.add_many([(request, response)])
+
+    def add_many(self, submitted: Iterable[Tuple[PAOVRRequest, PAOVRResponse]]) -> None:
+        rows = [
+            (fingerprint(request), response.application_id, self.clock())
+            for request, response in submitted
+        ]
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN")
+            try:
+                db.executemany(
+                    "INSERT OR REPLACE INTO submitted"
+                    " (fingerprint, application_id, submitted) VALUES (?, ?, ?)",
+                    rows,
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _cutoff(self) -> float:
+        return float("-inf") if self.ttl is None else self.clock() - self.ttl
+
+    def lookup(self, request: PAOVRRequest) -> Optional[Tuple[Optional[str]]]:
+        """
+        (application_id,) if this request was submitted within ttl, else None
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT application_id FROM submitted"
+                " WHERE fingerprint = ? AND submitted >= ?",
+                (fingerprint(request), self._cutoff()),
+            ).fetchone()
+
+    def prune(self) -> int:
+        """
+        Forget submissions older than ttl; returns how many
+        """
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM submitted WHERE submitted < ?", (self._cutoff(),)
+            ).rowcount
+
+    def __contains__(self, request: PAOVRRequest) -> bool:
+        return self.lookup(request) is not None
+
+
+class DuplicateFinder:
+    def __init__(
+        self,
+        store: Optional[FingerprintStore] = None,
+        min_score: float = DEFAULT_MIN_SCORE,
+        max_block: int = DEFAULT_MAX_BLOCK,
+    ):
+        self.store = store
+        self.min_score = min_score
+        self.max_block = max_block
+        self._count = 0
+        # kept requests, by position in the checked sequence
+        self._keys: Dict[int, _Key] = {}
+        self._exact: Dict[_Key, int] = {}
+        self._blocks: Dict[Tuple[str, ...], List[int]] = {}
+        self.stats = {"kept": 0, "exact": 0, "fuzzy": 0, "submitted": 0}
+
+    @staticmethod
+    def _blocking_keys(key: _Key) -> List[Tuple[str, ...]]:
+        first, last, dob, zipcode, _ = key
+        r: List[Tuple[str, ...]] = []
+        if last and dob:
+            r.append(("ld", last, dob))
+        if zipcode and dob:
+            r.append(("zd", zipcode, dob))
+        if zipcode and first and last:
+            # catches a mistyped date of birth
+            r.append(("zn", zipcode, soundex(last), soundex(first)))
+        return r
+
+    def score(self, a: _Key, b: _Key, floor: float = 0.0) -> float:
+        """
+        Weighted similarity of two normalized keys.  Returns 0.0 early
+        (skipping the string comparisons) if the result can't reach `floor`.
+        """
+        if not (a[0] and b[0] and a[1] and b[1]):
+            return 0.0
+        total = 0.0
+        weight = WEIGHTS["first_name"] + WEIGHTS["last_name"]
+        d = dob_similarity(a[2], b[2])
+        if d is not None:
+            total += WEIGHTS["dob"] * d
+            weight += WEIGHTS["dob"]
+        if a[3] and b[3]:
+            total += WEIGHTS["zipcode"] * (1.0 if a[3] == b[3] else 0.0)
+            weight += WEIGHTS["zipcode"]
+        compare_address = bool(a[4] and b[4])
+        if compare_address:
+            weight += WEIGHTS["address"]
+
+        # weight of the comparisons still to do, for the early exits
+        remaining = WEIGHTS["first_name"] + WEIGHTS["last_name"]
+        if compare_address:
+            remaining += WEIGHTS["address"]
+        if (total + remaining) / weight < floor:
+            return 0.0
+        total += WEIGHTS["last_name"] * jaro_winkler(a[1], b[1])
+        remaining -= WEIGHTS["last_name"]
+        if (total + remaining) / weight < floor:
+            return 0.0
+        total += WEIGHTS["first_name"] * jaro_winkler(a[0], b[0])
+        remaining -= WEIGHTS["first_name"]
+        if compare_address and (total + remaining) / weight >= floor:
+            total += WEIGHTS["address"] * jaro_winkler(a[4], b[4])
+        return total / weight
+
+    def check(self, request: PAOVRRequest) -> Optional[Duplicate]:
+        """
+        None if request should be submitted (and it is remembered for the
+        requests that follow), or the Duplicate it was found to be
+        """
+        i = self._count
+        self._count += 1
+        key = request_key(request)
+
+        if self.store is not None:
+            found = self.store.lookup(request)
+            if found is not None:
+                self.stats["submitted"] += 1
+                return Duplicate(i, None, 1.0, application_id=found[0])
+
+        j = self._exact.get(key)
+        if j is not None:
+            self.stats["exact"] += 1
+            return Duplicate(i, j, 1.0)
+
+        candidates = set()
+        blocking_keys = self._blocking_keys(key)
+        for b in blocking_keys:
+            block = self._blocks.get(b)
+            if block and len(block) <= self.max_block:
+                candidates.update(block)
+        best = -1
+        best_score = 0.0
+        for j in candidates:
+            s = self.score(key, self._keys[j], floor=self.min_score)
+            if s > best_score:
+                best, best_score = j, s
+        if best >= 0 and best_score >= self.min_score:
+            self.stats["fuzzy"] += 1
+            return Duplicate(i, best, best_score)
+
+        self.stats["kept"] += 1
+        self._keys[i] = key
+        self._exact[key] = i
+        for b in blocking_keys:
+            self._blocks.setdefault(b, []).append(i)
+        return None
+
+    def find(self, requests: Iterable[PAOVRRequest]) -> List[Duplicate]:
+        """
+        Check a whole batch; the requests not listed are the ones to submit
+        """
+        r = []
+        for request in requests:
+            dup = self.check(request)
+            if dup is not None:
+                r.append(dup)
+        return r
@@ -0,0 +1,201 @@
+"""
+Build PA registration request bodies in a pool of worker processes.
+
+Encoding a signature image and serializing the XML/JSON body is CPU-bound and
+holds the GIL, so doing it on the submitting threads stalls their network
+I/O.  PAOVRBodyPool moves that work onto other cores:
+
+    with PAOVRBodyPool() as pool:
+        for request, body in zip(requests, pool.map(requests)):
+            session.register_body(body, request)  # or hand off to I/O threads
+
+Requests are sent to the workers in chunks.  The signature images of a chunk
+are copied once into a shared memory block, which the worker reads them from,
+rather than being pickled along with the requests.  Bodies come back in the
+same order as the requests.
+"""
+
+import collections
+import concurrent.futures
+import dataclasses
+import logging
+import os
+from multiprocessing import shared_memory
+from typing import (
+    Any,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .pa import PAOVRRequest
+
+logger = logging.getLogger("ovrlib.pa_parallel")
+
+DEFAULT_CHUNK_SIZE = 32
+# flush a chunk early once its signatures add up to this much
+DEFAULT_CHUNK_BYTES = 16 * 2**20
+
+# (request without its signature, offset and length of the signature)
+_Item = Tuple[PAOVRRequest, int, int]
+
+
+def _build_chunk(
+    shm_name: Optional[str], items: Sequence[_Item]
+) -> List[Union[str, Exception]]:
+    """
+    Runs in a worker: rebuild each request's signature from shared memory
+    and render its body
+    """
+    # Workers share the parent's resource tracker, so attaching doesn't
+    # register anything new; the parent unlinks the block.
+    shm = shared_memory.SharedMemory(name=shm_name) if shm_name else None
+    buf = shm.buf if shm is not None else None
+    try:
+        r: List[Union[str, Exception]] = []
+        for request, offset, length in items:
+            if length >= 0:
+                assert buf is not None
+                request = dataclasses.replace(
+                    request, signature=bytes(buf[offset : offset + length])
+                )
+            try:
+                r.append(request.to_request_body())
+            except Exception as e:
+                r.append(e)
+        return r
+    finally:
+        buf = None
+        if shm is not None:
+            shm.close()
+
+
+class _Chunk:
+    def __init__(self, requests: List[PAOVRRequest]):
+        size = sum(len(r.signature) for r in requests if r.signature)
+        shm = None
+        if size:
+            shm = shared_memory.SharedMemory(create=True, size=size)
+        self.shm: Optional[shared_memory.SharedMemory] = shm
+        buf = shm.buf if shm is not None else None
+        self.items: List[_Item] = []
+        offset = 0
+        for request in requests:
+            if not request.signature:
+                self.items.append((request, 0, -1))
+                continue
+            assert buf is not None
+            length = len(request.signature)
+            buf[offset : offset + length] = request.signature
+            self.items.append(
+                (dataclasses.replace(request, signature=None), offset, length)
+            )
+            offset += length
+
+    @property
+    def shm_name(self) -> Optional[str]:
+        return self.shm.name if self.shm is not None else None
+
+    def release(self) -> None:
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class PAOVRBodyPool:
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+        max_pending: Optional[int] = None,
+        mp_context: Any = None,
+    ):
+        """
+        processes defaults to the number of CPUs.  At most max_pending chunks
+        (default: two per process) are in flight at once, which bounds memory
+        when the input is a long stream.
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.chunk_bytes = chunk_bytes
+        self.max_pending = max_pending or 2 * self.processes
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=mp_context
+        )
+
+    def __enter__(self) -> "PAOVRBodyPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _chunks(self, requests: Iterable[PAOVRRequest]) -> Iterator[List[PAOVRRequest]]:
+        chunk: List[PAOVRRequest] = []
+        size = 0
+        for request in requests:
+            chunk.append(request)
+            size += len(request.signature or b"")
+            if len(chunk) >= self.chunk_size or size >= self.chunk_bytes:
+                yield chunk
+                chunk = []
+                size = 0
+        if chunk:
+            yield chunk
+
+    def map(
+        self, requests: Iterable[PAOVRRequest], return_exceptions: bool = False
+    ) -> Iterator[Union[str, Exception]]:
+        """
+        Yield the request body for each request, in order.  A request that
+        fails to build raises its exception here (InvalidRegistrationError,
+        usually), or with return_exceptions is yielded in place of the body.
+
+        The requests themselves aren't modified; the workers normalize
+        address units on their own copies.
+        """
+        pending: Deque[Tuple[_Chunk, concurrent.futures.Future]] = collections.deque()
+        chunks = self._chunks(requests)
+        try:
+            while True:
+                while len(pending) < self.max_pending:
+                    requests_chunk = next(chunks, None)
+                    if requests_chunk is None:
+                        break
+                    chunk = _Chunk(requests_chunk)
+                    try:
+                        future = self._executor.submit(
+                            _build_chunk, chunk.shm_name, chunk.items
+                        )
+                    except BaseException:
+                        chunk.release()
+                        raise
+                    pending.append((chunk, future))
+                if not pending:
+                    return
+                chunk, future = pending.popleft()
+                try:
+                    results = future.result()
+                finally:
+                    chunk.release()
+                for r in results:
+                    if isinstance(r, Exception) and not return_exceptions:
+                        raise r
+                    yield r
+        finally:
+            for chunk, future in pending:
+                future.cancel()
+                try:
+                    future.result()
+                except BaseException:
+                    pass
+                chunk.release()
@@ -0,0 +1,331 @@
+"""
+Local lookups of PA counties and municipalities, for filling in the county
+(required) and municipality (optional) of a PAOVRRequest when the voter
+only gave us a ZIP code and city.
+
+    index = PAPlaceIndex()
+    index.add_counties(session.fetch_counties_and_municipalities())
+    index.add_hud_crosswalk("ZIP_COUNTY_122020.csv")
+    index.save("pa-places.json.gz")
+
+    index = PAPlaceIndex.load("pa-places.json.gz")
+    index.counties_for_zip("16214")  # ["CLARION"]
+    index.municipality_id("CLARION", "Clarion Boro")
+    index.fill(request)
+
+ZIP codes don't follow county lines, so a ZIP maps to candidate counties,
+ordered by the share of its residential addresses in each.  The crosswalk
+isn't shipped with ovrlib; use HUD's USPS ZIP-county crosswalk
+(https://www.huduser.gov/portal/datasets/usps_crosswalk.html), saved as
+CSV, which identifies counties by FIPS code.
+
+Municipality names are matched exactly after normalization (upper case, no
+punctuation, TWP/BORO spelled out), and otherwise by Jaro-Winkler
+similarity against the municipalities of that county.
+"""
+
+import csv
+import gzip
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .matching import jaro_winkler
+from .pa import PACounty, PAOVRRequest
+
+# county FIPS code (state 42) -> county name as the PA API spells it
+PA_COUNTY_FIPS = {
+    "42001": "ADAMS",
+    "42003": "ALLEGHENY",
+    "42005": "ARMSTRONG",
+    "42007": "BEAVER",
+    "42009": "BEDFORD",
+    "42011": "BERKS",
+    "42013": "BLAIR",
+    "42015": "BRADFORD",
+    "42017": "BUCKS",
+    "42019": "BUTLER",
+    "42021": "CAMBRIA",
+    "42023": "CAMERON",
+    "42025": "CARBON",
+    "42027": "CENTRE",
+    "42029": "CHESTER",
+    "42031": "CLARION",
+    "42033": "CLEARFIELD",
+    "42035": "CLINTON",
+    "42037": "COLUMBIA",
+    "42039": "CRAWFORD",
+    "42041": "CUMBERLAND",
+    "42043": "DAUPHIN",
+    "42045": "DELAWARE",
+    "42047": "ELK",
+    "42049": "ERIE",
+    "42051": "FAYETTE",
+    "42053": "FOREST",
+    "42055": "FRANKLIN",
+    "42057": "FULTON",
+    "42059": "GREENE",
+    "42061": "HUNTINGDON",
+    "42063": "INDIANA",
+    "42065": "JEFFERSON",
+    "42067": "JUNIATA",
+    "42069": "LACKAWANNA",
+    "42071": "LANCASTER",
+    "42073": "LAWRENCE",
+    "42075": "LEBANON",
+    "42077": "LEHIGH",
+    "42079": "LUZERNE",
+    "42081": "LYCOMING",
+    "42083": "MCKEAN",
+    "42085": "MERCER",
+    "42087": "MIFFLIN",
+    "42089": "MONROE",
+    "42091": "MONTGOMERY",
+    "42093": "MONTOUR",
+    "42095": "NORTHAMPTON",
+    "42097": "NORTHUMBERLAND",
+    "42099": "PERRY",
+    "42101": "PHILADELPHIA",
+    "42103": "PIKE",
+    "42105": "POTTER",
+    "42107": "SCHUYLKILL",
+    "42109": "SNYDER",
+    "42111": "SOMERSET",
+    "42113": "SULLIVAN",
+    "42115": "SUSQUEHANNA",
+    "42117": "TIOGA",
+    "42119": "UNION",
+    "42121": "VENANGO",
+    "42123": "WARREN",
+    "42125": "WASHINGTON",
+    "42127": "WAYNE",
+    "42129": "WESTMORELAND",
+    "42131": "WYOMING",
+    "42133": "YORK",
+}
+
+DEFAULT_MIN_SCORE = 0.9
+DEFAULT_MIN_MARGIN = 0.01
+# fill() picks a county for a ZIP that spans several only if this share of
+# its addresses are in one
+DEFAULT_DOMINANT_SHARE = 0.95
+
+RE_NOT_WORD = re.compile(r"[^A-Z0-9 ]+")
+ABBREVIATIONS = {
+    "TWP": "TOWNSHIP",
+    "TWSP": "TOWNSHIP",
+    "BORO": "BOROUGH",
+    "BOR": "BOROUGH",
+    "MT": "MOUNT",
+}
+KINDS = {"TOWNSHIP", "BOROUGH", "CITY", "TOWN"}
+
+
+def normalize_place(name: Optional[str]) -> str:
+    """
+    " Mt. Joy Twp" -> "MOUNT JOY TOWNSHIP"
+    """
+    if not name:
+        return ""
+    name = name.upper().replace(".", "").replace("'", "")
+    words = RE_NOT_WORD.sub(" ", name).split()
+    return " ".join(ABBREVIATIONS.get(w, w) for w in words)
+
+
+def split_kind(name: str) -> Tuple[str, str]:
+    """
+    "ALEPPO TOWNSHIP" -> ("ALEPPO", "TOWNSHIP"); ("MONROE", "") if there's no
+    kind of municipality at the end
+    """
+    base, _, last = name.rpartition(" ")
+    if base and last in KINDS:
+        return base, last
+    return name, ""
+
+
+def normalize_county(name: Optional[str]) -> str:
+    name = normalize_place(name)
+    if name.endswith(" COUNTY"):
+        name = name[: -len(" COUNTY")]
+    return name.replace(" ", "")
+
+
+class PAPlaceIndex:
+    def __init__(self) -> None:
+        # normalized county -> (county name, county id)
+        self._counties: Dict[str, Tuple[str, Optional[str]]] = {}
+        # (normalized county, normalized municipality) -> (id, name)
+        self._municipalities: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        # normalized county -> normalized municipality -> (name without kind,
+        # kind, id, name), for fuzzy matching
+        self._by_county: Dict[str, Dict[str, Tuple[str, str, str, str]]] = {}
+        # ZIP -> [(county name, share of addresses)], largest share first
+        self._zips: Dict[str, List[Tuple[str, float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._municipalities)
+
+    def add_counties(self, counties: Iterable[PACounty]) -> None:
+        """
+        From PAOVRSession.fetch_counties_and_municipalities()
+        """
+        for county in counties:
+            ckey = normalize_county(county.county_name)
+            self._counties[ckey] = (county.county_name, county.county_id)
+            for m in county.municipalities:
+                self.add_municipality(
+                    county.county_name, m.municipality_id, m.municipality_name
+                )
+
+    def add_municipality(
+        self, county: str, municipality_id: str, municipality_name: str
+    ) -> None:
+        ckey = normalize_county(county)
+        if ckey not in self._counties:
+            self._counties[ckey] = (county.upper(), None)
+        mkey = normalize_place(municipality_name)
+        self._municipalities[(ckey, mkey)] = (municipality_id, municipality_name)
+        # replaced, not appended: a refresh of a loaded index must not leave
+        # two copies of a municipality to tie with each other
+        self._by_county.setdefault(ckey, {})[mkey] = (
+            *split_kind(mkey),
+            municipality_id,
+            municipality_name,
+        )
+
+    def add_zip(self, zipcode: str, county: str, share: float = 1.0) -> None:
+        candidates = self._zips.setdefault(zipcode[:5], [])
+        ckey = normalize_county(county)
+        candidates[:] = [c for c in candidates if normalize_county(c[0]) != ckey]
+        candidates.append((county, share))
+        candidates.sort(key=lambda c: -c[1])
+
+    def add_hud_crosswalk(self, path: str) -> int:
+        """
+        Add the PA rows of a HUD USPS ZIP-county crosswalk CSV (columns ZIP,
+        COUNTY as a 5-digit FIPS code, and RES_RATIO); returns how many
+        """
+        n = 0
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                row = {k.strip().upper(): v for k, v in row.items() if k}
+                county = PA_COUNTY_FIPS.get(row.get("COUNTY", "").strip().zfill(5))
+                if county is None:
+                    continue
+                ratio = row.get("RES_RATIO") or row.get("TOT_RATIO") or "1"
+                self.add_zip(row["ZIP"].strip().zfill(5), county, float(ratio))
+                n += 1
+        return n
+
+    def counties_for_zip(self, zipcode: str) -> List[str]:
+        """
+        Counties that addresses in a ZIP code may be in, most likely first
+        """
+        return [c for c, _ in self._zips.get(zipcode[:5], ())]
+
+    def county_id(self, county: str) -> Optional[str]:
+        found = self._counties.get(normalize_county(county))
+        return found[1] if found else None
+
+    def municipality(
+        self,
+        county: str,
+        name: str,
+        min_score: float = DEFAULT_MIN_SCORE,
+        min_margin: float = DEFAULT_MIN_MARGIN,
+    ) -> Optional[Tuple[str, str]]:
+        """
+        (municipality_id, municipality name) of the municipality in county
+        best matching name, or None if there isn't a clear match
+        """
+        ckey = normalize_county(county)
+        mkey = normalize_place(name)
+        found = self._municipalities.get((ckey, mkey))
+        if found is not None or not mkey:
+            return found
+
+        # compare names without "TOWNSHIP" etc., which cities usually lack,
+        # but only with municipalities of the same kind if name has one
+        base, kind = split_kind(mkey)
+        best: Optional[Tuple[str, str]] = None
+        best_score = 0.0
+        runner_up = 0.0
+        for candidate in self._by_county.get(ckey, {}).values():
+            c_base, c_kind, municipality_id, municipality_name = candidate
+            if kind and c_kind and kind != c_kind:
+                continue
+            s = jaro_winkler(base, c_base)
+            if s > best_score:
+                best, best_score, runner_up = (
+                    (municipality_id, municipality_name),
+                    s,
+                    best_score,
+                )
+            elif s > runner_up:
+                runner_up = s
+        if best_score < min_score or best_score - runner_up < min_margin:
+            return None
+        return best
+
+    def municipality_id(self, county: str, name: str) -> Optional[str]:
+        found = self.municipality(county, name)
+        return found[0] if found else None
+
+    def fill(
+        self,
+        request: PAOVRRequest,
+        dominant_share: float = DEFAULT_DOMINANT_SHARE,
+    ) -> bool:
+        """
+        Fill in request.county from its ZIP (if it's blank and the ZIP is
+        clearly in one county) and request.municipality from its city (if
+        it's blank and matches one).  Returns whether anything changed.
+        """
+        changed = False
+        if not request.county and request.zipcode:
+            candidates = self._zips.get(request.zipcode[:5])
+            if candidates and (
+                len(candidates) == 1 or candidates[0][1] >= dominant_share
+            ):
+                request.county = candidates[0][0]
+                changed = True
+        if not request.municipality and request.county and request.city:
+            found = self.municipality(request.county, request.city)
+            if found is not None:
+                request.municipality = found[1]
+                changed = True
+        return changed
+
+    def to_dict(self) -> dict:
+        return {
+            "counties": {name: cid for name, cid in self._counties.values()},
+            "municipalities": {
+                self._counties[ckey][0]: [
+                    [mid, name] for _, _, mid, name in entries.values()
+                ]
+                for ckey, entries in self._by_county.items()
+            },
+            "zips": {z: [[c, s] for c, s in cs] for z, cs in self._zips.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PAPlaceIndex":
+        index = cls()
+        for name, cid in data.get("counties", {}).items():
+            index._counties[normalize_county(name)] = (name, cid)
+        for county, entries in data.get("municipalities", {}).items():
+            for mid, name in entries:
+                index.add_municipality(county, mid, name)
+        for zipcode, candidates in data.get("zips", {}).items():
+            for county, share in candidates:
+                index.add_zip(zipcode, county, share)
+        return index
+
+    def save(self, path: str) -> None:
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "PAPlaceIndex":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,125 @@
+"""
+One process serving several PA API keys (e.g. one per partner
+organization, some staging and some production).
+
+    pool = PAOVRSessionPool(make_limiter=lambda: AIMDLimiter(max_limit=16))
+    pool.add(org_a_key, staging=False)
+    pool.add(org_b_key, staging=True, rate_limiter=org_b_rate_limit)
+    pool.register(org_a_key, False, request)
+
+All sessions send through one requests.Session, so there is one connection
+pool per host (staging and production) however many keys there are.  Its
+cookie jar would be shared too, so it accepts no cookies: nothing one key's
+responses set is sent with another key's requests.
+Everything else (concurrency and rate limits, idempotency store, and any
+state the session keeps about its key) belongs to one key's PAOVRSession.
+"""
+
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .limiter import AIMDLimiter
+from .pa import PAOVRRequest, PAOVRResponse, PAOVRSession
+
+logger = logging.getLogger("ovrlib.pa_pool")
+
+DEFAULT_POOL_MAXSIZE = 32
+
+
+class PAOVRSessionPool:
+    def __init__(
+        self,
+        http_session: Optional[requests.Session] = None,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        make_limiter: Optional[Callable[[], AIMDLimiter]] = None,
+        **session_kwargs: Any,
+    ):
+        """
+        pool_maxsize: connections kept open per host, across all keys.
+        make_limiter: called for each key's own AIMDLimiter.  session_kwargs
+        are passed to every PAOVRSession (so shouldn't hold per-key state).
+        An http_session passed in should refuse cookies the same way.
+        """
+        if http_session is None:
+            http_session = requests.Session()
+            # no domain is allowed to set (or be sent) a cookie
+            http_session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+            http_session.mount("https://", adapter)
+            http_session.mount("http://", adapter)
+            self._owns_http_session = True
+        else:
+            self._owns_http_session = False
+        self.http_session = http_session
+        self.make_limiter = make_limiter
+        self.session_kwargs = session_kwargs
+        self._lock = threading.Lock()
+        self._sessions: Dict[Tuple[str, bool], PAOVRSession] = {}
+
+    def close(self) -> None:
+        if self._owns_http_session:
+            self.http_session.close()
+
+    def __enter__(self) -> "PAOVRSessionPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def keys(self) -> List[Tuple[str, bool]]:
+        """
+        (api_key, staging) of each session
+        """
+        with self._lock:
+            return list(self._sessions)
+
+    def _new_session(self, api_key: str, staging: bool, **kwargs: Any) -> PAOVRSession:
+        values = dict(self.session_kwargs)
+        if self.make_limiter is not None:
+            values["limiter"] = self.make_limiter()
+        values.update(kwargs)
+        return PAOVRSession(api_key, staging, http_session=self.http_session, **values)
+
+    def add(self, api_key: str, staging: bool, **kwargs: Any) -> PAOVRSession:
+        """
+        Set up the session for a key, with PAOVRSession arguments for it
+        alone (overriding the pool's); replaces any session it already had
+        """
+        session = self._new_session(api_key, staging, **kwargs)
+        with self._lock:
+            self._sessions[(api_key, staging)] = session
+        return session
+
+    def session(self, api_key: str, staging: bool) -> PAOVRSession:
+        """
+        The session for a key, set up with the pool's defaults if it hasn't
+        been added
+        """
+        with self._lock:
+            session = self._sessions.get((api_key, staging))
+            if session is None:
+                session = self._sessions[(api_key, staging)] = self._new_session(
+                    api_key, staging
+                )
+            return session
+
+    def remove(self, api_key: str, staging: bool) -> None:
+        with self._lock:
+            self._sessions.pop((api_key, staging), None)
+
+    def register(
+        self, api_key: str, staging: bool, registration: PAOVRRequest
+    ) -> PAOVRResponse:
+        """
+        Submit a registration with the given key
+        """
+        return self.session(api_key, staging).register(registration)
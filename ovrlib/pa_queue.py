@@ -0,0 +1,494 @@
+"""
+Durable hand-off of PA registrations from code that can't wait on the state
+API (e.g. a web request) to a long-running worker.
+
+Producers only write to a local sqlite database (in WAL mode), so enqueueing
+costs the same however slow the state is:
+
+    queue = SubmissionQueue("/var/lib/ovr/pa-queue.db")
+    job_id = queue.enqueue(request)
+
+and a worker process submits them with PAOVRSession.register(), recording
+each PAOVRResponse or error against its job:
+
+    worker = SubmissionWorker(
+        SubmissionQueue("/var/lib/ovr/pa-queue.db"), session, concurrency=8
+    )
+    worker.run()  # until SIGTERM/SIGINT
+
+On SIGTERM (or SIGINT, or stop()) the worker stops claiming jobs, lets the
+ones already submitted finish and records their results before returning.
+Jobs whose request never reached the state (the connection was refused or
+timed out) go back to the queue until they have been tried max_attempts
+times, each time waiting longer (exponential backoff, with jitter) before
+they can be claimed again, so an outage doesn't use up their attempts at
+once.  One that failed after it may have been received (a 5xx, a read
+timeout, a dropped connection) is only sent again when the session has an
+IdempotencyStore to catch a duplicate; otherwise it's left "in_doubt" until
+someone checks the state's records and calls resolve().  Any other error
+fails the job.
+
+A job left "running" by a worker that died can't be told apart from one the
+state received, so recover() puts those back only when asked.
+"""
+
+import datetime
+import json
+import logging
+import random
+import signal
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from ._slots import slotted
+from .exceptions import SubmissionInDoubtError
+from .idempotency import is_in_doubt, was_not_sent
+from .pa import PAOVRRequest, PAOVRResponse, PAOVRSession
+
+logger = logging.getLogger("ovrlib.pa_queue")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+IN_DOUBT = "in_doubt"
+STATES = [PENDING, RUNNING, DONE, FAILED, IN_DOUBT]
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 300.0
+
+
+@slotted
+@dataclass
+class Job:
+    id: int
+    state: str
+    request: PAOVRRequest
+    attempts: int
+    enqueued: float
+    finished: Optional[float] = None
+    response: Optional[PAOVRResponse] = None
+    error_type: Optional[str] = None
+    error_message: Optional[str] = None
+    # where the request came from, e.g. its line in an input file
+    line: Optional[int] = None
+
+
+_JOB_COLUMNS = (
+    "id, state, request, attempts, enqueued, finished, application_id,"
+    " application_date, signature_source, error_type, error_message, line"
+)
+
+
+def _job(row: tuple) -> Job:
+    response = None
+    if row[1] == DONE:
+        response = PAOVRResponse(
+            application_id=row[6],
+            application_date=(
+                datetime.datetime.fromisoformat(row[7]) if row[7] is not None else None
+            ),
+            signature_source=row[8],
+        )
+    return Job(
+        id=row[0],
+        state=row[1],
+        request=PAOVRRequest.from_dict(json.loads(row[2])),
+        attempts=row[3],
+        enqueued=row[4],
+        finished=row[5],
+        response=response,
+        error_type=row[9],
+        error_message=row[10],
+        line=row[11],
+    )
+
+
+class SubmissionQueue:
+    def __init__(self, path: str, timeout: float = 30.0):
+        """
+        Several processes may open the same path; timeout is how long to
+        wait for another one's write to finish.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # durable once committed to the WAL; the database file catches up later
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " state TEXT NOT NULL,"
+            " request TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " enqueued REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL,"
+            " application_id TEXT,"
+            " application_date TEXT,"
+            " signature_source TEXT,"
+            " error_type TEXT,"
+            " error_message TEXT,"
+            " line INTEGER,"
+            " not_before REAL)"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+        # a queue created before jobs had these
+        for name, kind in [("line", "INTEGER"), ("not_before", "REAL")]:
+            if name not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> "SubmissionQueue":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def enqueue(self, request: PAOVRRequest) -> int:
+        return self.enqueue_many([request])[0]
+
+    def enqueue_many(
+        self,
+        requests: Iterable[PAOVRRequest],
+        lines: Optional[Iterable[int]] = None,
+    ) -> List[int]:
+        """
+        Add requests in one transaction; returns their job ids.  lines, if
+        given, are recorded with them (see last_line()).
+        """
+        rows = [json.dumps(r.to_dict()) for r in requests]
+        line_numbers: List[Optional[int]] = (
+            [None] * len(rows) if lines is None else list(lines)
+        )
+        if len(line_numbers) != len(rows):
+            raise ValueError("lines must match requests")
+        now = time.time()
+        ids: List[int] = []
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for row, line in zip(rows, line_numbers):
+                    cur = db.execute(
+                        "INSERT INTO jobs (state, request, enqueued, line)"
+                        " VALUES (?, ?, ?, ?)",
+                        (PENDING, row, now, line),
+                    )
+                    assert cur.lastrowid is not None
+                    ids.append(cur.lastrowid)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return ids
+
+    def claim(self) -> Optional[Job]:
+        """
+        Mark the oldest pending job that is due running and return it; None
+        if there isn't one
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT id, request, attempts, enqueued FROM jobs"
+                    " WHERE state = ? AND (not_before IS NULL OR not_before <= ?)"
+                    " ORDER BY id LIMIT 1",
+                    (PENDING, now),
+                ).fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE jobs SET state = ?, started = ?,"
+                        " attempts = attempts + 1 WHERE id = ?",
+                        (RUNNING, now, row[0]),
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, request, attempts, enqueued = row
+        return Job(
+            id=job_id,
+            state=RUNNING,
+            request=PAOVRRequest.from_dict(json.loads(request)),
+            attempts=attempts + 1,
+            enqueued=enqueued,
+        )
+
+    def complete(self, job_id: int, response: PAOVRResponse) -> None:
+        date = response.application_date
+        self._execute(
+            "UPDATE jobs SET state = ?, finished = ?, application_id = ?,"
+            " application_date = ?, signature_source = ?,"
+            " error_type = NULL, error_message = NULL WHERE id = ?",
+            (
+                DONE,
+                time.time(),
+                response.application_id,
+                date.isoformat() if date else None,
+                response.signature_source,
+                job_id,
+            ),
+        )
+
+    def fail(
+        self,
+        job_id: int,
+        error: BaseException,
+        retry: bool = False,
+        in_doubt: bool = False,
+        delay: float = 0.0,
+    ) -> None:
+        """
+        Record error against the job; retry=True puts it back in the queue
+        (not to be claimed for delay seconds), and in_doubt=True holds it
+        for resolve()
+        """
+        state = PENDING if retry else IN_DOUBT if in_doubt else FAILED
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET state = ?, finished = ?, not_before = ?,"
+            " error_type = ?, error_message = ? WHERE id = ?",
+            (
+                state,
+                None if retry else now,
+                now + delay if retry else None,
+                type(error).__name__,
+                str(error),
+                job_id,
+            ),
+        )
+
+    def recover(self) -> int:
+        """
+        Put jobs left running (by a worker that was killed) back in the
+        queue; returns how many.  Only call this when no worker is running
+        against the queue.  The state may already have received some of
+        them.
+        """
+        return self._execute(
+            "UPDATE jobs SET state = ? WHERE state = ?", (PENDING, RUNNING)
+        ).rowcount
+
+    def resolve(self, job_id: int) -> bool:
+        """
+        Put an in-doubt job back in the queue, once the state's records show
+        it wasn't received; returns whether it was in doubt
+        """
+        return (
+            self._execute(
+                "UPDATE jobs SET state = ?, finished = NULL, not_before = NULL"
+                " WHERE id = ? AND state = ?",
+                (PENDING, job_id, IN_DOUBT),
+            ).rowcount
+            == 1
+        )
+
+    def _execute(self, sql: str, args: tuple) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, args)
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return None if row is None else _job(row)
+
+    def jobs(self, page_size: int = 1000) -> Iterator[Job]:
+        """
+        Every job, in the order they were enqueued; read a page at a time
+        """
+        after = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id > ?"
+                    " ORDER BY id LIMIT ?",
+                    (after, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _job(row)
+            after = rows[-1][0]
+
+    def last_line(self) -> Optional[int]:
+        """
+        The highest line recorded by enqueue_many(); None if there isn't one
+        """
+        with self._lock:
+            return self._db.execute("SELECT MAX(line) FROM jobs").fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Jobs in each state
+        """
+        r = {s: 0 for s in STATES}
+        with self._lock:
+            for state, n in self._db.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ):
+                r[state] = n
+        return r
+
+    def __len__(self) -> int:
+        """
+        Jobs waiting to be claimed
+        """
+        return self.counts()[PENDING]
+
+
+class SubmissionWorker:
+    def __init__(
+        self,
+        queue: SubmissionQueue,
+        session: PAOVRSession,
+        concurrency: int = 4,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        poll_interval: float = 1.0,
+        retry_on: Optional[Callable[[BaseException], bool]] = None,
+        backoff: float = DEFAULT_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+    ):
+        """
+        retry_on: which errors to try again; by default those where the
+        request wasn't sent, and (only if the session has an idempotency
+        store) those where it may have been.  A job retried after its nth
+        attempt waits between half and all of backoff * 2 ** (n - 1)
+        seconds, up to max_backoff.
+        """
+        self.queue = queue
+        self.session = session
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retry_on = retry_on
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        # the counts below are updated from every worker thread
+        self._counts_lock = threading.Lock()
+        self.submitted = 0
+        self.failed = 0
+        self.retried = 0
+        self.in_doubt = 0
+
+    def stop(self) -> None:
+        """
+        Stop claiming jobs; run() returns once the ones in flight finish
+        """
+        self._stop.set()
+
+    def _handle_signal(self, signum: int, frame: Any) -> None:
+        logger.info(f"{signal.Signals(signum).name}: draining")
+        self.stop()
+
+    def _should_retry(self, e: BaseException) -> bool:
+        if self.retry_on is not None:
+            return self.retry_on(e)
+        if was_not_sent(e):
+            return True
+        # the store turns a resend of something the state got into its
+        # stored response or a SubmissionInDoubtError, never a duplicate
+        store = getattr(self.session, "idempotency", None)
+        return store is not None and is_in_doubt(e)
+
+    def _delay(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        # jittered, so jobs that failed together don't all come back together
+        return random.uniform(delay / 2, delay)
+
+    def process(self, job: Job) -> None:
+        """
+        Submit one claimed job and record the outcome
+        """
+        try:
+            response = self.session.register(job.request)
+        except Exception as e:
+            retry = self._should_retry(e) and job.attempts < self.max_attempts
+            in_doubt = not retry and (
+                isinstance(e, SubmissionInDoubtError) or is_in_doubt(e)
+            )
+            logger.info(
+                f"job {job.id} attempt {job.attempts} failed: "
+                f"{type(e).__name__}: {e}"
+                f"{'; will retry' if retry else '; in doubt' if in_doubt else ''}"
+            )
+            self.queue.fail(
+                job.id,
+                e,
+                retry=retry,
+                in_doubt=in_doubt,
+                delay=self._delay(job.attempts) if retry else 0.0,
+            )
+            with self._counts_lock:
+                if retry:
+                    self.retried += 1
+                elif in_doubt:
+                    self.in_doubt += 1
+                else:
+                    self.failed += 1
+            return
+        self.queue.complete(job.id, response)
+        with self._counts_lock:
+            self.submitted += 1
+
+    def _work(self, until_empty: bool) -> None:
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                # pending jobs may just be waiting out their backoff
+                if until_empty and not len(self.queue):
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            self.process(job)
+
+    def run(self, until_empty: bool = False) -> None:
+        """
+        Submit jobs from `concurrency` threads until stop() or SIGTERM/SIGINT
+        (or, with until_empty, until nothing is pending).  Signal handlers
+        are only installed when called from the main thread.
+        """
+        self._stop.clear()
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous[signum] = signal.signal(signum, self._handle_signal)
+        try:
+            threads = [
+                threading.Thread(
+                    target=self._work, args=(until_empty,), name=f"ovrlib-queue-{i}"
+                )
+                for i in range(self.concurrency)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                # join() with a timeout so signals are handled promptly
+                while t.is_alive():
+                    t.join(timeout=0.5)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        logger.info(
+            f"submitted {self.submitted}, failed {self.failed}, "
+            f"in doubt {self.in_doubt}, retried {self.retried}"
+        )
@@ -0,0 +1,212 @@
+"""
+Deadline-aware ordering of pending PA registrations.
+
+A plain FIFO lets a registration due tonight wait behind work that could go
+in next week.  DeadlineScheduler hands out pending requests in order of the
+deadline that applies to each:
+
+- "vbm": mail-in ballot requests, due by the VBM request deadline
+- "registration": everything else, due by the voter registration deadline
+- "deferred": requests whose deadlines have passed (or that the caller
+  marks deferred), oldest first
+
+A low_priority_share of dispatches goes to deferred requests whenever any
+are waiting, so they keep moving however busy the deadline queue is.
+
+    scheduler = DeadlineScheduler(session.get_election_info())
+    for r in requests:
+        scheduler.submit(r)
+    scheduler.run(session, workers=8, on_result=record)
+"""
+
+import collections
+import datetime
+import heapq
+import itertools
+import logging
+import threading
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from .pa import PAOVRElectionInfo, PAOVRRequest, PAOVRSession
+
+logger = logging.getLogger("ovrlib.pa_scheduler")
+
+VBM = "vbm"
+REGISTRATION = "registration"
+DEFERRED = "deferred"
+CLASSES = [VBM, REGISTRATION, DEFERRED]
+
+DEFAULT_LOW_PRIORITY_SHARE = 0.1
+
+
+def parse_deadline(
+    value: Union[None, str, datetime.date, datetime.datetime]
+) -> Optional[datetime.datetime]:
+    """
+    A deadline as a datetime.  PAOVRElectionInfo.next_vr_deadline comes back
+    from the API as "MM/DD/YYYY"; a bare date means the end of that day.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.strptime(value.strip(), "%m/%d/%Y").date()
+        except ValueError:
+            logger.warning(f"unrecognized deadline {value!r}")
+            return None
+    return datetime.datetime.combine(value, datetime.time.max)
+
+
+class DeadlineScheduler:
+    def __init__(
+        self,
+        election_info: PAOVRElectionInfo,
+        low_priority_share: float = DEFAULT_LOW_PRIORITY_SHARE,
+        clock: Callable[[], datetime.datetime] = datetime.datetime.now,
+    ):
+        self.low_priority_share = low_priority_share
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        # (deadline, seq, class, request)
+        self._heap: List[Tuple[datetime.datetime, int, str, PAOVRRequest]] = []
+        self._deferred: Deque[PAOVRRequest] = collections.deque()
+        self._depth = {c: 0 for c in CLASSES}
+        self._dispatched = {c: 0 for c in CLASSES}
+        self._closed = False
+        self.set_election_info(election_info)
+
+    def set_election_info(self, election_info: PAOVRElectionInfo) -> None:
+        """
+        Use new deadlines (e.g. after the next election is announced) for
+        requests submitted from now on
+        """
+        with self._cond:
+            self.vr_deadline = parse_deadline(election_info.next_vr_deadline)
+            self.vbm_deadline = parse_deadline(election_info.vbm_request_deadline)
+
+    def classify(
+        self, request: PAOVRRequest
+    ) -> Tuple[str, Optional[datetime.datetime]]:
+        """
+        The class and deadline that apply to a request right now
+        """
+        now = self.clock()
+        if (
+            request.mailin_ballot_request
+            and self.vbm_deadline is not None
+            and self.vbm_deadline >= now
+        ):
+            return VBM, self.vbm_deadline
+        if self.vr_deadline is not None and self.vr_deadline >= now:
+            return REGISTRATION, self.vr_deadline
+        return DEFERRED, None
+
+    def submit(self, request: PAOVRRequest, deferred: bool = False) -> str:
+        """
+        Queue a request; returns its class.  deferred=True queues it behind
+        all deadline work (e.g. a correction that can wait).
+        """
+        cls, deadline = (DEFERRED, None) if deferred else self.classify(request)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("scheduler is closed")
+            if deadline is None:
+                self._deferred.append(request)
+            else:
+                heapq.heappush(self._heap, (deadline, next(self._seq), cls, request))
+            self._depth[cls] += 1
+            self._cond.notify()
+        return cls
+
+    def depth(self) -> Dict[str, int]:
+        """
+        Pending requests per class
+        """
+        with self._cond:
+            return dict(self._depth)
+
+    def dispatched(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self._dispatched)
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._heap) + len(self._deferred)
+
+    def close(self) -> None:
+        """
+        Stop accepting requests; get() returns None once the queue is empty
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _pop(self) -> Tuple[str, PAOVRRequest]:
+        total = sum(self._dispatched.values())
+        if self._deferred and (
+            not self._heap
+            or self._dispatched[DEFERRED] + 1 <= self.low_priority_share * (total + 1)
+        ):
+            cls, request = DEFERRED, self._deferred.popleft()
+        else:
+            _, _, cls, request = heapq.heappop(self._heap)
+        self._depth[cls] -= 1
+        self._dispatched[cls] += 1
+        return cls, request
+
+    def get(
+        self, block: bool = True, timeout: Optional[float] = None
+    ) -> Optional[Tuple[str, PAOVRRequest]]:
+        """
+        The next (class, request) to submit.  None if nothing is pending and
+        (when blocking) the scheduler is closed or timeout ran out.
+        """
+        with self._cond:
+            if block:
+                self._cond.wait_for(
+                    lambda: self._heap or self._deferred or self._closed,
+                    timeout=timeout,
+                )
+            if not self._heap and not self._deferred:
+                return None
+            return self._pop()
+
+    def run(
+        self,
+        session: PAOVRSession,
+        workers: int = 4,
+        on_result: Optional[Callable[[PAOVRRequest, Any], None]] = None,
+        until_empty: bool = True,
+    ) -> None:
+        """
+        Submit queued requests with session.register() from `workers`
+        threads.  on_result(request, response_or_exception) is called for
+        each.  Returns once the queue is empty (until_empty) or, otherwise,
+        once close() has been called and the queue drained.
+        """
+
+        def worker() -> None:
+            while True:
+                item = self.get(block=not until_empty)
+                if item is None:
+                    return
+                cls, request = item
+                try:
+                    result: Any = session.register(request)
+                except Exception as e:
+                    logger.info(f"{cls} registration failed: {e}")
+                    result = e
+                if on_result is not None:
+                    on_result(request, result)
+
+        threads = [
+            threading.Thread(target=worker, name=f"ovrlib-scheduler-{i}")
+            for i in range(workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
@@ -0,0 +1,253 @@
+"""
+Host-wide request rate limit shared by every process, via token buckets in
+a memory-mapped file (no external service):
+
+    limiter = SharedRateLimiter(
+        "/dev/shm/ovrlib-pa-rate",
+        {
+            "total": Budget(rate=10, burst=20),  # every request
+            "SETAPPLICATION": Budget(rate=2, burst=5),
+            "default": Budget(rate=8, burst=10),  # actions without their own
+        },
+    )
+    session = PAOVRSession(api_key, staging=False, rate_limiter=limiter)
+
+A request takes a token from the "total" bucket (if there is one) and from
+its action's bucket, or "default"; it waits until all of them have one.
+Buckets are matched by name across processes; the most recently opened
+limiter's rate and burst win.  Updates are serialized with fcntl.flock()
+on the file, so this works on POSIX hosts only; a limiter made before a
+fork reopens the file in the child, since a flock is shared by every copy
+of the same open file.  Refill times are wall-clock (time.time()), so a
+file that outlives a reboot still works, and one in the future (after the
+clock was set back) counts as now.
+"""
+
+import dataclasses
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .exceptions import RateLimitTimeout
+
+HEADER = struct.Struct("<8sI")
+MAGIC = b"OVRLRATE"
+# name, rate, burst, tokens, last refill (time.time()), total wait seconds,
+# wait count
+SLOT = struct.Struct("<32sdddddQ")
+MAX_BUCKETS = 32
+SIZE = HEADER.size + MAX_BUCKETS * SLOT.size
+
+TOTAL = "total"
+DEFAULT = "default"
+
+
+@dataclasses.dataclass
+class Budget:
+    rate: float  # tokens per second
+    burst: float  # bucket size
+
+
+class SharedRateLimiter:
+    def __init__(
+        self,
+        path: str,
+        budgets: Dict[str, Budget],
+        max_sleep: float = 0.25,
+    ):
+        for name in budgets:
+            if len(name.encode()) > 32:
+                raise ValueError(f"budget name too long: {name}")
+        self.path = path
+        self.budgets = budgets
+        self.max_sleep = max_sleep
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        # this process's share of the waiting
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < SIZE:
+                    os.ftruncate(fd, SIZE)
+                self._mmap = mmap.mmap(fd, SIZE)
+                self._init_slots()
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._pid = os.getpid()
+
+    def _own_fd(self) -> int:
+        """
+        The file, opened by this process; called with self._lock held
+        """
+        if os.getpid() != self._pid:
+            # forked: our copy of the parent's fd shares its flock
+            fd = os.open(self.path, os.O_RDWR)
+            os.close(self._fd)
+            self._fd = fd
+            self._pid = os.getpid()
+        return self._fd
+
+    def close(self) -> None:
+        self._mmap.close()
+        os.close(self._fd)
+
+    def __enter__(self) -> "SharedRateLimiter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _init_slots(self) -> None:
+        """
+        Find or claim a slot for each budget; called with the file locked
+        """
+        magic, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            count = 0
+        names: Dict[str, int] = {}
+        for i in range(count):
+            raw = SLOT.unpack_from(self._mmap, HEADER.size + i * SLOT.size)[0]
+            names[raw.rstrip(b"\0").decode()] = i
+        now = time.time()
+        for name, budget in self.budgets.items():
+            found = names.get(name)
+            if found is None:
+                if count >= MAX_BUCKETS:
+                    raise ValueError(f"{self.path}: no room for budget {name}")
+                i = names[name] = count
+                count += 1
+                values = [budget.burst, now, 0.0, 0]
+            else:
+                i = found
+                values = list(self._read(i)[3:])
+                values[0] = min(values[0], budget.burst)
+                values[1] = min(values[1], now)
+            SLOT.pack_into(
+                self._mmap,
+                HEADER.size + i * SLOT.size,
+                name.encode(),
+                budget.rate,
+                budget.burst,
+                *values,
+            )
+            self._slots[name] = i
+        HEADER.pack_into(self._mmap, 0, MAGIC, count)
+
+    def _read(self, i: int) -> tuple:
+        return SLOT.unpack_from(self._mmap, HEADER.size + i * SLOT.size)
+
+    def _write(self, i: int, values: tuple) -> None:
+        SLOT.pack_into(self._mmap, HEADER.size + i * SLOT.size, *values)
+
+    def buckets_for(self, action: str) -> List[str]:
+        r = []
+        if TOTAL in self._slots:
+            r.append(TOTAL)
+        if action in self._slots and action not in (TOTAL, DEFAULT):
+            r.append(action)
+        elif DEFAULT in self._slots:
+            r.append(DEFAULT)
+        return r
+
+    def _try_take(self, names: List[str], tokens: float) -> float:
+        """
+        Take tokens from every bucket if they all have enough; otherwise
+        take nothing.  Returns 0.0 on success or how long to wait.
+        """
+        with self._lock:
+            fd = self._own_fd()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                slots = []
+                wait = 0.0
+                for name in names:
+                    i = self._slots[name]
+                    raw, rate, burst, level, last, wsec, wcount = self._read(i)
+                    # a refill "in the future" means the clock went back
+                    level = min(burst, level + max(0.0, now - last) * rate)
+                    slots.append((i, raw, rate, burst, level, wsec, wcount))
+                    if level < tokens:
+                        wait = max(wait, (tokens - level) / rate if rate else 1.0)
+                for i, raw, rate, burst, level, wsec, wcount in slots:
+                    if not wait:
+                        level -= tokens
+                    self._write(i, (raw, rate, burst, level, now, wsec, wcount))
+                return wait
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _record_wait(self, names: List[str], seconds: float) -> None:
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+            fd = self._own_fd()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                for name in names:
+                    i = self._slots[name]
+                    values = list(self._read(i))
+                    values[5] += seconds
+                    values[6] += 1
+                    self._write(i, tuple(values))
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def acquire(
+        self, action: str, tokens: float = 1.0, timeout: Optional[float] = None
+    ) -> float:
+        """
+        Block until a request for action is allowed; returns how long it
+        had to wait.  Raises RateLimitTimeout after timeout seconds.
+        """
+        names = self.buckets_for(action)
+        if not names:
+            return 0.0
+        start = time.monotonic()
+        waited = False
+        while True:
+            wait = self._try_take(names, tokens)
+            if not wait:
+                break
+            waited = True
+            elapsed = time.monotonic() - start
+            if timeout is not None and elapsed + wait > timeout:
+                raise RateLimitTimeout(f"{action}: rate limited for {elapsed:.3f}s")
+            # other processes compete for the same tokens; check again soon
+            time.sleep(min(wait, self.max_sleep))
+        if not waited:
+            return 0.0
+        elapsed = time.monotonic() - start
+        self._record_wait(names, elapsed)
+        return elapsed
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Host-wide state of each bucket, including how many acquire() calls
+        (from any process) had to wait, and for how long in total
+        """
+        r = {}
+        now = time.time()
+        with self._lock:
+            for name, i in self._slots.items():
+                _, rate, burst, level, last, wsec, wcount = self._read(i)
+                r[name] = {
+                    "rate": rate,
+                    "burst": burst,
+                    "tokens": min(burst, level + max(0.0, now - last) * rate),
+                    "waits": wcount,
+                    "wait_seconds": wsec,
+                }
+        return r
@@ -0,0 +1,120 @@
+import datetime
+
+import pytest  # type: ignore
+
+from ..attribution import AttributionIndex, AttributionSession, StateRow
+from ..matching import jaro_winkler, normalize_dob, normalize_name, soundex
+from ..va import VATrackingRecord
+
+
+@pytest.mark.parametrize(
+    "a,b,expected",
+    [
+        ("MARTHA", "MARHTA", 0.961),
+        ("DIXON", "DICKSONX", 0.813),
+        ("", "ABC", 0.0),
+        ("SAME", "SAME", 1.0),
+    ],
+)
+def test_jaro_winkler(a, b, expected):
+    assert jaro_winkler(a, b) == pytest.approx(expected, abs=0.001)
+
+
+def test_normalize():
+    assert normalize_name(" O'Brien-Smith  Jr.") == "OBRIENSMITH"
+    assert normalize_name("José") == "JOSE"
+    assert soundex("ROBERT") == soundex("RUPERT") == "R163"
+    assert soundex("ASHCRAFT") == "A261"
+    assert normalize_dob("05/02/1944") == "1944-05-02"
+    assert normalize_dob("1944") == "1944"
+    assert normalize_dob(datetime.date(1944, 5, 2)) == "1944-05-02"
+
+
+@pytest.fixture
+def index():
+    index = AttributionIndex()
+    index.add_all(
+        [
+            AttributionSession(
+                "s1", "camp-1", "Sally", "Penndot", datetime.date(1944, 5, 2), "23219"
+            ),
+            AttributionSession(
+                "s2", None, "Robert", "Smith", datetime.date(1980, 1, 2), "80202"
+            ),
+            AttributionSession(
+                "s3", None, "Roberta", "Smith", datetime.date(1980, 1, 2), "80202"
+            ),
+            AttributionSession(
+                "s4", None, "Jonathan", "Quincy", datetime.date(1990, 7, 4), "23220"
+            ),
+            AttributionSession(
+                "s5", None, "Jamie", "Doe", datetime.date(1970, 1, 1), "23221"
+            ),
+            AttributionSession(
+                "s6", None, "Jamie", "Doe", datetime.date(1999, 9, 9), "23221"
+            ),
+        ]
+    )
+    return index
+
+
+def test_campaign_match(index):
+    a = index.match(StateRow("CO", campaign_id="camp-1", first_name="Nobody"))
+    assert (a.session_id, a.method, a.score) == ("s1", "campaign", 1.0)
+
+
+def test_fuzzy_match_with_typo(index):
+    record = VATrackingRecord(
+        campaign="", first_name="JONATHON", last_name="QUINCEY", zipcode="23220-1234"
+    )
+    a = index.match(StateRow.from_va_record(record))
+    assert a.session_id == "s4"
+    assert a.method == "fuzzy"
+    assert a.row.source is record
+
+
+def test_fuzzy_match_year_of_birth(index):
+    row = StateRow.from_mapping(
+        "CO",
+        {"FIRST": "ROBERT", "LAST": "SMITH", "YOB": "1980", "ZIP": "80202"},
+        {
+            "first_name": "FIRST",
+            "last_name": "LAST",
+            "date_of_birth": "YOB",
+            "zipcode": "ZIP",
+        },
+    )
+    assert index.match(row).session_id == "s2"
+
+
+def test_ambiguous_and_unmatched(index):
+    # without a birth date there's no telling the two Jamie Does apart
+    assert (
+        index.match(
+            StateRow("VA", first_name="Jamie", last_name="Doe", zipcode="23221")
+        )
+        is None
+    )
+    assert (
+        index.match(
+            StateRow("CO", first_name="Zed", last_name="Nobody", zipcode="10001")
+        )
+        is None
+    )
+    assert index.stats["ambiguous"] == 1
+    assert index.stats["unmatched"] == 1
+
+
+def test_attribute_stream(index):
+    rows = [
+        StateRow("VA", campaign_id="camp-1"),
+        StateRow("VA", campaign_id="unknown"),
+        StateRow(
+            "CO",
+            first_name="Sally",
+            last_name="Pendot",
+            date_of_birth="1944",
+            zipcode="23219",
+        ),
+    ]
+    assert [a.session_id for a in index.attribute(rows)] == ["s1", "s1"]
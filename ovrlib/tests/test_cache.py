@@ -0,0 +1,125 @@
+import datetime
+
+import responses  # type: ignore
+
+from .. import ga, wi
+from ..cache import FileCacheBackend, LookupCache, MemoryCacheBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+WI_VOTER_RESPONSE = {
+    "Success": True,
+    "Data": {
+        "voters": {
+            "$values": [
+                {
+                    "voterName": "BADGER, BUCKY",
+                    "dateOfBirth": "1949-01-01T00:00:00",
+                    "address": "1 University Ave",
+                    "city": "Madison",
+                    "state": "WI",
+                    "postalCode": "53706",
+                    "voterStatusName": "Active",
+                    "statusReasonName": "",
+                    "registrationDate": "01/02/2010",
+                    "registrationSource": "MyVote",
+                    "voterRegNumber": "0123",
+                    "voterID": "456",
+                    "districtComboID": "789",
+                    "jurisdictionID": "12",
+                }
+            ]
+        }
+    },
+}
+
+
+def test_memory_backend_lru_and_ttl():
+    clock = FakeClock()
+    backend = MemoryCacheBackend(max_entries=2, clock=clock)
+    backend.set("a", 1, ttl=10)
+    backend.set("b", 2, ttl=10)
+    assert backend.get("a") == (True, 1)
+    backend.set("c", 3, ttl=10)
+    # "b" was least recently used
+    assert backend.get("b") == (False, None)
+    assert backend.get("a") == (True, 1)
+    clock.now += 11
+    assert backend.get("a") == (False, None)
+    assert len(backend) == 1
+
+
+def test_file_backend_shared(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "cache.db")
+    one = FileCacheBackend(path, max_entries=2, clock=clock)
+    two = FileCacheBackend(path, max_entries=2, clock=clock)
+    one.set("a", None, ttl=10)
+    assert two.get("a") == (True, None)
+    clock.now += 1
+    one.set("b", [1], ttl=10)
+    clock.now += 1
+    one.set("c", [2], ttl=10)
+    assert two.get("a") == (False, None)
+    assert two.get("c") == (True, [2])
+    clock.now += 20
+    assert one.get("b") == (False, None)
+
+
+def test_voter_key_normalized():
+    cache = LookupCache()
+    dob = datetime.date(1949, 1, 1)
+    assert cache.voter_key("WI", " bucky ", "Badger", dob) == cache.voter_key(
+        "wi", "BUCKY", "badger", dob
+    )
+    assert cache.voter_key("WI", "bucky", "badger", dob) != cache.voter_key(
+        "WI", "bucky", "badger", dob, "Dane"
+    )
+
+
+@responses.activate
+def test_wi_lookup_voter_cached():
+    responses.add(
+        responses.POST, wi.SEARCH_ENDPOINT, json=WI_VOTER_RESPONSE, status=200
+    )
+    cache = LookupCache()
+    dob = datetime.date(1949, 1, 1)
+    first = wi.lookup_voter("Bucky", "Badger", dob, cache=cache)
+    second = wi.lookup_voter("bucky", "BADGER ", dob, cache=cache)
+    assert len(responses.calls) == 1
+    assert first == second
+    assert first[0].voter_id == "456"
+    assert cache.hits == 1
+
+
+@responses.activate
+def test_ga_lookup_voter_negative_cache():
+    responses.add(
+        responses.POST, ga.QUERY_ENDPOINT, body="<html>no match</html>", status=200
+    )
+    clock = FakeClock()
+    cache = LookupCache(MemoryCacheBackend(clock=clock), miss_ttl=60)
+    dob = datetime.date(1980, 1, 1)
+    assert ga.lookup_voter("Sally", "Peach", dob, "Fulton", cache=cache) is None
+    assert ga.lookup_voter("Sally", "Peach", dob, "Fulton", cache=cache) is None
+    assert len(responses.calls) == 1
+    clock.now += 61
+    assert ga.lookup_voter("Sally", "Peach", dob, "Fulton", cache=cache) is None
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_ga_lookup_voter_http_error_not_cached():
+    responses.add(responses.POST, ga.QUERY_ENDPOINT, body="slow down", status=429)
+    cache = LookupCache()
+    dob = datetime.date(1980, 1, 1)
+    assert ga.lookup_voter("Sally", "Peach", dob, "Fulton", cache=cache) is None
+    assert ga.lookup_voter("Sally", "Peach", dob, "Fulton", cache=cache) is None
+    assert len(responses.calls) == 2
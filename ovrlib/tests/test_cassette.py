@@ -0,0 +1,184 @@
+import datetime
+import gzip
+import json
+import time
+
+import pytest  # type: ignore
+import requests
+import responses  # type: ignore
+
+from .. import wi
+from ..cassette import (
+    Cassette,
+    ReplayAdapter,
+    recording,
+    redact_pii,
+    redact_url,
+    replaying,
+)
+from ..exceptions import CassetteMissError
+from ..pa import STAGING_URL, PAMunicipality, PAOVRRequest, PAOVRSession
+
+OK = (
+    "<RESPONSE><APPLICATIONID>1</APPLICATIONID>"
+    "<APPLICATIONDATE>Oct 01 2020  9:00AM</APPLICATIONDATE>"
+    "<SIGNATURE>DL</SIGNATURE></RESPONSE>"
+)
+
+
+def make_request():
+    return PAOVRRequest(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+
+
+def test_redact_url():
+    assert (
+        redact_url(
+            "https://x/api?JSONv2&sysparm_AuthKey=secret&sysparm_action=GET%20IT",
+            {"sysparm_AuthKey"},
+        )
+        == "https://x/api?JSONv2&sysparm_AuthKey=REDACTED&sysparm_action=GET%20IT"
+    )
+
+
+def test_redact_pii():
+    wi_body = {
+        "Success": True,
+        "Data": {
+            "voters": {
+                "$values": [
+                    {
+                        "voterName": "Sally Badger",
+                        "dateOfBirth": "05/02/1944",
+                        "voterStatusName": "Active",
+                        "voterID": 123,
+                    }
+                ]
+            }
+        },
+    }
+    (voter,) = json.loads(redact_pii(json.dumps(wi_body).encode()))["Data"]["voters"][
+        "$values"
+    ]
+    assert voter == {
+        "voterName": "REDACTED",
+        "dateOfBirth": "REDACTED",
+        "voterStatusName": "Active",
+        "voterID": 0,
+    }
+
+    pa_body = json.dumps(
+        "<record><FirstName>Sally</FirstName><county>Clarion</county>"
+        "<drivers-license>99007069</drivers-license></record>"
+    ).encode()
+    assert json.loads(redact_pii(pa_body)) == (
+        "<record><FirstName>REDACTED</FirstName><county>Clarion</county>"
+        "<drivers-license>REDACTED</drivers-license></record>"
+    )
+    assert redact_pii(json.dumps(OK).encode()) == json.dumps(OK).encode()
+
+    ga_body = (
+        b'<span id="fullNameSpan">SALLY PEACH</span><span id="statuscontent">'
+        b'Active</span><input type="hidden" name="idVoter" id="idVoter" '
+        b'value="1234567"/>'
+    )
+    assert redact_pii(ga_body) == (
+        b'<span id="fullNameSpan">REDACTED</span><span id="statuscontent">'
+        b'Active</span><input type="hidden" name="idVoter" id="idVoter" '
+        b'value="0"/>'
+    )
+
+
+def test_record_replay(tmp_path):
+    path = str(tmp_path / "flow.cassette")
+    with responses.RequestsMock() as mock:
+        mock.add(responses.POST, STAGING_URL, json=OK)
+        mock.add(
+            responses.POST,
+            wi.SEARCH_ENDPOINT,
+            json={"Success": False, "Data": {"voterName": "Sally Penndot"}},
+        )
+        with recording(path) as http:
+            session = PAOVRSession("secret-key", staging=True, http_session=http)
+            recorded = session.register(make_request())
+            wi.lookup_voter(
+                "Sally", "Penndot", datetime.date(1944, 5, 2), http_session=http
+            )
+
+    with gzip.open(path, "rt") as f:
+        saved = f.read()
+    assert "secret-key" not in saved
+    # request bodies aren't stored, and voter details in responses are redacted
+    assert "Penndot" not in saved
+
+    # no mocks active: nothing may reach the network
+    http = replaying(path)
+    session = PAOVRSession("other-key", staging=True, http_session=http)
+    assert session.register(make_request()) == recorded
+    assert (
+        wi.lookup_voter(
+            "Sally", "Penndot", datetime.date(1944, 5, 2), http_session=http
+        )
+        is None
+    )
+    with pytest.raises(CassetteMissError):
+        session.register(make_request())
+
+
+def test_replay_latency():
+    cassette = Cassette(
+        [
+            {
+                "method": "GET",
+                "url": "https://example.com/",
+                "body": None,
+                "status": 200,
+                "reason": "OK",
+                "headers": {"Content-Type": "text/plain; charset=utf-8"},
+                "content": "aGk=",
+                "elapsed": 0.05,
+            }
+        ]
+    )
+    http = requests.Session()
+    adapter = ReplayAdapter(cassette, latency="recorded")
+    http.mount("https://", adapter)
+    start = time.monotonic()
+    response = http.get("https://example.com/")
+    assert time.monotonic() - start >= 0.05
+    assert response.text == "hi"
+    assert adapter.remaining() == 0
+
+
+def test_replay_streamed(tmp_path):
+    path = str(tmp_path / "municipalities.cassette")
+    body = (
+        "<OVRLookupData>"
+        + (
+            "<Municipality><MunicipalityID>MN101</MunicipalityID>"
+            "<MunicipalityIDname>Aleppo</MunicipalityIDname></Municipality>"
+        )
+        * 50
+        + "</OVRLookupData>"
+    )
+    with responses.RequestsMock() as mock:
+        mock.add(responses.GET, STAGING_URL, json=body)
+        with recording(path) as http:
+            session = PAOVRSession("secret-key", staging=True, http_session=http)
+            recorded = list(session.iter_municipalities("allegheny"))
+
+    session = PAOVRSession("other-key", staging=True, http_session=replaying(path))
+    assert list(session.iter_municipalities("allegheny")) == recorded
+    assert recorded[0] == PAMunicipality("MN101", "ALEPPO") and len(recorded) == 50
@@ -0,0 +1,107 @@
+import datetime
+import json
+
+import pytest  # type: ignore
+import responses  # type: ignore
+
+from .. import wi
+from ..cli import main
+from ..pa import STAGING_URL, PAOVRRequest
+from ..pa_places import PAPlaceIndex
+
+OK = (
+    "<RESPONSE><APPLICATIONID>1</APPLICATIONID>"
+    "<APPLICATIONDATE>Oct 01 2020  9:00AM</APPLICATIONDATE>"
+    "<SIGNATURE>DL</SIGNATURE></RESPONSE>"
+)
+
+
+def make_request(first_name):
+    return PAOVRRequest(
+        first_name=first_name,
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+
+
+@responses.activate
+def test_pa_submit_resumes(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("OVRLIB_PA_API_KEY", "abc")
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    responses.add(responses.GET, STAGING_URL, json="<OVRLookupData></OVRLookupData>")
+    path = tmp_path / "registrations.jsonl"
+    lines = [json.dumps(make_request(n).to_dict()) for n in ("Sally", "Sam")]
+    lines.insert(1, "")
+    path.write_text("\n".join(lines) + "\n")
+
+    assert main(["pa", "submit", str(path), "--concurrency", "2"]) == 0
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(r["line"], r["state"]) for r in results] == [(1, "done"), (3, "done")]
+    assert results[0]["response"]["application_id"] == "1"
+    posts = [c for c in responses.calls if c.request.method == "POST"]
+    assert len(posts) == 2
+
+    # a line added later is all that's sent when run again
+    path.write_text("\n".join(lines + [json.dumps(make_request("Sue").to_dict())]))
+    assert main(["pa", "submit", str(path)]) == 0
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r["line"] for r in results] == [1, 3, 4]
+    posts = [c for c in responses.calls if c.request.method == "POST"]
+    assert len(posts) == 3
+    assert "Sue" in posts[-1].request.body
+
+
+@responses.activate
+def test_pa_submit_fills_places(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("OVRLIB_PA_API_KEY", "abc")
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    responses.add(responses.GET, STAGING_URL, json="<OVRLookupData></OVRLookupData>")
+    places = PAPlaceIndex()
+    places.add_municipality("CLARION", "MN701", "CLARION BOROUGH")
+    places.add_zip("16214", "CLARION")
+    places.save(str(tmp_path / "pa-places.json.gz"))
+    request = make_request("Sally")
+    request.county = ""
+    request.city = "Clarion Boro"
+    path = tmp_path / "registrations.jsonl"
+    path.write_text(json.dumps(request.to_dict()) + "\n")
+
+    args = ["pa", "submit", str(path), "--places", str(tmp_path / "pa-places.json.gz")]
+    assert main(args) == 0
+    body = [c for c in responses.calls if c.request.method == "POST"][0].request.body
+    assert "<county>CLARION</county>" in body
+    assert "<municipality>CLARION BOROUGH</municipality>" in body
+
+
+@responses.activate
+def test_wi_lookup(tmp_path, capsys):
+    responses.add(responses.POST, wi.SEARCH_ENDPOINT, json={"Success": False})
+    path = tmp_path / "voters.csv"
+    path.write_text(
+        "first_name,last_name,date_of_birth\n"
+        "Sally,Badger,1944-05-02\n"
+        "Sam,Badger,05/02/1944\n"
+    )
+
+    assert main(["wi", "lookup", str(path)]) == 1
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert results[0] == {"row": 1, "found": False, "result": None}
+    assert results[1]["row"] == 2 and "ValueError" in results[1]["error"]
+    assert len(responses.calls) == 1
+
+
+def test_bench_list(tmp_path, capsys):
+    assert main(["bench"]) == 0
+    assert "pa_batch" in capsys.readouterr().out.split()
+
+    with pytest.raises(SystemExit, match="no benchmarks directory"):
+        main(["bench", "--dir", str(tmp_path / "missing")])
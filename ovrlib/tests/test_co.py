@@ -0,0 +1,100 @@
+import os
+import zipfile
+
+from ..co import DirectorySource, FTPSource, VRDIngester, iter_report_chunks
+
+HEADER = ["VOTER_ID", "FIRST_NAME", "LAST_NAME", "YOB", "CAMPAIGN"]
+
+
+def make_rows(start, count):
+    return [
+        [str(1000 + i), f"First{i}", f"Last{i}", str(1950 + i % 50), f"c{i % 3}"]
+        for i in range(start, start + count)
+    ]
+
+
+def write_report(directory, rows, zipped=True):
+    text = "\r\n".join("\t".join(r) for r in [HEADER] + rows) + "\r\n"
+    if zipped:
+        path = os.path.join(directory, "VRD_REPORT.zip")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr("VRD_REPORT.txt", text)
+    else:
+        path = os.path.join(directory, "VRD_REPORT.txt")
+        with open(path, "w", newline="") as f:
+            f.write(text)
+    return path
+
+
+def test_iter_report_chunks(tmp_path):
+    path = write_report(str(tmp_path), make_rows(0, 25))
+    chunks = list(iter_report_chunks(path, chunk_size=10))
+    assert [len(rows) for _, rows in chunks] == [10, 10, 5]
+    assert all(header == HEADER for header, _ in chunks)
+    assert chunks[0][1][0] == ["1000", "First0", "Last0", "1950", "c0"]
+
+
+def test_incremental_ingest(tmp_path):
+    report_dir = str(tmp_path / "ftp")
+    os.makedirs(report_dir)
+    store_dir = str(tmp_path / "store")
+
+    write_report(report_dir, make_rows(0, 25))
+    result = VRDIngester(store_dir, chunk_size=10).ingest(DirectorySource(report_dir))
+    assert (result.rows_read, result.rows_new) == (25, 25)
+    assert len(result.segments_written) == 3
+
+    # the next day's file has grown; a fresh ingester only loads the new rows
+    write_report(report_dir, make_rows(0, 32) + make_rows(3, 1))
+    ingester = VRDIngester(store_dir, chunk_size=10)
+    result = ingester.ingest(DirectorySource(report_dir))
+    assert (result.rows_read, result.rows_new) == (33, 7)
+
+    assert len(ingester.store) == 32
+    assert list(ingester.store.read_column("VOTER_ID")) == [
+        str(1000 + i) for i in range(32)
+    ]
+    rows = list(ingester.store.iter_rows())
+    assert rows[31] == {
+        "VOTER_ID": "1031",
+        "FIRST_NAME": "First31",
+        "LAST_NAME": "Last31",
+        "YOB": "1981",
+        "CAMPAIGN": "c1",
+    }
+
+
+def test_plain_text_report(tmp_path):
+    write_report(str(tmp_path), make_rows(0, 3), zipped=False)
+    ingester = VRDIngester(str(tmp_path / "store"))
+    assert ingester.ingest(DirectorySource(str(tmp_path))).rows_new == 3
+
+
+class FakeFTP:
+    def __init__(self, files):
+        self.files = files
+        self.logged_in = False
+        self.closed = False
+
+    def login(self, user, password):
+        assert (user, password) == ("vrd", "secret")
+        self.logged_in = True
+
+    def retrbinary(self, cmd, callback):
+        assert self.logged_in
+        data = self.files[cmd.split(" ", 1)[1]]
+        for i in range(0, len(data), 1024):
+            callback(data[i : i + 1024])
+
+    def quit(self):
+        self.closed = True
+
+
+def test_ftp_source(tmp_path):
+    path = write_report(str(tmp_path), make_rows(0, 50))
+    with open(path, "rb") as f:
+        ftp = FakeFTP({"VRD_REPORT.zip": f.read()})
+    source = FTPSource("localhost", "vrd", "secret", ftp_factory=lambda: ftp)
+    result = VRDIngester(str(tmp_path / "store")).ingest(source)
+    assert result.rows_new == 50
+    assert ftp.closed
@@ -0,0 +1,132 @@
+import itertools
+import threading
+import time
+
+import responses  # type: ignore
+
+from ..hedge import HedgePolicy
+from ..pa import STAGING_URL, PAOVRSession
+
+
+def warm(policy, key, seconds=0.01, count=20):
+    for _ in range(count):
+        policy.record(key, seconds)
+
+
+def test_no_hedge_without_history():
+    policy = HedgePolicy(min_samples=5, max_hedge_rate=1.0)
+    calls = []
+    assert policy.run("A", lambda: calls.append(1) or "ok") == "ok"
+    assert policy.delay("A") is None
+    assert policy.hedged == 0 and len(calls) == 1
+
+
+def test_hedge_wins_over_slow_primary():
+    policy = HedgePolicy(percentile=90, max_hedge_rate=1.0)
+    warm(policy, "A")
+    assert policy.delay("A") == 0.01
+    counter = itertools.count()
+
+    def fn():
+        n = next(counter)
+        if n == 0:
+            time.sleep(1.0)
+            return "slow"
+        return "fast"
+
+    start = time.monotonic()
+    assert policy.run("A", fn) == "fast"
+    assert time.monotonic() - start < 0.5
+    assert policy.hedged == 1 and policy.hedge_wins == 1
+
+
+def test_hedge_falls_back_to_primary_on_error():
+    policy = HedgePolicy(max_hedge_rate=1.0)
+    warm(policy, "A")
+    counter = itertools.count()
+
+    def fn():
+        if next(counter) == 0:
+            time.sleep(0.1)
+            return "primary"
+        raise ConnectionError()
+
+    assert policy.run("A", fn) == "primary"
+    assert policy.hedged == 1 and policy.hedge_wins == 0
+
+
+def test_hedge_needs_an_accepted_result():
+    policy = HedgePolicy(max_hedge_rate=1.0)
+    warm(policy, "A")
+    counter = itertools.count()
+    discarded = []
+
+    def fn():
+        if next(counter) == 0:
+            time.sleep(0.1)
+            return 200
+        return 503
+
+    # a fast 503 doesn't beat a slower 200
+    assert (
+        policy.run("A", fn, accept=lambda r: r < 500, discard=discarded.append) == 200
+    )
+    assert discarded == [503]
+    assert policy.hedge_wins == 0
+
+
+def test_hedge_loser_is_discarded():
+    policy = HedgePolicy(max_hedge_rate=1.0)
+    warm(policy, "A")
+    counter = itertools.count()
+    discarded = threading.Event()
+
+    def fn():
+        if next(counter) == 0:
+            time.sleep(0.2)
+            return "slow"
+        return "fast"
+
+    assert policy.run("A", fn, discard=lambda r: discarded.set()) == "fast"
+    assert not discarded.is_set()
+    # once the primary finishes
+    assert discarded.wait(2)
+
+
+def test_hedge_rate_cap():
+    policy = HedgePolicy(percentile=50, max_hedge_rate=0.25, window=100)
+    warm(policy, "A", seconds=0.001, count=100)
+    for _ in range(8):
+        policy.run("A", lambda: time.sleep(0.02))
+    # 8 requests at 0.25 tokens each
+    assert policy.requests == 8
+    assert policy.hedged == 2
+
+
+@responses.activate
+def test_session_hedges_read_only_only():
+    policy = HedgePolicy(max_hedge_rate=1.0)
+    warm(policy, "GETERRORVALUES", seconds=0.001)
+    warm(policy, "SETAPPLICATION", seconds=0.001)
+    lock = threading.Lock()
+    seen = []
+
+    def callback(request):
+        with lock:
+            seen.append(request.method)
+            first = len(seen) == 1
+        if first:
+            time.sleep(0.3)
+        return (200, {}, '"<OVRLookupData />"')
+
+    responses.add_callback(responses.GET, STAGING_URL, callback=callback)
+    responses.add_callback(responses.POST, STAGING_URL, callback=callback)
+    session = PAOVRSession("abc", staging=True, coalesce=False, hedge=policy)
+
+    session.do_request_unparsed("GETERRORVALUES")
+    assert policy.hedged == 1
+
+    seen.clear()
+    session.do_request_unparsed("SETAPPLICATION", data="{}")
+    assert seen == ["POST"]
+    assert policy.hedged == 1
@@ -0,0 +1,174 @@
+import datetime
+
+import pytest  # type: ignore
+import requests
+import responses  # type: ignore
+import urllib3
+
+from ..exceptions import (
+    InvalidDLError,
+    InvalidRegistrationError,
+    ServerError,
+    SubmissionInDoubtError,
+)
+from ..idempotency import IdempotencyStore, body_key, is_in_doubt
+from ..pa import STAGING_URL, PAOVRRequest, PAOVRSession
+
+OK = (
+    "<RESPONSE><APPLICATIONID>1</APPLICATIONID>"
+    "<APPLICATIONDATE>Oct 01 2020  9:00AM</APPLICATIONDATE>"
+    "<SIGNATURE>DL</SIGNATURE></RESPONSE>"
+)
+
+
+def make_request():
+    return PAOVRRequest(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+
+
+@pytest.fixture
+def session(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.db"))
+    return PAOVRSession("key", staging=True, idempotency=store)
+
+
+@responses.activate
+def test_resubmit_returns_stored_response(session):
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    first = session.register(make_request())
+    again = session.register(make_request())
+    assert again == first
+    assert again.application_id == "1"
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_rejected_can_be_resent(session):
+    responses.add(
+        responses.POST,
+        STAGING_URL,
+        json="<RESPONSE><ERROR>VR_WAPI_InvalidOVRDL</ERROR></RESPONSE>",
+    )
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    with pytest.raises(InvalidDLError):
+        session.register(make_request())
+    assert session.register(make_request()).application_id == "1"
+
+
+@responses.activate
+def test_in_doubt(session):
+    responses.add(responses.POST, STAGING_URL, body=requests.exceptions.ReadTimeout())
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    request = make_request()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        session.register(request)
+    with pytest.raises(SubmissionInDoubtError):
+        session.register(request)
+    assert len(responses.calls) == 1
+
+    store = session.idempotency
+    (submission,) = store.in_doubt()
+    assert submission.request == request
+    assert "ReadTimeout" in submission.error
+
+    # the state has no record of it: allow another try
+    store.resolve(submission.key)
+    assert session.register(request).application_id == "1"
+    assert store.in_doubt() == []
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        # accepted, but the response doesn't parse
+        "<RESPONSE><APPLICATIONID>1</APPLICATIONID>",
+        "<RESPONSE><APPLICATIONID>1</APPLICATIONID>"
+        "<APPLICATIONDATE>yesterday</APPLICATIONDATE></RESPONSE>",
+        "<RESPONSE></RESPONSE>",
+    ],
+)
+@responses.activate
+def test_unparseable_200_is_in_doubt(session, body):
+    responses.add(responses.POST, STAGING_URL, json=body)
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    request = make_request()
+    with pytest.raises(Exception):
+        session.register(request)
+    with pytest.raises(SubmissionInDoubtError):
+        session.register(request)
+    assert len(responses.calls) == 1
+    assert [s.request for s in session.idempotency.in_doubt()] == [request]
+
+
+@responses.activate
+def test_4xx_can_be_resent(session):
+    responses.add(responses.POST, STAGING_URL, status=400)
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    with pytest.raises(InvalidRegistrationError):
+        session.register(make_request())
+    assert session.register(make_request()).application_id == "1"
+
+
+def refused():
+    return requests.exceptions.ConnectionError(
+        urllib3.exceptions.MaxRetryError(
+            None,
+            "/",
+            urllib3.exceptions.NewConnectionError(
+                None, "[Errno 111] Connection refused"
+            ),
+        )
+    )
+
+
+def test_not_sent():
+    assert not is_in_doubt(refused())
+    assert not is_in_doubt(requests.exceptions.ConnectTimeout())
+    reset = requests.exceptions.ConnectionError(
+        urllib3.exceptions.ProtocolError("Connection aborted.", ConnectionResetError())
+    )
+    assert is_in_doubt(reset)
+    assert is_in_doubt(requests.exceptions.ReadTimeout())
+
+
+@responses.activate
+def test_refused_can_be_resent(session):
+    responses.add(responses.POST, STAGING_URL, body=refused())
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.register(make_request())
+    assert session.register(make_request()).application_id == "1"
+    assert session.idempotency.in_doubt() == []
+
+
+def test_interrupted_submission(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.db"))
+    request = make_request()
+    key = body_key(request.to_request_body())
+    assert store.begin(key, request) is None
+    # e.g. the process died before recording the outcome
+    with pytest.raises(SubmissionInDoubtError):
+        store.begin(key, request)
+    assert store.in_doubt() == []
+    assert [s.key for s in store.in_doubt(include_in_flight_before=1e12)] == [key]
+
+    def fail():
+        raise ServerError("HTTP status code 503")
+
+    other = make_request()
+    other.first_name = "Bob"
+    with pytest.raises(ServerError):
+        store.run("other", other, fail)
+    assert store.get("other").state == "in_doubt"
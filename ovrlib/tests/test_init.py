@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+
+def run(code):
+    return subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def test_import_is_lazy():
+    out = run(
+        "import sys, ovrlib.wi; "
+        "print('ovrlib.pa' in sys.modules, 'lxml.etree' in sys.modules, "
+        "'requests' in sys.modules)"
+    )
+    assert out == "False False False"
+
+
+def test_reexports():
+    out = run(
+        "import sys, ovrlib; from ovrlib import PAOVRSession; "
+        "print(PAOVRSession is ovrlib.pa.PAOVRSession, 'lxml.etree' in sys.modules)"
+    )
+    assert out == "True True"
+    assert run("import ovrlib; print(ovrlib.ga.COUNTIES['FULTON'])") == "060"
@@ -0,0 +1,112 @@
+import datetime
+import threading
+
+import pytest  # type: ignore
+import responses  # type: ignore
+
+from ..exceptions import InvalidRegistrationError, ServerError
+from ..limiter import AIMDLimiter
+from ..pa import STAGING_URL, PAOVRRequest, PAOVRSession
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_additive_increase():
+    limiter = AIMDLimiter(initial=2, max_limit=4, clock=Clock())
+    for _ in range(20):
+        s1 = limiter.acquire()
+        s2 = limiter.acquire()
+        limiter.release(s1)
+        limiter.release(s2)
+    assert limiter.limit == 4
+    assert limiter.stats() == {
+        "limit": 4,
+        "in_flight": 0,
+        "successes": 40,
+        "drops": 0,
+    }
+
+
+def test_unused_limit_does_not_grow():
+    limiter = AIMDLimiter(initial=8, clock=Clock())
+    for _ in range(100):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 8
+
+
+def test_multiplicative_decrease_once_per_period():
+    clock = Clock()
+    limiter = AIMDLimiter(initial=16, clock=clock)
+    clock.now = 1.0
+    started = [limiter.acquire() for _ in range(4)]
+    clock.now = 2.0
+    for s in started:
+        limiter.release(s, dropped=True)
+    # all four started before the first decrease
+    assert limiter.limit == 8
+    assert limiter.drops == 4
+
+    clock.now = 3.0
+    limiter.release(limiter.acquire(), dropped=True)
+    assert limiter.limit == 4
+
+
+def test_latency_threshold():
+    clock = Clock()
+    limiter = AIMDLimiter(initial=4, latency_threshold=1.0, clock=clock)
+    clock.now = 1.0
+    s = limiter.acquire()
+    clock.now = 3.0
+    limiter.release(s)
+    assert limiter.limit == 2
+
+
+def test_blocks_at_limit():
+    limiter = AIMDLimiter(initial=1, max_limit=1)
+    s = limiter.acquire()
+    assert limiter.acquire(timeout=0.05) is None
+    threading.Timer(0.05, limiter.release, args=(s,)).start()
+    assert limiter.acquire(timeout=5) is not None
+
+
+def test_slot_classifies_errors():
+    limiter = AIMDLimiter(initial=8)
+    with pytest.raises(ServerError):
+        with limiter.slot():
+            raise ServerError("HTTP status code 503")
+    assert limiter.limit == 4
+    with pytest.raises(InvalidRegistrationError):
+        with limiter.slot():
+            raise InvalidRegistrationError("VR_WAPI_InvalidOVRDL")
+    assert limiter.limit == 4 and limiter.drops == 1
+
+
+@responses.activate
+def test_register_with_limiter():
+    responses.add(responses.POST, STAGING_URL, status=503)
+    limiter = AIMDLimiter(initial=8)
+    session = PAOVRSession("abc", staging=True, limiter=limiter)
+    reg = PAOVRRequest(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+    with pytest.raises(ServerError):
+        session.register(reg)
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
@@ -0,0 +1,86 @@
+import datetime
+from typing import List
+
+import responses  # type: ignore
+
+from ..memprofile import OTHER, RESULT, MemoryProfiler
+from ..pa import STAGING_URL, PAOVRRequest, PAOVRSession
+
+OK = (
+    "<RESPONSE><APPLICATIONID>1</APPLICATIONID>"
+    "<APPLICATIONDATE>Oct 01 2020  9:00AM</APPLICATIONDATE>"
+    "<SIGNATURE>DL</SIGNATURE></RESPONSE>"
+)
+
+kept: List[bytearray] = []
+
+
+def grow(n):
+    kept.append(bytearray(n))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@responses.activate
+def test_session_snapshots_by_phase():
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    clock = Clock()
+    profiler = MemoryProfiler(interval=10, clock=clock)
+    session = PAOVRSession("abc", staging=True, profiler=profiler)
+    request = PAOVRRequest(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+
+    # not started: nothing traced
+    session.register(request)
+    assert not profiler.snapshots
+
+    results = []
+    with profiler:
+        results.append(session.register(request))
+        assert not profiler.snapshots
+        clock.now = 10
+        results.append(session.register(request))
+        assert len(profiler.snapshots) == 1
+    assert len(profiler.snapshots) == 2
+
+    # the responses we kept were allocated parsing the result
+    snapshot = profiler.snapshots[-1]
+    assert snapshot.phases[RESULT] > 0
+    assert any("pa.py" in site for site, _ in snapshot.top[RESULT])
+    assert "result:" in profiler.report()
+
+
+def test_leaks():
+    profiler = MemoryProfiler(
+        phases={"grow": [f"{__name__}:grow"]},
+        leak_snapshots=3,
+        leak_min_growth=50000,
+    )
+    assert not MemoryProfiler(sample_rate=0).start()
+    with profiler:
+        for _ in range(3):
+            grow(60000)
+            profiler.snapshot()
+            assert profiler.snapshots[-1].phases["grow"] >= len(kept) * 60000
+    assert profiler.leaks() == ["grow"]
+    assert OTHER in profiler.snapshots[-1].phases
+    assert "possible leaks: grow" in profiler.report()
+    kept.clear()
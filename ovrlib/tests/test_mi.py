@@ -0,0 +1,237 @@
+import datetime
+import itertools
+import json
+import re
+import threading
+
+import pytest  # type: ignore
+import responses  # type: ignore
+
+from ..exceptions import InvalidRegistrationError, MIValidationError, ServerError
+from ..mi import (
+    BATCH_PATH,
+    BATCH_STATUS_PATH,
+    DEFAULT_TIMEOUT,
+    HEALTH_CHECK_PATH,
+    REGISTER_PATH,
+    STREET_MATCH_PATH,
+    MIOVRRequest,
+    MIOVRSession,
+)
+
+BASE_URL = "https://mi.example.com/OnlineVoterAPI/"
+
+
+class StandIn:
+    """
+    Just enough of the state's API: SSNFour must be 4 digits
+    """
+
+    def __init__(self, mock):
+        self.batch_ids = itertools.count(1)
+        self.batches = {}
+        self.lock = threading.Lock()
+        mock.add_callback(responses.POST, BASE_URL + REGISTER_PATH, self.register)
+        mock.add_callback(responses.POST, BASE_URL + BATCH_PATH, self.batch)
+        mock.add_callback(responses.GET, BASE_URL + BATCH_STATUS_PATH, self.status)
+
+    def check(self, voter):
+        if not re.match(r"^[0-9]{4}$", voter.get("SSNFour", "")):
+            return ["SSNFour is invalid"]
+        return []
+
+    def register(self, request):
+        messages = self.check(json.loads(request.body)["Voter"])
+        return (
+            200,
+            {},
+            json.dumps(
+                {
+                    "IsValid": not messages,
+                    "VoterStatusId": 3.0,
+                    "VoterStatusDescription": "Pending",
+                    "VoterErrors": {
+                        "IsValid": not messages,
+                        "ValidationMessage": messages,
+                    },
+                    "HasError": False,
+                }
+            ),
+        )
+
+    def batch(self, request):
+        voters = json.loads(request.body)["BatchVoters"]
+        with self.lock:
+            batch_id = next(self.batch_ids)
+            self.batches[batch_id] = [v["SenderRecordId"] for v in voters]
+        errors = []
+        for v in voters:
+            messages = self.check(v)
+            errors.append(
+                {
+                    "SenderRecordId": v["SenderRecordId"],
+                    "IsValid": not messages,
+                    "ValidationMessage": messages,
+                }
+            )
+        return (
+            200,
+            {},
+            json.dumps(
+                {
+                    "BatchId": float(batch_id),
+                    "BatchStatusId": 1.0,
+                    "IsValid": True,
+                    "VoterErrors": errors,
+                    "HasError": False,
+                }
+            ),
+        )
+
+    def status(self, request):
+        batch_id = int(json.loads(request.body)["BatchId"])
+        return (
+            200,
+            {},
+            json.dumps(
+                {
+                    "BatchId": batch_id,
+                    "BatchStatusId": 2.0,
+                    "StatusDescription": "Processed",
+                    "BatchVoters": [
+                        {
+                            "SenderRecordId": r,
+                            "RecordStatusId": 2.0,
+                            "RecordStatusDescription": "Accepted",
+                        }
+                        for r in self.batches[batch_id]
+                    ],
+                }
+            ),
+        )
+
+
+def make_request(record_id, ssn4="1234"):
+    return MIOVRRequest(
+        sender_record_id=record_id,
+        full_name="Sally Wolverine",
+        date_of_birth=datetime.date(1944, 5, 2),
+        dl_number="S123456789012",
+        ssn4=ssn4,
+        address1="123 A St",
+        city="Lansing",
+        zipcode="48933",
+        is_citizen=True,
+        is_eighteen=True,
+        is_thirty_day_resident=True,
+    )
+
+
+def test_to_dict():
+    d = make_request("1").to_dict()
+    assert d["SenderRecordId"] == "1"
+    assert d["IsCitizen"] == "Y"
+    assert (d["BirthMonth"], d["BirthDay"], d["BirthYear"]) == (5, 2, 1944)
+    assert "AddressLine2" not in d
+
+    with pytest.raises(InvalidRegistrationError):
+        MIOVRSession(BASE_URL, sender_name="Example; Org")
+
+
+def test_register():
+    with responses.RequestsMock(
+        assert_all_requests_are_fired=False
+    ) as mock, MIOVRSession(BASE_URL, "Example Org") as s:
+        StandIn(mock)
+        r = s.register(make_request("1"))
+        assert r.is_valid and r.voter_status_id == 3
+        with pytest.raises(MIValidationError, match="SSNFour"):
+            s.register(make_request("2", ssn4="12"))
+
+
+def test_timeout():
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as mock:
+        StandIn(mock)
+        MIOVRSession(BASE_URL, "Example Org").register(make_request("1"))
+        MIOVRSession(BASE_URL, "Example Org", timeout=5).register(make_request("2"))
+        timeouts = [c.request.req_kwargs["timeout"] for c in mock.calls]
+        assert timeouts == [DEFAULT_TIMEOUT, 5]
+
+
+def test_register_many():
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as mock:
+        stand_in = StandIn(mock)
+        s = MIOVRSession(BASE_URL, "Example Org")
+        requests = [make_request(str(i), "12" if i == 3 else "1234") for i in range(5)]
+        batches = list(s.register_many(requests, batch_size=2, concurrency=2))
+        assert len(batches) == 3
+        assert [b.errors for b in batches] == [{}, {"3": ["SSNFour is invalid"]}, {}]
+        assert sorted(stand_in.batches[b.batch_id] for b in batches) == [
+            ["0", "1"],
+            ["2", "3"],
+            ["4"],
+        ]
+
+        status = s.batch_status(batches[0].batch_id)
+        assert status.description == "Processed"
+        assert [r.sender_record_id for r in status.records] == stand_in.batches[
+            batches[0].batch_id
+        ]
+
+        with pytest.raises(InvalidRegistrationError, match="unique"):
+            s.register_batch([make_request("1"), make_request("1")])
+
+
+class FailingStandIn(StandIn):
+    def batch(self, request):
+        voters = json.loads(request.body)["BatchVoters"]
+        if any(v["SenderRecordId"] == "2" for v in voters):
+            return (503, {}, "")
+        return super().batch(request)
+
+
+def test_register_many_failure():
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as mock:
+        stand_in = FailingStandIn(mock)
+        s = MIOVRSession(BASE_URL, "Example Org")
+        requests = [make_request(str(i)) for i in range(9)]
+        batches = []
+        with pytest.raises(ServerError):
+            for b in s.register_many(requests, batch_size=2, concurrency=3):
+                batches.append(b)
+        # the batches in flight with the failed one are still reported; none
+        # is sent once it has failed
+        assert [stand_in.batches[b.batch_id] for b in batches] == [
+            ["0", "1"],
+            ["4", "5"],
+            ["6", "7"],
+        ]
+        assert len(stand_in.batches) == 3
+
+
+@responses.activate
+def test_errors_and_lookups():
+    responses.add(responses.GET, BASE_URL + HEALTH_CHECK_PATH, status=503)
+    responses.add(responses.POST, BASE_URL + REGISTER_PATH, status=502)
+    responses.add(
+        responses.GET,
+        BASE_URL + STREET_MATCH_PATH,
+        json={
+            "HasMatch": True,
+            "HasError": False,
+            "IsValid": True,
+            "MatchingStreets": [
+                {"HouseNumberLow": 1.0, "HouseNumberHigh": 199.0, "StreetName": "A"}
+            ],
+        },
+    )
+
+    s = MIOVRSession(BASE_URL.rstrip("/"), "Example Org")
+    assert not s.health_check()
+    with pytest.raises(ServerError):
+        s.register(make_request("1"))
+    streets = s.street_match("123 A St", "Lansing", "48933")
+    assert [(m.house_number_low, m.house_number_high) for m in streets] == [(1, 199)]
+    assert json.loads(responses.calls[-1].request.body)["ZipCode"] == "48933"
+    with pytest.raises(InvalidRegistrationError):
+        s.street_match("123 A St", "Lansing", "4893")
@@ -1,11 +1,20 @@
 import datetime
+import json
 
 import pytest  # type: ignore
 import responses  # type: ignore
 from responses import matchers
 
+from ..exceptions import (
+    InvalidAccessKeyError,
+    InvalidRegistrationError,
+    ReadOnlyAccessKeyError,
+)
+
 from ..pa import (
+    DEFAULT_TIMEOUT,
     STAGING_URL,
+    JSONStringDecoder,
     PAOVRElectionInfo,
     PAOVRRequest,
     PAOVRSession,
@@ -437,3 +446,202 @@ def test_get_counties():
             ],
         ),
     ]
+
+
+def test_register_prepare_body_unit():
+    reg = PAOVRRequest(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St apt 4",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        gender="Female",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+    out = reg.to_request_body()
+    assert "<streetaddress>123 A St</streetaddress>" in out
+    assert "<unittype>APT</unittype>    <unitnumber>4</unitnumber>" in out
+
+
+ELECTION_SETUP = (
+    "<NewDataSet>"
+    "<NextElection><NextElection>11/03/2020</NextElection></NextElection>"
+    "<NextVRDeadline><NextVRDeadline>10/19/2020</NextVRDeadline></NextVRDeadline>"
+    "<Text_OVRApplnDeclaration><Text>I declare</Text></Text_OVRApplnDeclaration>"
+    "<Text_OVRMailInApplnDeclaration><Text>I also declare</Text>"
+    "</Text_OVRMailInApplnDeclaration>"
+    "<Text_OVRMailInApplnComplDate><Text_OVRMailInApplnComplDate>10/27/2020"
+    "</Text_OVRMailInApplnComplDate></Text_OVRMailInApplnComplDate>"
+    "<Text_OVRMailInBallotRecvdDate><Text_OVRMailInBallotRecvdDate>11/03/2020"
+    "</Text_OVRMailInBallotRecvdDate></Text_OVRMailInBallotRecvdDate>"
+    "<Text_OVRMailInElectionName><ElectionName>2020 GENERAL ELECTION"
+    "</ElectionName></Text_OVRMailInElectionName>"
+    "<Text_OVRMailInApplnComplTime><Time>5:00 PM</Time>"
+    "</Text_OVRMailInApplnComplTime>"
+    "<Text_OVRMailInBallotRecvdTime><RecvdTime>8:00 PM</RecvdTime>"
+    "</Text_OVRMailInBallotRecvdTime>"
+    "</NewDataSet>"
+)
+
+
+def make_registration():
+    return PAOVRRequest(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+
+
+@responses.activate
+def test_warm_up_caches_key_capability():
+    responses.add(
+        responses.GET,
+        STAGING_URL,
+        match=[
+            matchers.query_param_matcher(
+                {"sysparm_action": "GETERRORVALUES"}, strict_match=False
+            )
+        ],
+        json="<OVRLookupData></OVRLookupData>",
+    )
+    responses.add(
+        responses.GET,
+        STAGING_URL,
+        match=[
+            matchers.query_param_matcher(
+                {"sysparm_action": "GETAPPLICATIONSETUP"}, strict_match=False
+            )
+        ],
+        json=ELECTION_SETUP,
+    )
+    responses.add(
+        responses.POST,
+        STAGING_URL,
+        json="<RESPONSE><ERROR>VR_WAPI_InvalidAccessKey</ERROR></RESPONSE>",
+    )
+
+    session = PAOVRSession("abc", staging=True)
+    info = session.warm_up()
+    assert info.next_vr_deadline == "10/19/2020"
+    assert session.election_info == info
+    assert session.http_session is not None
+    assert session.can_read and session.can_write is None
+    assert len(responses.calls) == 2
+
+    for _ in range(2):
+        with pytest.raises(ReadOnlyAccessKeyError):
+            session.register(make_registration())
+    # no GETERRORVALUES probe after either
+    assert [c.request.method for c in responses.calls[2:]] == ["POST", "POST"]
+    assert session.can_write is False
+
+
+@responses.activate
+def test_register_probes_key_once():
+    responses.add(
+        responses.POST,
+        STAGING_URL,
+        json="<RESPONSE><ERROR>VR_WAPI_InvalidAccessKey</ERROR></RESPONSE>",
+    )
+    responses.add(
+        responses.GET,
+        STAGING_URL,
+        json="<OVRLookupData>  <MessageText>    <ErrorCode>VR_WAPI_InvalidAccessKey</ErrorCode>    <ErrorText>Access Key is Invalid.</ErrorText>  </MessageText></OVRLookupData>",
+    )
+    session = PAOVRSession("abc", staging=True)
+    with pytest.raises(ReadOnlyAccessKeyError):
+        session.register(make_registration())
+    with pytest.raises(ReadOnlyAccessKeyError):
+        session.register(make_registration())
+    assert [c.request.method for c in responses.calls] == ["POST", "GET", "POST"]
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 7, 1000])
+def test_json_string_decoder(size):
+    value = 'a\\"b\\\\ \n\t<é>\u00e9 \U0001f600 ' * 3
+    encoded = " " + json.dumps(value) + "\n"
+    decoder = JSONStringDecoder()
+    decoded = "".join(
+        decoder.feed(encoded[i : i + size]) for i in range(0, len(encoded), size)
+    )
+    decoder.close()
+    assert decoded == value
+
+    decoder = JSONStringDecoder()
+    decoder.feed('"<unterminated')
+    with pytest.raises(ValueError):
+        decoder.close()
+
+
+@responses.activate
+def test_iter_records():
+    responses.add(
+        responses.GET,
+        STAGING_URL,
+        json="<OVRLookupData>"
+        + (
+            "<Municipality><MunicipalityID>MN101</MunicipalityID>"
+            "<MunicipalityIDname>Aleppo</MunicipalityIDname></Municipality>"
+        )
+        * 500
+        + "</OVRLookupData>",
+    )
+    responses.add(
+        responses.GET,
+        STAGING_URL,
+        json="<RESPONSE><ERROR>VR_WAPI_InvalidAccessKey</ERROR></RESPONSE>",
+    )
+
+    s = PAOVRSession(api_key="abc", staging=True)
+    municipalities = s.iter_municipalities("allegheny")
+    assert next(municipalities) == PAMunicipality("MN101", "ALEPPO")
+    assert len(list(municipalities)) == 499
+    assert "sysparm_County=ALLEGHENY" in responses.calls[0].request.url
+
+    with pytest.raises(InvalidAccessKeyError):
+        list(s.iter_records("GETMUNICIPALITIES", {"County": "ADAMS"}, chunk_size=16))
+
+
+@responses.activate
+def test_iter_records_root():
+    responses.add(
+        responses.GET,
+        STAGING_URL,
+        json="<RESPONSE><ERROR/></RESPONSE>",
+    )
+    responses.add(responses.GET, STAGING_URL, json="<NewDataSet></NewDataSet>")
+
+    s = PAOVRSession(api_key="abc", staging=True, coalesce=False)
+    # an empty ERROR isn't raised, but an error envelope isn't a result either
+    with pytest.raises(InvalidRegistrationError, match="expected OVRLookupData"):
+        list(s.iter_municipalities("adams"))
+    assert list(s.iter_records("GETAPPLICATIONSETUP")) == []
+    with pytest.raises(InvalidRegistrationError, match="got NewDataSet"):
+        list(s.iter_municipalities("adams"))
+
+
+@responses.activate
+def test_timeout():
+    responses.add(responses.GET, STAGING_URL, json="<NewDataSet></NewDataSet>")
+    responses.add(responses.POST, STAGING_URL, json="<RESPONSE></RESPONSE>")
+    s = PAOVRSession(api_key="abc", staging=True, timeout=5)
+    s.do_request_unparsed("GETAPPLICATIONSETUP")
+    list(s.iter_records("GETAPPLICATIONSETUP"))
+    s.do_request_unparsed("SETAPPLICATION", data="{}")
+    assert [c.request.req_kwargs["timeout"] for c in responses.calls] == [5, 5, 5]
+    assert PAOVRSession(api_key="abc", staging=True).timeout == DEFAULT_TIMEOUT
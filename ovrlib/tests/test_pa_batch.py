@@ -0,0 +1,161 @@
+import base64
+import copy
+import dataclasses
+import datetime
+import io
+
+import pytest  # type: ignore
+
+from ..exceptions import InvalidRegistrationError
+from ..pa import PAOVRRequest
+from ..pa_batch import PAOVRRequestBatch
+
+
+def make_request(**kwargs):
+    values = dict(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+    values.update(kwargs)
+    return PAOVRRequest(**values)
+
+
+REQUESTS = [
+    make_request(),
+    make_request(is_new=True, gender="female", federal_voter=True, suffix="XIV"),
+    make_request(address1="123 A St apt. 4", gender="F", party="Green"),
+    make_request(address2="#12", party="Pirate", email="sally@example.com"),
+    make_request(unit_type="APT", unit_number="9", address1="1 B Rd Apt 3"),
+    make_request(first_name="Zoë", last_name="O'Brien & <Sons>", city="a\r\nb"),
+    make_request(first_name="😀", middle_name="", phone="555-1212"),
+    make_request(previous_first_name="Sal", previous_last_name="Smith"),
+    make_request(previous_address="9 Old Rd", is_new=False, party="none"),
+    make_request(is_new=False, mailin_ballot_request=True, mailin_ballot_state="PA"),
+    make_request(
+        dl_number=None, ssn4="1234", signature=b"\x89PNG", signature_type="png"
+    ),
+    make_request(dl_number=None, signature=b"\xff\xd8", signature_type="jpeg"),
+]
+
+INVALID = [
+    make_request(first_name="", gender="x"),
+    make_request(gender="x", dl_number=None),
+    make_request(dl_number=None),
+    make_request(dl_number=None, signature=b"GIF8", signature_type="gif"),
+]
+
+
+def expected(requests):
+    r = []
+    for req in copy.deepcopy(requests):
+        try:
+            r.append(req.to_request_body())
+        except InvalidRegistrationError as e:
+            r.append(e)
+    return r
+
+
+def test_bodies_match_scalar():
+    batch = PAOVRRequestBatch.from_requests(copy.deepcopy(REQUESTS), chunk_size=5)
+    assert len(batch) == len(REQUESTS)
+    bodies = list(batch.iter_bodies())
+    assert [i for i, _ in bodies] == list(range(len(REQUESTS)))
+    assert [b for _, b in bodies] == expected(REQUESTS)
+
+
+def test_normalizes_address_units():
+    batch = PAOVRRequestBatch.from_requests(REQUESTS[:5])
+    list(batch.iter_bodies())
+    assert batch.column("address1")[2] == "123 A St"
+    assert batch.column("unit_type")[2:5] == ["APT", "UNIT", "APT"]
+    assert batch.column("unit_number")[2:5] == ["4", "12", "9"]
+    assert batch.row(3).address2 is None
+
+
+def test_invalid_rows():
+    requests = REQUESTS[:2] + INVALID
+    want = expected(requests)
+
+    batch = PAOVRRequestBatch.from_requests(copy.deepcopy(requests))
+    bodies = dict(batch.iter_bodies(skip_invalid=True))
+    assert sorted(bodies) == [0, 1]
+    assert [bodies[0], bodies[1]] == want[:2]
+    assert {i: str(e) for i, e in batch.errors.items()} == {
+        i: str(e) for i, e in enumerate(want) if isinstance(e, Exception)
+    }
+    assert str(batch.errors[2]) == "registration field 'first_name' is required"
+
+    batch = PAOVRRequestBatch.from_requests(copy.deepcopy(requests))
+    with pytest.raises(InvalidRegistrationError):
+        list(batch.iter_bodies())
+    assert list(batch.validate()) == [2, 3, 4, 5]
+
+
+def test_control_characters_use_scalar_path():
+    batch = PAOVRRequestBatch.from_requests([make_request(first_name="a\x01b")])
+    with pytest.raises(ValueError):
+        list(batch.iter_bodies())
+
+
+def test_from_columns():
+    req = make_request()
+    columns = {
+        f.name: [getattr(req, f.name)] * 3
+        for f in dataclasses.fields(PAOVRRequest)
+        if getattr(req, f.name) is not None
+    }
+    columns["first_name"] = ["Ann", "Bob", "Cy"]
+    batch = PAOVRRequestBatch.from_columns(columns)
+    assert [b for _, b in batch.iter_bodies()] == expected(
+        [dataclasses.replace(req, first_name=n) for n in ["Ann", "Bob", "Cy"]]
+    )
+
+    with pytest.raises(ValueError):
+        PAOVRRequestBatch.from_columns({"first_name": ["a"], "last_name": []})
+    with pytest.raises(ValueError):
+        PAOVRRequestBatch.from_columns({"nickname": ["a"]})
+
+
+def test_from_csv():
+    sig = base64.b64encode(b"\x89PNG").decode()
+    f = io.StringIO(
+        "first_name,last_name,date_of_birth,address1,city,county,zipcode,party,"
+        "united_states_citizen,eighteen_on_election_day,declaration,is_new,"
+        "dl_number,signature,signature_type\n"
+        "Sally,Penndot,1944-05-02,123 A St,Clarion,Clarion,16214,Democrat,"
+        "1,true,yes,,99007069,,\n"
+        "Sam,Penndot,1950-01-31,5 B St #2,Clarion,Clarion,16214,Green,"
+        f"1,1,1,0,,{sig},png\n"
+    )
+    batch = PAOVRRequestBatch.from_csv(f)
+    assert batch.row(0) == make_request()
+    assert batch.row(1).signature == b"\x89PNG"
+    assert batch.row(1).is_new is False
+    assert [b for _, b in batch.iter_bodies()] == expected(
+        [
+            make_request(),
+            make_request(
+                first_name="Sam",
+                date_of_birth=datetime.date(1950, 1, 31),
+                address1="5 B St #2",
+                party="Green",
+                is_new=False,
+                dl_number=None,
+                signature=b"\x89PNG",
+                signature_type="png",
+            ),
+        ]
+    )
+
+    with pytest.raises(ValueError):
+        PAOVRRequestBatch.from_csv(io.StringIO("first_name,declaration\nA,maybe\n"))
@@ -0,0 +1,87 @@
+import datetime
+
+from ..pa import PAOVRRequest, PAOVRResponse
+from ..pa_dedup import DuplicateFinder, FingerprintStore, fingerprint
+
+
+def make_request(first="Sally", last="Penndot", **kwargs):
+    values = dict(
+        first_name=first,
+        last_name=last,
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 Main St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+    )
+    values.update(kwargs)
+    return PAOVRRequest(**values)
+
+
+def test_fingerprint():
+    assert fingerprint(make_request()) == fingerprint(
+        make_request(first=" sally", zipcode="16214-1234", address1="123  main st")
+    )
+    assert fingerprint(make_request()) != fingerprint(make_request(zipcode="16215"))
+    # the same voter asking for something else is an update
+    for update in [
+        {"address1": "9 Other Rd"},
+        {"party": "Republican"},
+        {"previous_last_name": "Smith"},
+        {"mailin_ballot_request": True},
+    ]:
+        assert fingerprint(make_request()) != fingerprint(make_request(**update))
+
+
+def test_find():
+    finder = DuplicateFinder()
+    dups = finder.find(
+        [
+            make_request(),
+            make_request(first="SALLY"),  # exact once normalized
+            make_request(address1="123 Mian St"),  # typo in the street
+            make_request(last="Pendot", zipcode="16214-0001"),
+            make_request(first="Bob"),
+            make_request(date_of_birth=datetime.date(1944, 2, 5)),  # day/month swapped
+            make_request(zipcode="19104", address1="1 Market St"),
+        ]
+    )
+    assert [(d.index, d.of) for d in dups] == [(1, 0), (2, 0), (3, 0), (5, 0)]
+    assert dups[0].score == 1.0
+    assert all(d.score >= finder.min_score for d in dups)
+    assert finder.stats == {"kept": 3, "exact": 1, "fuzzy": 3, "submitted": 0}
+
+
+def test_fingerprint_store(tmp_path):
+    path = str(tmp_path / "fp.db")
+    store = FingerprintStore(path)
+    response = PAOVRResponse("123", datetime.datetime(2020, 10, 1, 9), "DL")
+    store.add(make_request(), response)
+    store.close()
+
+    store = FingerprintStore(path)
+    assert len(store) == 1
+    assert make_request(first="SALLY") in store
+    assert make_request(first="Bob") not in store
+
+    finder = DuplicateFinder(store)
+    dup = finder.check(make_request())
+    assert dup is not None
+    assert dup.of is None and dup.application_id == "123"
+    assert finder.check(make_request(first="Bob")) is None
+
+
+def test_fingerprint_store_ttl(tmp_path):
+    now = [1000.0]
+    store = FingerprintStore(str(tmp_path / "fp.db"), ttl=60, clock=lambda: now[0])
+    response = PAOVRResponse("123", datetime.datetime(2020, 10, 1, 9), "DL")
+    store.add(make_request(), response)
+    now[0] += 60
+    assert make_request() in store
+    now[0] += 1
+    assert make_request() not in store
+    assert store.prune() == 1 and len(store) == 0
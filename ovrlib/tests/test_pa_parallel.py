@@ -0,0 +1,96 @@
+import copy
+import datetime
+import os
+
+import pytest  # type: ignore
+import responses  # type: ignore
+
+from ..exceptions import InvalidRegistrationError
+from ..idempotency import IdempotencyStore
+from ..pa import STAGING_URL, PAOVRRequest, PAOVRSession
+from ..pa_parallel import PAOVRBodyPool
+
+OK = (
+    "<RESPONSE><APPLICATIONID>1</APPLICATIONID>"
+    "<APPLICATIONDATE>Oct 01 2020  9:00AM</APPLICATIONDATE>"
+    "<SIGNATURE>DL</SIGNATURE></RESPONSE>"
+)
+
+
+def make_request(i, **kwargs):
+    values = dict(
+        first_name=f"Sally{i}",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St apt 4",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        signature=bytes([i % 256]) * (100 + i) if i % 3 else None,
+        signature_type="png",
+        dl_number=None if i % 3 else "99007069",
+    )
+    values.update(kwargs)
+    return PAOVRRequest(**values)
+
+
+def shm_names():
+    return set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with PAOVRBodyPool(processes=2, chunk_size=4, chunk_bytes=1000) as pool:
+        yield pool
+
+
+def test_map_in_order(pool):
+    requests = [make_request(i) for i in range(50)]
+    want = [copy.deepcopy(r).to_request_body() for r in requests]
+    before = shm_names()
+    assert list(pool.map(requests)) == want
+    assert shm_names() == before
+    # the caller's requests are left alone
+    assert requests[1].unit_type is None
+
+
+def test_map_errors(pool):
+    requests = [make_request(i) for i in range(10)]
+    requests[5] = make_request(5, signature_type="gif")
+    with pytest.raises(InvalidRegistrationError):
+        list(pool.map(requests))
+
+    r = list(pool.map(requests, return_exceptions=True))
+    assert len(r) == 10
+    assert isinstance(r[5], InvalidRegistrationError)
+    assert r[6] == copy.deepcopy(requests[6]).to_request_body()
+
+
+def test_map_stop_early(pool):
+    before = shm_names()
+    bodies = pool.map(make_request(i) for i in range(100))
+    next(bodies)
+    bodies.close()
+    assert shm_names() == before
+
+
+@responses.activate
+def test_register_pool_bodies(pool, tmp_path):
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    store = IdempotencyStore(str(tmp_path / "idem.db"))
+    session = PAOVRSession("key", staging=True, idempotency=store)
+    requests = [make_request(i) for i in range(3)]
+    bodies = list(pool.map(requests))
+    for request, body in zip(requests, bodies):
+        assert session.register_body(body, request).application_id == "1"
+    assert [c.request.body for c in responses.calls] == bodies
+
+    # recorded in the store like register(): not sent again
+    assert session.register_body(bodies[0], requests[0]).application_id == "1"
+    assert len(responses.calls) == 3
+    with pytest.raises(ValueError):
+        session.register_body(bodies[1])
@@ -0,0 +1,107 @@
+import datetime
+
+from ..pa import PACounty, PAMunicipality, PAOVRRequest
+from ..pa_places import PAPlaceIndex, normalize_place
+
+
+COUNTIES = [
+    PACounty(
+        "2291",
+        "ALLEGHENY",
+        [
+            PAMunicipality("MN101", "ALEPPO TOWNSHIP"),
+            PAMunicipality("MN102", "ASPINWALL BOROUGH"),
+        ],
+    ),
+    PACounty(
+        "2299",
+        "CLARION",
+        [
+            PAMunicipality("MN701", "CLARION BOROUGH"),
+            PAMunicipality("MN702", "CLARION TOWNSHIP"),
+            PAMunicipality("MN703", "MONROE TOWNSHIP"),
+        ],
+    ),
+]
+
+
+def make_index(tmp_path):
+    crosswalk = tmp_path / "zip_county.csv"
+    crosswalk.write_text(
+        "ZIP,COUNTY,USPS_ZIP_PREF_CITY,USPS_ZIP_PREF_STATE,RES_RATIO\n"
+        "16214,42031,CLARION,PA,1.0\n"
+        "15001,42007,ALIQUIPPA,PA,0.98\n"
+        "15001,42003,ALIQUIPPA,PA,0.02\n"
+        "16059,42019,VALENCIA,PA,0.6\n"
+        "16059,42003,VALENCIA,PA,0.4\n"
+        "21201,24510,BALTIMORE,MD,1.0\n"
+    )
+    index = PAPlaceIndex()
+    index.add_counties(COUNTIES)
+    assert index.add_hud_crosswalk(str(crosswalk)) == 5
+    return index
+
+
+def test_normalize_place():
+    assert normalize_place(" Mt. Joy Twp") == "MOUNT JOY TOWNSHIP"
+    assert normalize_place("O'Hara Boro") == "OHARA BOROUGH"
+
+
+def test_lookups(tmp_path):
+    index = make_index(tmp_path)
+    assert index.counties_for_zip("16214-1234") == ["CLARION"]
+    assert index.counties_for_zip("15001") == ["BEAVER", "ALLEGHENY"]
+    assert index.counties_for_zip("21201") == []
+    assert index.county_id("Allegheny County") == "2291"
+
+    assert index.municipality_id("Allegheny", "Aleppo Twp") == "MN101"
+    assert index.municipality_id("ALLEGHENY", "Aspinwal Borough") == "MN102"
+    assert index.municipality_id("CLARION", "Monroe") == "MN703"
+    # borough or township?
+    assert index.municipality_id("CLARION", "Clarion") is None
+    assert index.municipality_id("CLARION", "Aleppo Township") is None
+
+
+def test_refresh_loaded_index(tmp_path):
+    path = str(tmp_path / "pa-places.json.gz")
+    make_index(tmp_path).save(path)
+    index = PAPlaceIndex.load(path)
+    # refreshing from the API and the crosswalk again replaces, not adds
+    index.add_counties(COUNTIES)
+    index.add_hud_crosswalk(str(tmp_path / "zip_county.csv"))
+    assert index.to_dict() == make_index(tmp_path).to_dict()
+    assert index.municipality_id("ALLEGHENY", "Aspinwal Borough") == "MN102"
+    assert index.municipality_id("CLARION", "Monroe") == "MN703"
+
+
+def test_fill_and_round_trip(tmp_path):
+    index = make_index(tmp_path)
+    path = str(tmp_path / "pa-places.json.gz")
+    index.save(path)
+    index = PAPlaceIndex.load(path)
+
+    request = PAOVRRequest(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion Boro",
+        county="",
+        zipcode="16214",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+    assert index.fill(request)
+    assert request.county == "CLARION"
+    assert request.municipality == "CLARION BOROUGH"
+    assert "<municipality>CLARION BOROUGH</municipality>" in request.to_request_body()
+
+    # no clear county for this ZIP
+    request.county = ""
+    request.municipality = None
+    request.zipcode = "16059"
+    assert not index.fill(request)
+    assert request.county == ""
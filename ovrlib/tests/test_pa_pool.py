@@ -0,0 +1,89 @@
+import datetime
+
+import pytest  # type: ignore
+import responses  # type: ignore
+from responses import matchers
+
+from ..exceptions import ReadOnlyAccessKeyError
+from ..limiter import AIMDLimiter
+from ..pa import PROD_URL, STAGING_URL, PAOVRRequest
+from ..pa_pool import PAOVRSessionPool
+
+OK = (
+    "<RESPONSE><APPLICATIONID>{}</APPLICATIONID>"
+    "<APPLICATIONDATE>Oct 01 2020  9:00AM</APPLICATIONDATE>"
+    "<SIGNATURE>DL</SIGNATURE></RESPONSE>"
+)
+
+
+def make_request():
+    return PAOVRRequest(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+    )
+
+
+def test_sessions_per_key():
+    pool = PAOVRSessionPool(make_limiter=AIMDLimiter, coalesce=False)
+    a = pool.add("a", staging=True)
+    b = pool.session("b", staging=False)
+    assert pool.session("a", True) is a
+    assert pool.session("a", False) is not a
+    assert sorted(pool.keys()) == [("a", False), ("a", True), ("b", False)]
+
+    # one connection pool for everyone; limits per key
+    assert a.http_session is b.http_session is pool.http_session
+    assert a.limiter is not None and b.limiter is not None
+    assert a.limiter is not b.limiter
+    assert not a.coalesce
+
+    c = pool.add("c", staging=True, limiter=None, coalesce=True)
+    assert c.limiter is None and c.coalesce
+
+
+@responses.activate
+def test_register_routes_by_key():
+    responses.add(
+        responses.POST,
+        PROD_URL,
+        json=OK.format("prod"),
+        match=[
+            matchers.query_param_matcher({"sysparm_AuthKey": "p"}, strict_match=False)
+        ],
+    )
+    responses.add(
+        responses.POST,
+        STAGING_URL,
+        json="<RESPONSE><ERROR>VR_WAPI_InvalidAccessKey</ERROR></RESPONSE>",
+    )
+    responses.add(responses.GET, STAGING_URL, json="<OVRLookupData></OVRLookupData>")
+
+    pool = PAOVRSessionPool()
+    assert pool.register("p", False, make_request()).application_id == "prod"
+    with pytest.raises(ReadOnlyAccessKeyError):
+        pool.register("read-only", True, make_request())
+
+
+@responses.activate
+def test_keys_share_no_cookies():
+    responses.add(
+        responses.POST,
+        STAGING_URL,
+        json=OK.format("1"),
+        headers={"Set-Cookie": "session=a-secret; Path=/"},
+    )
+    pool = PAOVRSessionPool()
+    pool.register("a", True, make_request())
+    pool.register("b", True, make_request())
+    assert len(pool.http_session.cookies) == 0
+    assert "Cookie" not in responses.calls[1].request.headers
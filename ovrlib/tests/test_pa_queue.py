@@ -0,0 +1,232 @@
+import datetime
+
+import requests
+import responses  # type: ignore
+
+from ..idempotency import IdempotencyStore
+from ..pa import STAGING_URL, PAOVRRequest, PAOVRSession
+from ..pa_queue import SubmissionQueue, SubmissionWorker
+
+OK = (
+    "<RESPONSE><APPLICATIONID>1</APPLICATIONID>"
+    "<APPLICATIONDATE>Oct 01 2020  9:00AM</APPLICATIONDATE>"
+    "<SIGNATURE>DL</SIGNATURE></RESPONSE>"
+)
+
+
+def make_request(name):
+    return PAOVRRequest(
+        first_name=name,
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+        signature=b"\x89PNG",
+        signature_type="png",
+    )
+
+
+def test_request_dict_round_trip():
+    r = make_request("a")
+    assert PAOVRRequest.from_dict(r.to_dict()) == r
+
+
+def test_enqueue_claim(tmp_path):
+    queue = SubmissionQueue(str(tmp_path / "q.db"))
+    ids = queue.enqueue_many([make_request("a"), make_request("b")])
+    assert queue.counts() == {
+        "pending": 2,
+        "running": 0,
+        "done": 0,
+        "failed": 0,
+        "in_doubt": 0,
+    }
+
+    job = queue.claim()
+    assert job is not None
+    assert job.id == ids[0]
+    assert job.request == make_request("a")
+    assert job.attempts == 1
+    assert queue.counts()["running"] == 1
+
+    # a second connection (e.g. the web tier) sees the same queue
+    other = SubmissionQueue(str(tmp_path / "q.db"))
+    assert len(other) == 1
+    assert other.recover() == 1
+    assert len(queue) == 2
+
+
+def test_lines(tmp_path):
+    queue = SubmissionQueue(str(tmp_path / "q.db"))
+    assert queue.last_line() is None
+    queue.enqueue_many([make_request("a"), make_request("b")], lines=[1, 3])
+    queue.enqueue(make_request("c"))
+    assert queue.last_line() == 3
+    assert [j.line for j in queue.jobs(page_size=2)] == [1, 3, None]
+
+
+@responses.activate
+def test_worker(tmp_path):
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    responses.add(
+        responses.POST,
+        STAGING_URL,
+        json="<RESPONSE><ERROR>VR_WAPI_InvalidOVRDL</ERROR></RESPONSE>",
+    )
+    queue = SubmissionQueue(str(tmp_path / "q.db"))
+    ok, bad = queue.enqueue_many([make_request("a"), make_request("b")])
+
+    worker = SubmissionWorker(queue, PAOVRSession("key", staging=True), concurrency=1)
+    worker.run(until_empty=True)
+
+    job = queue.get(ok)
+    assert job is not None and job.state == "done"
+    assert job.response is not None
+    assert job.response.application_id == "1"
+    assert job.response.application_date == datetime.datetime(2020, 10, 1, 9, 0)
+
+    job = queue.get(bad)
+    assert job is not None and job.state == "failed"
+    assert job.error_type == "InvalidDLError"
+    assert worker.submitted == 1 and worker.failed == 1
+
+
+@responses.activate
+def test_worker_retries_unsent(tmp_path):
+    responses.add(
+        responses.POST, STAGING_URL, body=requests.exceptions.ConnectTimeout()
+    )
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    queue = SubmissionQueue(str(tmp_path / "q.db"))
+    job_id = queue.enqueue(make_request("a"))
+
+    worker = SubmissionWorker(
+        queue,
+        PAOVRSession("key", staging=True),
+        concurrency=1,
+        backoff=0.01,
+        poll_interval=0.01,
+    )
+    worker.run(until_empty=True)
+
+    job = queue.get(job_id)
+    assert job is not None and job.state == "done"
+    assert job.attempts == 2
+    assert worker.retried == 1
+
+
+@responses.activate
+def test_retry_backoff(tmp_path):
+    responses.add(
+        responses.POST, STAGING_URL, body=requests.exceptions.ConnectTimeout()
+    )
+    queue = SubmissionQueue(str(tmp_path / "q.db"))
+    job_id = queue.enqueue(make_request("a"))
+    worker = SubmissionWorker(
+        queue, PAOVRSession("key", staging=True), backoff=60, max_backoff=200
+    )
+
+    job = queue.claim()
+    assert job is not None
+    worker.process(job)
+    # back in the queue, but not to be claimed for a while
+    assert len(queue) == 1 and queue.claim() is None
+    job = queue.get(job_id)
+    assert job is not None and job.state == "pending"
+
+    assert 30 <= worker._delay(1) <= 60
+    assert 120 <= worker._delay(3) <= 200
+
+
+@responses.activate
+def test_worker_gives_up(tmp_path):
+    responses.add(
+        responses.POST, STAGING_URL, body=requests.exceptions.ConnectTimeout()
+    )
+    queue = SubmissionQueue(str(tmp_path / "q.db"))
+    job_id = queue.enqueue(make_request("a"))
+
+    worker = SubmissionWorker(
+        queue,
+        PAOVRSession("key", staging=True),
+        concurrency=2,
+        max_attempts=2,
+        backoff=0.01,
+        poll_interval=0.01,
+    )
+    worker.run(until_empty=True)
+
+    job = queue.get(job_id)
+    assert job is not None and job.state == "failed"
+    assert job.error_type == "ConnectTimeout"
+    assert job.attempts == 2
+
+
+@responses.activate
+def test_worker_holds_in_doubt(tmp_path):
+    responses.add(responses.POST, STAGING_URL, status=503)
+    responses.add(responses.POST, STAGING_URL, json=OK)
+    queue = SubmissionQueue(str(tmp_path / "q.db"))
+    job_id = queue.enqueue(make_request("a"))
+
+    worker = SubmissionWorker(queue, PAOVRSession("key", staging=True), concurrency=1)
+    worker.run(until_empty=True)
+
+    # the state may have registered it: not sent again until resolved
+    job = queue.get(job_id)
+    assert job is not None and job.state == "in_doubt"
+    assert job.error_type == "ServerError"
+    assert len(responses.calls) == 1 and worker.in_doubt == 1
+
+    assert queue.resolve(job_id) and not queue.resolve(job_id)
+    worker.run(until_empty=True)
+    job = queue.get(job_id)
+    assert job is not None and job.state == "done"
+
+
+@responses.activate
+def test_worker_retries_in_doubt_with_store(tmp_path):
+    responses.add(responses.POST, STAGING_URL, status=503)
+    queue = SubmissionQueue(str(tmp_path / "q.db"))
+    job_id = queue.enqueue(make_request("a"))
+    store = IdempotencyStore(str(tmp_path / "idem.db"))
+    session = PAOVRSession("key", staging=True, idempotency=store)
+
+    worker = SubmissionWorker(
+        queue, session, concurrency=1, backoff=0.01, poll_interval=0.01
+    )
+    worker.run(until_empty=True)
+
+    # retried, but the store wouldn't send it again
+    job = queue.get(job_id)
+    assert job is not None and job.state == "in_doubt"
+    assert job.error_type == "SubmissionInDoubtError"
+    assert job.attempts == 2 and len(responses.calls) == 1
+
+
+def test_stop_drains(tmp_path):
+    queue = SubmissionQueue(str(tmp_path / "q.db"))
+    queue.enqueue_many([make_request(str(i)) for i in range(5)])
+
+    class Session:
+        def register(self, request):
+            worker.stop()
+            raise ValueError("nope")
+
+    worker = SubmissionWorker(queue, Session(), concurrency=1)  # type: ignore
+    worker.run()
+    # the job in flight was recorded; nothing else was claimed
+    assert queue.counts() == {
+        "pending": 4,
+        "running": 0,
+        "done": 0,
+        "failed": 1,
+        "in_doubt": 0,
+    }
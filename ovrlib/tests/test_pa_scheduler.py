@@ -0,0 +1,121 @@
+import datetime
+
+import responses  # type: ignore
+
+from ..pa import STAGING_URL, PAOVRElectionInfo, PAOVRRequest, PAOVRSession
+from ..pa_scheduler import DeadlineScheduler, parse_deadline
+
+
+def make_info():
+    # as get_election_info() returns it, with string dates
+    return PAOVRElectionInfo(
+        next_election="11/03/2020",
+        next_vr_deadline="10/19/2020",
+        vr_declaration="",
+        vbm_election_name="2020 GENERAL ELECTION",
+        vbm_request_deadline=datetime.datetime(2020, 10, 27, 17, 0),
+        vbm_request_declaration="",
+        vbm_receipt_deadline=datetime.datetime(2020, 11, 3, 20, 0),
+    )
+
+
+def make_request(name, **kwargs):
+    return PAOVRRequest(
+        first_name=name,
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        zipcode="16214",
+        county="Clarion",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        dl_number="99007069",
+        **kwargs,
+    )
+
+
+def at(*args):
+    return lambda: datetime.datetime(*args)
+
+
+def test_parse_deadline():
+    assert parse_deadline("10/19/2020") == datetime.datetime(
+        2020, 10, 19, 23, 59, 59, 999999
+    )
+    assert parse_deadline(datetime.datetime(2020, 10, 27, 17)) == datetime.datetime(
+        2020, 10, 27, 17
+    )
+    assert parse_deadline(None) is None
+    assert parse_deadline("soon") is None
+
+
+def test_classify():
+    scheduler = DeadlineScheduler(make_info(), clock=at(2020, 10, 1))
+    vbm = make_request("vbm", mailin_ballot_request=True)
+    assert scheduler.classify(make_request("a"))[0] == "registration"
+    assert scheduler.classify(vbm)[0] == "vbm"
+
+    # after the VR deadline only mail-in requests still have one
+    scheduler.clock = at(2020, 10, 20)
+    assert scheduler.classify(make_request("a"))[0] == "deferred"
+    assert scheduler.classify(vbm)[0] == "vbm"
+    scheduler.clock = at(2020, 10, 28)
+    assert scheduler.classify(vbm)[0] == "deferred"
+
+
+def test_order_by_deadline():
+    scheduler = DeadlineScheduler(
+        make_info(), low_priority_share=0, clock=at(2020, 10, 1)
+    )
+    scheduler.submit(make_request("later"), deferred=True)
+    scheduler.submit(make_request("vbm", mailin_ballot_request=True))
+    scheduler.submit(make_request("reg1"))
+    scheduler.submit(make_request("reg2"))
+    assert scheduler.depth() == {"vbm": 1, "registration": 2, "deferred": 1}
+
+    order = []
+    while True:
+        item = scheduler.get(block=False)
+        if item is None:
+            break
+        order.append(item[1].first_name)
+    assert order == ["reg1", "reg2", "vbm", "later"]
+    assert scheduler.depth() == {"vbm": 0, "registration": 0, "deferred": 0}
+
+
+def test_low_priority_share():
+    scheduler = DeadlineScheduler(
+        make_info(), low_priority_share=0.25, clock=at(2020, 10, 1)
+    )
+    for i in range(10):
+        scheduler.submit(make_request(f"d{i}"), deferred=True)
+    for i in range(30):
+        scheduler.submit(make_request(f"r{i}"))
+    classes = [scheduler.get(block=False)[0] for _ in range(20)]
+    assert classes.count("deferred") == 5
+    assert classes[:3] == ["registration"] * 3
+
+
+@responses.activate
+def test_run():
+    responses.add(
+        responses.POST,
+        STAGING_URL,
+        json="<RESPONSE><APPLICATIONID>1</APPLICATIONID><APPLICATIONDATE>Oct 01 2020  9:00AM</APPLICATIONDATE><SIGNATURE>DL</SIGNATURE></RESPONSE>",
+    )
+    scheduler = DeadlineScheduler(make_info(), clock=at(2020, 10, 1))
+    for i in range(5):
+        scheduler.submit(make_request(f"r{i}"))
+    results = []
+    scheduler.run(
+        PAOVRSession("abc", staging=True),
+        workers=2,
+        on_result=lambda r, res: results.append(res),
+    )
+    assert len(results) == 5
+    assert all(r.application_id == "1" for r in results)
+    assert len(scheduler) == 0
+    assert scheduler.dispatched()["registration"] == 5
@@ -0,0 +1,112 @@
+import fcntl
+import multiprocessing
+import os
+import time
+
+import pytest  # type: ignore
+import responses  # type: ignore
+
+from ..exceptions import RateLimitTimeout
+from ..pa import STAGING_URL, PAOVRSession
+from ..ratelimit import Budget, SharedRateLimiter
+
+
+def test_burst_then_rate(tmp_path):
+    with SharedRateLimiter(str(tmp_path / "rate"), {"total": Budget(20, 5)}) as rl:
+        for _ in range(5):
+            assert rl.acquire("GETERRORVALUES") == 0.0
+        start = time.monotonic()
+        waited = rl.acquire("GETERRORVALUES")
+        assert 0.02 < waited < 0.5
+        assert time.monotonic() - start >= 0.02
+        stats = rl.stats()["total"]
+        assert stats["waits"] == 1 and stats["wait_seconds"] == pytest.approx(waited)
+        assert rl.waits == 1
+
+
+def test_per_action_budgets(tmp_path):
+    budgets = {"SETAPPLICATION": Budget(0.001, 1), "default": Budget(1000, 100)}
+    with SharedRateLimiter(str(tmp_path / "rate"), budgets) as rl:
+        assert rl.buckets_for("SETAPPLICATION") == ["SETAPPLICATION"]
+        assert rl.buckets_for("GETERRORVALUES") == ["default"]
+        rl.acquire("SETAPPLICATION")
+        with pytest.raises(RateLimitTimeout):
+            rl.acquire("SETAPPLICATION", timeout=0.1)
+        # read-only calls have their own budget
+        for _ in range(50):
+            rl.acquire("GETMUNICIPALITIES", timeout=0.1)
+
+
+def test_state_is_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "rate")
+    a = SharedRateLimiter(path, {"total": Budget(0.001, 2)})
+    b = SharedRateLimiter(path, {"total": Budget(0.001, 2)})
+    a.acquire("X")
+    b.acquire("X")
+    with pytest.raises(RateLimitTimeout):
+        a.acquire("X", timeout=0.05)
+    a.close()
+    b.close()
+
+
+def test_refill_time_in_the_future(tmp_path):
+    # e.g. a file written before the clock was set back
+    path = str(tmp_path / "rate")
+    with SharedRateLimiter(path, {"total": Budget(100, 1)}) as rl:
+        raw, rate, burst, _, _, wsec, wcount = rl._read(0)
+        rl._write(0, (raw, rate, burst, 0.0, time.time() + 1e6, wsec, wcount))
+    with SharedRateLimiter(path, {"total": Budget(100, 1)}) as rl:
+        assert rl._read(0)[4] <= time.time()
+        assert rl.acquire("X", timeout=1) < 0.1
+
+
+def test_reopens_after_fork(tmp_path):
+    rl = SharedRateLimiter(str(tmp_path / "rate"), {"total": Budget(100, 1)})
+    fcntl.flock(rl._fd, fcntl.LOCK_EX)
+    pid = os.fork()
+    if pid == 0:
+        # the inherited fd would share the parent's lock; ours must not
+        code = 1
+        try:
+            fcntl.flock(rl._own_fd(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    fcntl.flock(rl._fd, fcntl.LOCK_UN)
+    rl.close()
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
+def take(path, count, results):
+    rl = SharedRateLimiter(path, {"total": Budget(50, 10)})
+    for _ in range(count):
+        rl.acquire("X")
+    results.put(time.monotonic())
+
+
+def test_limits_across_processes(tmp_path):
+    path = str(tmp_path / "rate")
+    SharedRateLimiter(path, {"total": Budget(50, 10)}).close()
+    results: multiprocessing.Queue = multiprocessing.Queue()
+    start = time.monotonic()
+    procs = [
+        multiprocessing.Process(target=take, args=(path, 10, results)) for _ in range(4)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    finish = max(results.get() for _ in procs)
+    # 40 requests: a burst of 10, then 30 at 50/s
+    assert finish - start >= 0.55
+
+
+@responses.activate
+def test_session_uses_rate_limiter(tmp_path):
+    responses.add(responses.GET, STAGING_URL, json="<OVRLookupData />")
+    with SharedRateLimiter(str(tmp_path / "rate"), {"total": Budget(0.001, 1)}) as rl:
+        session = PAOVRSession("abc", staging=True, rate_limiter=rl)
+        session.do_request("GETERRORVALUES")
+        assert rl.stats()["total"]["tokens"] < 1
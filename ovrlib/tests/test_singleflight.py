@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest  # type: ignore
+import responses  # type: ignore
+
+from ..pa import STAGING_URL, PAOVRSession
+from ..singleflight import SingleFlight
+
+THREADS = 8
+
+
+def run_threads(fn):
+    barrier = threading.Barrier(THREADS)
+    results = [None] * THREADS
+
+    def target(i):
+        barrier.wait()
+        try:
+            results[i] = fn(i)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return object()
+
+    results = run_threads(lambda i: flights.do("k", slow))
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flights.calls == 1 and flights.shared == THREADS - 1
+    assert flights.in_flight() == 0
+
+    # nothing is cached afterwards
+    flights.do("k", slow)
+    assert len(calls) == 2
+
+
+def test_shares_exceptions():
+    flights = SingleFlight()
+
+    def fail():
+        time.sleep(0.2)
+        raise ValueError("nope")
+
+    results = run_threads(lambda i: flights.do("k", fail))
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.calls == 1
+
+    with pytest.raises(ValueError):
+        flights.do("k", fail)
+
+
+SETUP = "<NewDataSet>  <County>    <countyID>2290</countyID>    <Countyname>ADAMS</Countyname>  </County></NewDataSet>"
+
+
+def slow_response(request):
+    time.sleep(0.2)
+    return (200, {}, f'"{SETUP}"')
+
+
+@responses.activate
+def test_session_coalesces_read_only_requests():
+    responses.add_callback(responses.GET, STAGING_URL, callback=slow_response)
+
+    results = run_threads(
+        lambda i: PAOVRSession("abc", staging=True).do_request("GETAPPLICATIONSETUP")
+    )
+    assert len(responses.calls) == 1
+    assert all(r is results[0] for r in results)
+    assert results[0].tag == "NewDataSet"
+
+    results = run_threads(
+        lambda i: PAOVRSession("abc", staging=True, coalesce=False).do_request(
+            "GETAPPLICATIONSETUP"
+        )
+    )
+    assert len(responses.calls) == 1 + THREADS
+
+
+@responses.activate
+def test_session_keys_on_params():
+    responses.add_callback(responses.GET, STAGING_URL, callback=slow_response)
+    session = PAOVRSession("abc", staging=True)
+    results = run_threads(
+        lambda i: session.do_request(
+            "GETMUNICIPALITIES", params={"County": ["ADAMS", "YORK"][i % 2]}
+        )
+    )
+    assert len(responses.calls) == 2
+    assert results[0] is results[2] and results[0] is not results[1]
+
+
+@responses.activate
+def test_session_coalesces_streamed_reads():
+    responses.add_callback(responses.GET, STAGING_URL, callback=slow_response)
+    session = PAOVRSession("abc", staging=True)
+    results = run_threads(lambda i: session.fetch_constants())
+    # GETERRORVALUES, GETAPPLICATIONSETUP and GETXMLTEMPLATE once each
+    assert len(responses.calls) == 3
+    assert all(r == results[0] for r in results)
+    assert results[0]["county"] == {"adams": "2290"}
+    # each caller has its own copy
+    assert results[0]["county"] is not results[1]["county"]
@@ -0,0 +1,50 @@
+import dataclasses
+import datetime
+import pickle
+
+import pytest  # type: ignore
+
+from ..pa import PAMunicipality, PAOVRRequest
+from ..wi import WIElection
+
+
+def make_request(**kwargs):
+    return PAOVRRequest(
+        first_name="Sally",
+        last_name="Penndot",
+        date_of_birth=datetime.date(1944, 5, 2),
+        address1="123 A St",
+        city="Clarion",
+        county="Clarion",
+        zipcode="16214",
+        party="Democrat",
+        united_states_citizen=True,
+        eighteen_on_election_day=True,
+        declaration=True,
+        **kwargs,
+    )
+
+
+def test_records_are_slotted():
+    r = make_request()
+    assert not hasattr(r, "__dict__")
+    assert r.suffix is None
+    with pytest.raises(AttributeError):
+        r.not_a_field = 1
+    assert PAOVRRequest.__qualname__ == "PAOVRRequest"
+    assert "__slots__" in WIElection.__dict__
+
+
+def test_slotted_behaves_like_dataclass():
+    r = make_request(suffix="XIV", address2="apt 4")
+    r.normalize_address_unit()
+    assert (r.unit_type, r.unit_number) == ("APT", "4")
+    assert dataclasses.replace(r, suffix=None).suffix is None
+    assert dataclasses.asdict(PAMunicipality("BR1", "ABBOTTSTOWN")) == {
+        "municipality_id": "BR1",
+        "municipality_name": "ABBOTTSTOWN",
+    }
+    r = make_request(dl_number="99007069")
+    copy = pickle.loads(pickle.dumps(r))
+    assert copy == r
+    assert copy.to_request_body() == r.to_request_body()
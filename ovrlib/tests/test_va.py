@@ -0,0 +1,85 @@
+import csv
+
+from ..va import FIELDS, SnapshotDiffer, VATrackingRecord, iter_records
+
+
+def make_row(i, status="Pending", **kw):
+    row = {column: "" for column in FIELDS}
+    row.update(
+        {
+            "link_alias": "voteamerica",
+            "APP_CAMPAIGN": f"session-{i}",
+            "APP_FIRST_NAME": f"First{i}",
+            "APP_LAST_NAME": f"Last{i}",
+            "APP_ADDRESS_LINE_1": f"{i} Main St",
+            "APP_ZIPCODE": "23219",
+            "APP_LOCALITY": "RICHMOND CITY",
+            "APP_SUBMISSION_RECEIVED": "2020-10-01 12:00:00",
+            "APP_STATUS?": status,
+        }
+    )
+    row.update(kw)
+    return row
+
+
+def write_csv(path, rows, delimiter=","):
+    with open(path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(FIELDS), delimiter=delimiter)
+        w.writeheader()
+        w.writerows(rows)
+    return str(path)
+
+
+def test_iter_records_tab_separated(tmp_path):
+    path = write_csv(tmp_path / "week.tsv", [make_row(1)], delimiter="\t")
+    [record] = list(iter_records(path))
+    assert record.first_name == "First1"
+    assert record.campaign == "session-1"
+    assert record.status == "Pending"
+
+
+def test_diff_snapshots(tmp_path):
+    differ = SnapshotDiffer(str(tmp_path / "index.db"))
+
+    week1 = write_csv(tmp_path / "week1.csv", [make_row(i) for i in range(5)])
+    changes = list(differ.diff(week1))
+    assert [c.kind for c in changes] == ["new"] * 5
+    assert differ.generation == 1
+
+    rows = [make_row(i) for i in range(1, 7)]
+    rows[0] = make_row(1, status="Approved")
+    rows[1] = make_row(2, APP_CITY="Richmond")
+    week2 = write_csv(tmp_path / "week2.csv", rows)
+
+    # a new differ on the same index picks up where the last one left off
+    differ = SnapshotDiffer(str(tmp_path / "index.db"))
+    changes = list(differ.diff(week2))
+    assert [(c.kind, c.record.first_name) for c in changes] == [
+        ("changed", "First1"),
+        ("changed", "First2"),
+        ("new", "First5"),
+        ("new", "First6"),
+    ]
+    assert changes[0].status_changed
+    assert changes[0].previous_status == "Pending"
+    assert not changes[1].status_changed
+    assert differ.last_removed == 1
+    assert len(differ) == 6
+
+    assert list(differ.diff(week2)) == []
+
+
+def test_abandoned_diff_keeps_previous_snapshot(tmp_path):
+    differ = SnapshotDiffer(str(tmp_path / "index.db"))
+    list(differ.diff_records(iter([VATrackingRecord(first_name="A")])))
+
+    changes = differ.diff_records(
+        iter([VATrackingRecord(first_name="B"), VATrackingRecord(first_name="C")])
+    )
+    assert next(changes).record.first_name == "B"
+    changes.close()
+
+    assert differ.generation == 1
+    assert len(differ) == 1
+    assert [c.record.first_name for c in differ.diff_records(iter([]))] == []
+    assert len(differ) == 0
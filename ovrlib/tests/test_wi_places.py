@@ -0,0 +1,112 @@
+import datetime
+import random
+
+import responses  # type: ignore
+
+from .. import wi
+from ..wi_places import WIPollingPlace, WIPollingPlaceIndex, distance_km
+
+
+def make_place(i, lat, lng):
+    return WIPollingPlace(
+        polling_place_id=str(i),
+        description=f"Place {i}",
+        address=f"{i} Main St",
+        city="Madison",
+        state="WI",
+        zipcode="53703",
+        lat=lat,
+        lng=lng,
+    )
+
+
+def random_index(count=2000, seed=1):
+    rng = random.Random(seed)
+    index = WIPollingPlaceIndex()
+    for i in range(count):
+        index.add(make_place(i, rng.uniform(42.5, 47.0), rng.uniform(-92.8, -86.8)))
+    return index
+
+
+def test_nearest_matches_brute_force():
+    index = random_index()
+    rng = random.Random(2)
+    for _ in range(50):
+        lat, lng = rng.uniform(42.0, 47.5), rng.uniform(-93.5, -86.0)
+        expected = sorted(index, key=lambda p: distance_km(lat, lng, p.lat, p.lng))
+        got = index.nearest(lat, lng, n=5)
+        assert [p for _, p in got] == expected[:5]
+
+
+def test_nearest_far_away_point():
+    index = random_index(count=20)
+    got = index.nearest(0.0, 0.0, n=3)
+    assert len(got) == 3
+    assert got[0][0] <= got[1][0] <= got[2][0]
+
+
+def test_within_matches_brute_force():
+    index = random_index()
+    box = (43.0, -90.0, 44.0, -88.5)
+    expected = {
+        p.polling_place_id
+        for p in index
+        if box[0] <= p.lat <= box[2] and box[1] <= p.lng <= box[3]
+    }
+    assert {p.polling_place_id for p in index.within(*box)} == expected
+
+
+def test_add_moves_existing_place():
+    index = WIPollingPlaceIndex()
+    index.add(make_place(1, 43.0, -89.0))
+    index.add(make_place(1, 45.0, -91.0))
+    assert len(index) == 1
+    assert index.within(42.9, -89.1, 43.1, -88.9) == []
+    assert index.nearest(45.0, -91.0)[0][1].lat == 45.0
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "places.json")
+    index = random_index(count=100)
+    index.add(make_place("x", 43.07, -89.4), district_combo_id="789")
+    index.save(path)
+
+    loaded = WIPollingPlaceIndex.load(path)
+    assert len(loaded) == 101
+    assert loaded.for_district("789") == make_place("x", 43.07, -89.4)
+    assert loaded.nearest(43.0, -89.0, n=4) == index.nearest(43.0, -89.0, n=4)
+    assert len(WIPollingPlaceIndex.load(str(tmp_path / "missing.json"))) == 0
+
+
+@responses.activate
+def test_lookup_polling_place_fetches_once():
+    responses.add(
+        responses.GET,
+        wi.POLLING_PLACE_ENDPOINT.format(district_combo_id="789"),
+        json={
+            "Success": True,
+            "Data": {
+                "electionDate": "2020-11-03T06:00:00Z",
+                "startTime": "7.00 AM",
+                "endTime": "8.00 PM",
+                "electionID": "1",
+                "electionDescription": "General",
+                "wardName": "Ward 1",
+                "pplid": "55",
+                "pollingLocationName": "Library",
+                "ppL_Address": "1 Library Mall",
+                "ppL_City": "Madison",
+                "ppL_PostalCode": "53706",
+                "latitude": "43.07",
+                "longitude": "-89.40",
+            },
+        },
+        status=200,
+    )
+    index = WIPollingPlaceIndex()
+    first = index.lookup_polling_place("789")
+    second = index.lookup_polling_place("789")
+    assert len(responses.calls) == 1
+    assert first == second
+    assert first.polling_place_id == "55"
+    assert index.nearest(43.0, -89.4)[0][1] is first
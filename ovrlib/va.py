@@ -0,0 +1,209 @@
+"""
+Virginia weekly tracking CSV ingest.
+
+Virginia publishes a CSV every Saturday with every application made through
+our custom URL (see VA/README.md).  Each file is a full snapshot, so
+SnapshotDiffer compares it against the previous week's snapshot, using an
+on-disk index of hashed keys, and yields only the new and changed rows:
+
+    differ = SnapshotDiffer("/data/va-snapshot.db")
+    for change in differ.diff("tracking-2020-10-17.csv"):
+        if change.kind == "changed" and change.status_changed:
+            ...
+
+Memory use doesn't grow with the size of the file: rows are streamed, the
+index lives in sqlite, and changes are yielded as they are found.
+"""
+
+import csv
+import hashlib
+import logging
+import sqlite3
+from dataclasses import dataclass, fields
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ._slots import slotted
+
+logger = logging.getLogger("ovrlib.va")
+
+# CSV column -> VATrackingRecord attribute
+FIELDS = {
+    "link_alias": "link_alias",
+    "APP_ORGANIZATION": "organization",
+    "APP_CAMPAIGN": "campaign",
+    "APP_NVRA_CODE": "nvra_code",
+    "APP_LOCALITY": "locality",
+    "APP_FIRST_NAME": "first_name",
+    "APP_MIDDLE_NAME": "middle_name",
+    "APP_LAST_NAME": "last_name",
+    "APP_NAME_SUFFIX": "suffix",
+    "APP_ADDRESS_LINE_1": "address1",
+    "APP_ADDRESS_LINE_2": "address2",
+    "APP_CITY": "city",
+    "APP_STATE": "state",
+    "APP_ZIPCODE": "zipcode",
+    "APP_MAILING_ADDRESS_LINE_1": "mailing_address1",
+    "APP_MAILING_ADDRESS_LINE_2": "mailing_address2",
+    "APP_MAILING_CITY": "mailing_city",
+    "APP_MAILING_STATE": "mailing_state",
+    "APP_MAILING_ZIPCODE": "mailing_zipcode",
+    "APP_SUBMISSION_RECEIVED": "submission_received",
+    "APP_STATUS?": "status",
+    "Absentee_Ballot_Type_Name": "absentee_ballot_type",
+}
+
+# The file has no application id, so identify a row by who applied and when.
+KEY_FIELDS = [
+    "first_name",
+    "middle_name",
+    "last_name",
+    "suffix",
+    "address1",
+    "zipcode",
+    "locality",
+    "submission_received",
+]
+
+
+@slotted
+@dataclass
+class VATrackingRecord:
+    link_alias: str = ""
+    organization: str = ""
+    campaign: str = ""
+    nvra_code: str = ""
+    locality: str = ""
+    first_name: str = ""
+    middle_name: str = ""
+    last_name: str = ""
+    suffix: str = ""
+    address1: str = ""
+    address2: str = ""
+    city: str = ""
+    state: str = ""
+    zipcode: str = ""
+    mailing_address1: str = ""
+    mailing_address2: str = ""
+    mailing_city: str = ""
+    mailing_state: str = ""
+    mailing_zipcode: str = ""
+    submission_received: str = ""
+    status: str = ""
+    absentee_ballot_type: str = ""
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Optional[str]]) -> "VATrackingRecord":
+        return cls(
+            **{attr: (row.get(column) or "").strip() for column, attr in FIELDS.items()}
+        )
+
+    def key(self) -> bytes:
+        return _digest([getattr(self, f).upper() for f in KEY_FIELDS])
+
+    def row_hash(self) -> bytes:
+        return _digest([getattr(self, f.name) for f in fields(self)])
+
+
+@dataclass
+class VAChange:
+    kind: str  # "new" or "changed"
+    record: VATrackingRecord
+    previous_status: Optional[str] = None
+
+    @property
+    def status_changed(self) -> bool:
+        return self.kind == "changed" and self.previous_status != self.record.status
+
+
+def _digest(values: List[str]) -> bytes:
+    return hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=16).digest()
+
+
+def iter_records(path: str) -> Iterator[VATrackingRecord]:
+    """
+    Stream records from a tracking CSV.  The README lists the columns
+    tab-separated, so accept either tabs or commas.
+    """
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        first = f.readline()
+        f.seek(0)
+        delimiter = "\t" if first.count("\t") > first.count(",") else ","
+        for row in csv.DictReader(f, delimiter=delimiter):
+            yield VATrackingRecord.from_row(row)
+
+
+class SnapshotDiffer:
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._db = sqlite3.connect(index_path, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot ("
+            " key BLOB PRIMARY KEY,"
+            " row_hash BLOB NOT NULL,"
+            " status TEXT NOT NULL,"
+            " generation INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)"
+        )
+        self.last_removed = 0
+
+    def close(self) -> None:
+        self._db.close()
+
+    @property
+    def generation(self) -> int:
+        row = self._db.execute(
+            "SELECT value FROM meta WHERE name = 'generation'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM snapshot").fetchone()[0]
+
+    def diff(self, path: str) -> Iterator[VAChange]:
+        yield from self.diff_records(iter_records(path))
+
+    def diff_records(self, records: Iterator[VATrackingRecord]) -> Iterator[VAChange]:
+        """
+        Yield the new and changed records relative to the previous snapshot.
+        The index is only updated once the iterator is exhausted; abandoning it
+        part way leaves the previous snapshot in place.
+        """
+        db = self._db
+        generation = self.generation + 1
+        db.execute("BEGIN")
+        try:
+            for record in records:
+                key = record.key()
+                row_hash = record.row_hash()
+                prev: Optional[Tuple[bytes, str]] = db.execute(
+                    "SELECT row_hash, status FROM snapshot WHERE key = ?", (key,)
+                ).fetchone()
+                db.execute(
+                    "INSERT OR REPLACE INTO snapshot (key, row_hash, status, generation)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, row_hash, record.status, generation),
+                )
+                if prev is None:
+                    yield VAChange(kind="new", record=record)
+                elif prev[0] != row_hash:
+                    yield VAChange(
+                        kind="changed", record=record, previous_status=prev[1]
+                    )
+
+            # rows that are no longer in the file
+            self.last_removed = db.execute(
+                "DELETE FROM snapshot WHERE generation < ?", (generation,)
+            ).rowcount
+            db.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('generation', ?)",
+                (generation,),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            # includes GeneratorExit when the caller stops early
+            db.execute("ROLLBACK")
+            raise
+        if self.last_removed:
+            logger.info(f"{self.last_removed} rows dropped out of the snapshot")
@@ -1,8 +1,12 @@
 import datetime
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-import requests
+from ._slots import slotted
+from .cache import LookupCache
+
+if TYPE_CHECKING:
+    import requests
 
 SEARCH_ENDPOINT = (
     "https://myvote.wi.gov/DesktopModules/GabMyVoteModules/api/voter/search"
@@ -11,6 +15,7 @@ POLLING_PLACE_ENDPOINT = "https://myvote.wi.gov/DesktopModules/GabMyVoteModules/
 BALLOT_ENDPOINT = "https://myvote.wi.gov/DesktopModules/GabMyVoteModules/api/absentee/progressbarinfo/{voter_id}?electionid={election_id}"
 
 
+@slotted
 @dataclass
 class WIAbsenteeBallotStatus:
     request_submitted: Optional[datetime.datetime]
@@ -52,6 +57,7 @@ class WIAbsenteeBallotStatus:
         )
 
 
+@slotted
 @dataclass
 class WIElection:
     election_id: str
@@ -71,6 +77,7 @@ class WIElection:
     polling_place_lng: float
 
 
+@slotted
 @dataclass
 class WIVoterRegistration:
     full_name: str
@@ -133,8 +140,22 @@ class WIVoterRegistration:
         return r
 
 
-def lookup_voter(first_name, last_name, date_of_birth, **kwargs):
-    response = requests.post(
+def lookup_voter(
+    first_name,
+    last_name,
+    date_of_birth,
+    cache: Optional[LookupCache] = None,
+    http_session: Optional["requests.Session"] = None,
+    **kwargs
+):
+    if cache is not None:
+        cache_key = cache.voter_key("WI", first_name, last_name, date_of_birth)
+        found, cached = cache.get(cache_key)
+        if found:
+            return cached
+    import requests  # deferred; it's most of our import time
+
+    response = (http_session or requests).post(
         SEARCH_ENDPOINT,
         headers={
             "content-type": "application/x-www-form-urlencoded",
@@ -147,15 +168,31 @@ def lookup_voter(first_name, last_name, date_of_birth, **kwargs):
         **kwargs
     )
     if not response.json().get("Success"):
+        if cache is not None and response.status_code == 200:
+            cache.set_voter(cache_key, None)
         return None
     r = []
     for info in response.json()["Data"]["voters"]["$values"]:
         r.append(WIVoterRegistration.from_api_response(info))
+    if cache is not None:
+        cache.set_voter(cache_key, r)
     return r
 
 
-def lookup_polling_place(district_combo_id, **kwargs):
-    response = requests.get(
+def lookup_polling_place(
+    district_combo_id,
+    cache: Optional[LookupCache] = None,
+    http_session: Optional["requests.Session"] = None,
+    **kwargs
+):
+    if cache is not None:
+        cache_key = cache.polling_place_key("WI", district_combo_id)
+        found, cached = cache.get(cache_key)
+        if found:
+            return cached
+    import requests
+
+    response = (http_session or requests).get(
         POLLING_PLACE_ENDPOINT.format(district_combo_id=district_combo_id),
         headers={
             "content-type": "application/x-www-form-urlencoded",
@@ -163,6 +200,8 @@ def lookup_polling_place(district_combo_id, **kwargs):
         **kwargs
     )
     if not response.json().get("Success"):
+        if cache is not None and response.status_code == 200:
+            cache.set_polling_place(cache_key, None)
         return None
     info = response.json()["Data"]
 
@@ -176,7 +215,7 @@ def lookup_polling_place(district_combo_id, **kwargs):
     end_time = datetime.datetime.strptime(info.get("endTime"), "%I.%M %p")
     start = date + datetime.timedelta(hours=start_time.hour, minutes=start_time.hour)
     end = date + datetime.timedelta(hours=end_time.hour, minutes=end_time.minute)
-    return WIElection(
+    r = WIElection(
         election_id=info.get("electionID"),
         start=start,
         end=end,
@@ -191,10 +230,17 @@ def lookup_polling_place(district_combo_id, **kwargs):
         polling_place_lat=float(info.get("latitude")),
         polling_place_lng=float(info.get("longitude")),
     )
+    if cache is not None:
+        cache.set_polling_place(cache_key, r)
+    return r
+
 
+def lookup_ballot_status(
+    voter_id, election_id, http_session: Optional["requests.Session"] = None, **kwargs
+):
+    import requests
 
-def lookup_ballot_status(voter_id, election_id, **kwargs):
-    response = requests.get(
+    response = (http_session or requests).get(
         BALLOT_ENDPOINT.format(voter_id=voter_id, election_id=election_id),
         headers={
             "content-type": "application/x-www-form-urlencoded",
@@ -0,0 +1,270 @@
+"""
+Local spatial index over Wisconsin polling places.
+
+lookup_polling_place() is one network round trip per district.  This index
+keeps the polling places we have already fetched on a uniform lat/lng grid so
+that "nearest N" and bounding-box queries can be answered locally:
+
+    index = WIPollingPlaceIndex.load("wi-polling-places.json")
+    index.lookup_polling_place(voter.district_combo_id)  # fetches only if unknown
+    index.nearest(43.07, -89.40, n=5)
+    index.save("wi-polling-places.json")
+"""
+
+import json
+import math
+import os
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from . import wi
+from ._slots import slotted
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+DEFAULT_CELL_SIZE = 0.05  # degrees; about 5.5km north-south
+
+
+def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Great-circle (haversine) distance between two points
+    """
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+@slotted
+@dataclass
+class WIPollingPlace:
+    polling_place_id: str
+    description: str
+    address: str
+    city: str
+    state: str
+    zipcode: str
+    lat: float
+    lng: float
+
+    @classmethod
+    def from_election(cls, election: wi.WIElection) -> "WIPollingPlace":
+        return cls(
+            polling_place_id=election.polling_place_id,
+            description=election.polling_place_description,
+            address=election.polling_place_address,
+            city=election.polling_place_city,
+            state=election.polling_place_state,
+            zipcode=election.polling_place_zipcode,
+            lat=election.polling_place_lat,
+            lng=election.polling_place_lng,
+        )
+
+
+class WIPollingPlaceIndex:
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self._places: Dict[str, WIPollingPlace] = {}
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._districts: Dict[str, str] = {}
+        # extent of the occupied cells, so that nearest() knows when to stop
+        self._min_cell: Optional[Tuple[int, int]] = None
+        self._max_cell: Optional[Tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def __contains__(self, polling_place_id: str) -> bool:
+        return polling_place_id in self._places
+
+    def __iter__(self) -> Iterator[WIPollingPlace]:
+        return iter(self._places.values())
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (
+            math.floor(lat / self.cell_size),
+            math.floor(lng / self.cell_size),
+        )
+
+    def add(
+        self, place: WIPollingPlace, district_combo_id: Optional[str] = None
+    ) -> None:
+        """
+        Insert (or move) a polling place, optionally recording which district
+        it serves.
+        """
+        old = self._places.get(place.polling_place_id)
+        if old is not None:
+            self._cells[self._cell(old.lat, old.lng)].discard(old.polling_place_id)
+        self._places[place.polling_place_id] = place
+        cell = self._cell(place.lat, place.lng)
+        self._cells.setdefault(cell, set()).add(place.polling_place_id)
+        if self._min_cell is None or self._max_cell is None:
+            self._min_cell = cell
+            self._max_cell = cell
+        else:
+            self._min_cell = (
+                min(self._min_cell[0], cell[0]),
+                min(self._min_cell[1], cell[1]),
+            )
+            self._max_cell = (
+                max(self._max_cell[0], cell[0]),
+                max(self._max_cell[1], cell[1]),
+            )
+        if district_combo_id is not None:
+            self._districts[district_combo_id] = place.polling_place_id
+
+    def add_election(
+        self, election: wi.WIElection, district_combo_id: Optional[str] = None
+    ) -> WIPollingPlace:
+        place = WIPollingPlace.from_election(election)
+        self.add(place, district_combo_id)
+        return place
+
+    def for_district(self, district_combo_id: str) -> Optional[WIPollingPlace]:
+        polling_place_id = self._districts.get(district_combo_id)
+        if polling_place_id is None:
+            return None
+        return self._places.get(polling_place_id)
+
+    def lookup_polling_place(
+        self, district_combo_id: str, **kwargs
+    ) -> Optional[WIPollingPlace]:
+        """
+        Return the polling place for a district, only calling
+        wi.lookup_polling_place() if the district hasn't been seen before.
+        """
+        place = self.for_district(district_combo_id)
+        if place is not None:
+            return place
+        election = wi.lookup_polling_place(district_combo_id, **kwargs)
+        if election is None:
+            return None
+        return self.add_election(election, district_combo_id)
+
+    def within(
+        self, min_lat: float, min_lng: float, max_lat: float, max_lng: float
+    ) -> List[WIPollingPlace]:
+        """
+        All polling places inside a bounding box
+        """
+        if not self._places:
+            return []
+        lo = self._cell(min_lat, min_lng)
+        hi = self._cell(max_lat, max_lng)
+        r = []
+        # only walk the cells that are both in the box and occupied
+        assert self._min_cell is not None and self._max_cell is not None
+        for i in range(
+            max(lo[0], self._min_cell[0]), min(hi[0], self._max_cell[0]) + 1
+        ):
+            for j in range(
+                max(lo[1], self._min_cell[1]), min(hi[1], self._max_cell[1]) + 1
+            ):
+                for polling_place_id in self._cells.get((i, j), ()):
+                    place = self._places[polling_place_id]
+                    if (
+                        min_lat <= place.lat <= max_lat
+                        and min_lng <= place.lng <= max_lng
+                    ):
+                        r.append(place)
+        return r
+
+    def nearest(
+        self, lat: float, lng: float, n: int = 1
+    ) -> List[Tuple[float, WIPollingPlace]]:
+        """
+        The n nearest polling places to a point, as (distance_km, place)
+        tuples sorted by distance.
+        """
+        if not self._places or n <= 0:
+            return []
+        assert self._min_cell is not None and self._max_cell is not None
+        ci, cj = self._cell(lat, lng)
+        max_ring = max(
+            abs(ci - self._min_cell[0]),
+            abs(ci - self._max_cell[0]),
+            abs(cj - self._min_cell[1]),
+            abs(cj - self._max_cell[1]),
+        )
+        found: List[Tuple[float, WIPollingPlace]] = []
+        ring = 0
+        while ring <= max_ring:
+            if 8 * ring > len(self._cells):
+                # The rings are now bigger than the set of occupied cells
+                # (i.e., the point is far from everything); just scan it all.
+                found = [
+                    (distance_km(lat, lng, p.lat, p.lng), p)
+                    for p in self._places.values()
+                ]
+                break
+            for i, j in self._ring_cells(ci, cj, ring):
+                for polling_place_id in self._cells.get((i, j), ()):
+                    place = self._places[polling_place_id]
+                    found.append((distance_km(lat, lng, place.lat, place.lng), place))
+            if len(found) >= n:
+                found.sort(key=lambda x: x[0])
+                del found[n:]
+                # Anything in an unvisited ring is at least `ring` whole cells
+                # away along one axis.  Longitude degrees shrink toward the
+                # pole, so use the narrowest latitude the next ring could reach.
+                far_lat = min(89.0, abs(lat) + (ring + 1) * self.cell_size)
+                bound = (
+                    ring
+                    * self.cell_size
+                    * KM_PER_DEGREE
+                    * math.cos(math.radians(far_lat))
+                )
+                if found[-1][0] <= bound:
+                    break
+            ring += 1
+        found.sort(key=lambda x: x[0])
+        return found[:n]
+
+    @staticmethod
+    def _ring_cells(ci: int, cj: int, ring: int) -> Iterator[Tuple[int, int]]:
+        if ring == 0:
+            yield (ci, cj)
+            return
+        for j in range(cj - ring, cj + ring + 1):
+            yield (ci - ring, j)
+            yield (ci + ring, j)
+        for i in range(ci - ring + 1, ci + ring):
+            yield (i, cj - ring)
+            yield (i, cj + ring)
+
+    def to_dict(self) -> dict:
+        return {
+            "cell_size": self.cell_size,
+            "places": [asdict(p) for p in self._places.values()],
+            "districts": self._districts,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WIPollingPlaceIndex":
+        index = cls(cell_size=data.get("cell_size", DEFAULT_CELL_SIZE))
+        for p in data.get("places", []):
+            index.add(WIPollingPlace(**p))
+        index._districts.update(data.get("districts", {}))
+        return index
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(
+        cls, path: str, cell_size: float = DEFAULT_CELL_SIZE
+    ) -> "WIPollingPlaceIndex":
+        """
+        Load a saved index; a missing file gives an empty index.
+        """
+        if not os.path.exists(path):
+            return cls(cell_size=cell_size)
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
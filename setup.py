@@ -27,6 +27,7 @@ setup(
     long_description_content_type="text/markdown",
     install_requires=["requests>=2.22.0", "requests[socks]", "lxml", "dataclasses"],
     tests_require=["pytest", "responses",],
+    entry_points={"console_scripts": ["ovrlib=ovrlib.cli:main"]},
     test_suite="nose.collector",
     keywords=about["__keywords__"],
     classifiers=[